@@ -0,0 +1,292 @@
+#!/usr/bin/python3
+#
+#     RSSwapTool - A script to swap in up to date or enhanced rolling stock
+#     for older versions of stock in Train Simulator scenarios.
+#     Copyright (C) 2025 James McKenzie jrmknz@yahoo.co.uk
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# An index of the files under each Assets/<Provider>/<Product> folder, used by the reports to mark the rail vehicles
+# which aren't installed. Rather than looking for each vehicle's blueprint in turn, the whole product folder is listed
+# the first time one of its vehicles is looked for, and its vehicles are then found in the list. The lists are kept
+# from one run to the next in an SQLite file, along with the modification time of each folder when it was listed. A
+# folder's modification time changes whenever a file or folder is added to it or removed from it, so in later runs
+# each folder looked in is only checked once, and only listed again if it has changed.
+# Many products are installed packed into .ap files - zip archives in the product folder, holding files under their
+# paths within the product folder. A file which isn't in the folder is looked for in these too. The list of files in
+# an archive is read from its zip central directory, without unpacking anything, and kept in the same SQLite file
+# along with the archive's size and modification time, so it is only read again when the archive has changed.
+import os
+import json
+import time
+import sqlite3
+import zipfile
+import threading
+
+# The product folders looked in so far, keyed on their path. Each holds the folders listed, keyed on their path within
+# the product folder, with (modification time, files, folders) for each, and the folders checked this run.
+asset_products = {}
+# The .ap archives looked in, keyed on their path, each holding [size, modification time, {file path as the file system
+# compares it: file path in the archive}, the run it was last checked in]
+asset_archives = {}
+# Each report is a new run, so anything installed since the last one is found
+asset_run = 0
+asset_index_version = 2
+asset_index_path = None
+asset_index = None
+# Reports may be made in several threads at once, so only one at a time may use the index
+asset_lock = threading.RLock()
+# A folder modified this recently when it was listed may still be changing, within the resolution of its modification
+# time, so it is listed again the next time it is checked
+asset_settle_ns = 2 * 1000 * 1000 * 1000
+
+
+def set_asset_index(this_path):
+    # Keep the index of product folders in this file, usually next to the tool's config.ini
+    global asset_index_path, asset_index
+    asset_index_path = this_path
+    asset_index = None
+
+
+def open_asset_index():
+    # Open the index file, starting it afresh if it was written by a different version of this module. Return None if
+    # it can't be used - the product folders will just be listed afresh in each run.
+    global asset_index, asset_index_path
+    if asset_index is None and asset_index_path is not None:
+        try:
+            asset_index = sqlite3.connect(str(asset_index_path), timeout=10, check_same_thread=False)
+            if asset_index.execute('PRAGMA user_version').fetchone()[0] != asset_index_version:
+                asset_index.execute('DROP TABLE IF EXISTS product')
+                asset_index.execute('DROP TABLE IF EXISTS archive')
+                asset_index.execute('PRAGMA user_version = ' + str(asset_index_version))
+            asset_index.execute('CREATE TABLE IF NOT EXISTS product (path TEXT PRIMARY KEY, folders TEXT)')
+            asset_index.execute('CREATE TABLE IF NOT EXISTS archive (path TEXT PRIMARY KEY, size INTEGER, '
+                                'mtime INTEGER, names TEXT)')
+            asset_index.commit()
+        except sqlite3.Error:
+            asset_index = None
+            asset_index_path = None
+    return asset_index
+
+
+def read_asset_index(product_path):
+    # Return the folders held in the index for this product folder, or an empty dict if it hasn't been listed before
+    index = open_asset_index()
+    if index is None:
+        return {}
+    try:
+        row = index.execute('SELECT folders FROM product WHERE path = ?', (product_path,)).fetchone()
+    except sqlite3.Error:
+        return {}
+    if row is None:
+        return {}
+    return {folder: (mtime, set(files), set(subfolders))
+            for (folder, (mtime, files, subfolders)) in json.loads(row[0]).items()}
+
+
+def write_asset_index(product_path, folders):
+    index = open_asset_index()
+    if index is None:
+        return
+    folders = {folder: (mtime, sorted(files), sorted(subfolders))
+               for (folder, (mtime, files, subfolders)) in folders.items()}
+    try:
+        index.execute('INSERT OR REPLACE INTO product VALUES (?, ?)', (product_path, json.dumps(folders)))
+        index.commit()
+    except sqlite3.Error:
+        # Another process may be holding the index - the folder will be listed again next time
+        pass
+
+
+def read_archive_index(ap_path, size, mtime):
+    # Return the file paths held in the index for this archive, or None if they're missing or out of date
+    index = open_asset_index()
+    if index is None:
+        return None
+    try:
+        row = index.execute('SELECT size, mtime, names FROM archive WHERE path = ?', (ap_path,)).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None or row[0] != size or row[1] != mtime:
+        return None
+    return json.loads(row[2])
+
+
+def write_archive_index(ap_path, size, mtime, names):
+    index = open_asset_index()
+    if index is None:
+        return
+    try:
+        index.execute('INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?)', (ap_path, size, mtime, json.dumps(names)))
+        index.commit()
+    except sqlite3.Error:
+        # Another process may be holding the index - the archive will be read again next time
+        pass
+
+
+def new_asset_run():
+    # Start a new run, in which each folder and archive is checked again the first time it is looked in
+    global asset_run
+    with asset_lock:
+        asset_run = asset_run + 1
+        for product in asset_products.values():
+            product[2].clear()
+
+
+def asset_key(path):
+    # A path within a product folder as the file system compares it, separated by /
+    return os.path.normcase(path.replace('\\', '/')).replace(os.sep, '/')
+
+
+def get_archive_files(ap_path):
+    # Return the files packed in an .ap archive, reading its central directory if it hasn't been read before or has
+    # changed since. An archive which can't be read is treated as empty.
+    if ap_path in asset_archives and asset_archives[ap_path][3] == asset_run:
+        return asset_archives[ap_path][2]
+    try:
+        stat = os.stat(ap_path)
+    except OSError:
+        asset_archives.pop(ap_path, None)
+        return {}
+    if ap_path not in asset_archives or asset_archives[ap_path][0:2] != [stat.st_size, stat.st_mtime_ns]:
+        names = read_archive_index(ap_path, stat.st_size, stat.st_mtime_ns)
+        if names is None:
+            try:
+                with zipfile.ZipFile(ap_path) as ap_file:
+                    names = [name for name in ap_file.namelist() if not name.endswith('/')]
+            except (OSError, zipfile.BadZipFile):
+                names = []
+            write_archive_index(ap_path, stat.st_size, stat.st_mtime_ns, names)
+        asset_archives[ap_path] = [stat.st_size, stat.st_mtime_ns, {asset_key(name): name for name in names}, 0]
+    asset_archives[ap_path][3] = asset_run
+    return asset_archives[ap_path][2]
+
+
+def list_asset_folder(product_path, folders, folder, whole_tree):
+    # List the files and folders in a folder of a product, and those in all the folders below it if whole_tree is set.
+    # Names are kept as the file system compares them, i.e. in lower case on Windows.
+    pending = [folder]
+    while len(pending) > 0:
+        folder = pending.pop()
+        files = set()
+        subfolders = set()
+        try:
+            mtime = os.stat(os.path.join(product_path, folder)).st_mtime_ns
+            with os.scandir(os.path.join(product_path, folder)) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        subfolders.add(os.path.normcase(entry.name))
+                    elif entry.is_file():
+                        files.add(os.path.normcase(entry.name))
+        except OSError:
+            folders.pop(folder, None)
+            continue
+        if mtime > time.time_ns() - asset_settle_ns:
+            mtime = -1
+        if folder in folders:
+            # Forget what was found in any folders which have since been removed
+            for subfolder in folders[folder][2] - subfolders:
+                gone = subfolder if folder == '' else folder + '/' + subfolder
+                for listed in [listed for listed in folders if listed == gone or listed.startswith(gone + '/')]:
+                    del folders[listed]
+        folders[folder] = (mtime, files, subfolders)
+        if whole_tree:
+            pending.extend(subfolder if folder == '' else folder + '/' + subfolder for subfolder in subfolders)
+
+
+def check_asset_folder(product, folder):
+    # Return whether a folder of a product exists, listing it again if it has changed since it was last listed. Each
+    # folder is only checked once in a run.
+    (product_path, folders, checked) = product[0:3]
+    if folder in checked:
+        return checked[folder]
+    found = True
+    if folder != '':
+        (parent, sep, name) = folder.rpartition('/')
+        found = check_asset_folder(product, parent) and name in folders[parent][2]
+    if found:
+        try:
+            mtime = os.stat(os.path.join(product_path, folder)).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime is None:
+            folders.pop(folder, None)
+            found = False
+        elif folder not in folders or folders[folder][0] != mtime:
+            # Nothing below a folder not seen before has been listed either
+            list_asset_folder(product_path, folders, folder, folder not in folders)
+            product[3] = True
+            found = folder in folders
+    checked[folder] = found
+    return found
+
+
+def find_asset(railworks_path, provider, product_name, blueprint):
+    # Find where the file Assets/<provider>/<product_name>/<blueprint> is installed, where the blueprint path may be
+    # separated by \\ or /. Return (path of the file, None) if it is in the product folder, (path of the .ap archive,
+    # path in the archive) if it is packed in one of the product's archives, or None if it isn't installed at all.
+    parts = [part for part in asset_key(os.path.join(provider, product_name, blueprint)).split('/')
+             if part not in ('', '.')]
+    file_path = os.path.join(railworks_path, 'Assets', provider, product_name, blueprint.replace('\\', '/'))
+    if '..' in parts or len(parts) < 3 or os.path.isabs(provider) or os.path.isabs(product_name) or \
+            os.path.isabs(blueprint):
+        return (file_path, None) if os.path.isfile(file_path) else None
+    product_path = os.path.normcase(os.path.abspath(os.path.join(railworks_path, 'Assets', parts[0], parts[1])))
+    folder = '/'.join(parts[2:-1])
+    with asset_lock:
+        if product_path not in asset_products:
+            # [path, folders listed, folders checked this run, whether the folders listed have changed]
+            asset_products[product_path] = [product_path, read_asset_index(product_path), {}, False]
+        product = asset_products[product_path]
+        found = check_asset_folder(product, folder) and parts[-1] in product[1][folder][1]
+        archives = []
+        if not found and check_asset_folder(product, ''):
+            archives = sorted(name for name in product[1][''][1] if name.endswith('.ap'))
+        if product[3]:
+            write_asset_index(product_path, product[1])
+            product[3] = False
+        if found:
+            return file_path, None
+        for archive in archives:
+            ap_path = os.path.join(product_path, archive)
+            packed = get_archive_files(ap_path).get('/'.join(parts[2:]))
+            if packed is not None:
+                return ap_path, packed
+        return None
+
+
+def asset_exists(railworks_path, provider, product_name, blueprint):
+    # Return whether the file Assets/<provider>/<product_name>/<blueprint> is installed, either in the product folder,
+    # as checking Path(...).is_file() does only quicker for many files, or packed in one of the product's archives
+    return find_asset(railworks_path, provider, product_name, blueprint) is not None
+
+
+def find_packed_file(this_file):
+    # Return (path of the .ap archive, path in the archive) for a file below a RailWorks Assets folder which isn't in
+    # its product folder but is packed in one of the product's archives, otherwise None
+    parts = os.path.abspath(this_file).replace(os.sep, '/').split('/')
+    assets = [i for i in range(len(parts) - 3) if parts[i].lower() == 'assets']
+    if len(assets) == 0:
+        return None
+    i = assets[-1]
+    found = find_asset('/'.join(parts[0:i]) or '/', parts[i + 1], parts[i + 2], '/'.join(parts[i + 3:]))
+    if found is None or found[1] is None:
+        return None
+    return found
+
+
+def read_packed_file(packed):
+    # Return the contents of a file packed in an .ap archive, as found by find_packed_file
+    with zipfile.ZipFile(packed[0]) as ap_file:
+        return ap_file.read(packed[1])
@@ -0,0 +1,245 @@
+#!/usr/bin/python3
+#
+#     RSSwapTool - A script to swap in up to date or enhanced rolling stock
+#     for older versions of stock in Train Simulator scenarios.
+#     Copyright (C) 2025 James McKenzie jrmknz@yahoo.co.uk
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Microbenchmarks for the hot spots of the swap tool. Run them all with
+#     python benchmark.py
+# or name the ones to run, e.g.
+#     python benchmark.py matching
+# Those which use the swap tool's own functions import them from main.py, which reads its config.ini as usual.
+# The backends benchmark compares reading and writing scenarios with ElementTree and, if it is installed, lxml.
+import re
+import csv
+import os
+import sys
+import time
+import random
+import tempfile
+import xml.etree.ElementTree
+from pathlib import Path
+
+script_path = Path(os.path.realpath(__file__)).parent
+
+
+def load_rules(compiled):
+    # Read Replacements.csv the way import_data_from_csv does, with the Blueprint column either as an escaped pattern
+    # string (as searched before the patterns were precompiled) or as a compiled pattern object
+    rules = {}
+    with open(script_path / 'tables/Replacements.csv', 'r') as csv_file:
+        for row in csv.reader(csv_file):
+            pattern = re.escape(row[3])
+            if compiled:
+                pattern = re.compile(pattern, flags=re.IGNORECASE)
+            rules.setdefault(row[0], []).append([row[1], row[2], pattern])
+    return rules
+
+
+def match_with_strings(rules, provider, product, blueprint):
+    matches = 0
+    for category in rules:
+        for this_vehicle in rules[category]:
+            if this_vehicle[0] in provider and this_vehicle[1] in product:
+                if re.search(this_vehicle[2], blueprint, flags=re.IGNORECASE):
+                    matches = matches + 1
+                    break
+    return matches
+
+
+def match_with_compiled(rules, provider, product, blueprint):
+    matches = 0
+    for category in rules:
+        for this_vehicle in rules[category]:
+            if this_vehicle[0] in provider and this_vehicle[1] in product:
+                if this_vehicle[2].search(blueprint):
+                    matches = matches + 1
+                    break
+    return matches
+
+
+def bench_matching():
+    # Time matching a scenario's worth of rail vehicles against every category of the swap tables, once with the
+    # escaped pattern strings going through the re module's cache and once with the precompiled patterns
+    string_rules = load_rules(False)
+    compiled_rules = load_rules(True)
+    random.seed(1)
+    vehicles = []
+    for category in string_rules:
+        for this_vehicle in string_rules[category][1:]:
+            vehicles.append((this_vehicle[0], this_vehicle[1], re.sub(r'\\(.)', r'\1', this_vehicle[2])))
+    vehicles = random.choices(vehicles, k=2000)
+    for (label, rules, matcher) in [('re.search(pattern string)', string_rules, match_with_strings),
+                                    ('compiled pattern.search', compiled_rules, match_with_compiled)]:
+        re.purge()
+        start = time.perf_counter()
+        for (provider, product, blueprint) in vehicles:
+            matcher(rules, provider, product, blueprint)
+        elapsed = time.perf_counter() - start
+        print('matching  %-28s %8.1f us per rail vehicle' % (label, elapsed / len(vehicles) * 1e6))
+
+
+def bench_renumbering():
+    # Time updating the vehicle numbers in the instructions of a scenario with heavy shunting, once by checking every
+    # number change for each instruction and once by looking the number up in the index of changes
+    from main import Swapper, swap_handlers, update_renumbering, renumber
+    random.seed(1)
+    rv_pairs = [[str(random.randrange(10000, 99999)), str(random.randrange(10000, 99999))] for i in range(0, 2000)]
+    numbers = [random.choice(rv_pairs)[0] for i in range(0, 5000)]
+    start = time.perf_counter()
+    for this_rv in numbers:
+        for rvp in rv_pairs:
+            if this_rv == rvp[0]:
+                this_rv = rvp[1]
+    elapsed = time.perf_counter() - start
+    print('renumbering  %-25s %8.1f us per instruction' % ('loop over rv_pairs', elapsed / len(numbers) * 1e6))
+    swapper = Swapper(dict((swap_handler[0], False) for swap_handler in swap_handlers))
+    swapper.rv_pairs = rv_pairs
+    start = time.perf_counter()
+    update_renumbering(swapper)
+    for this_rv in numbers:
+        renumber(swapper, this_rv)
+    elapsed = time.perf_counter() - start
+    print('renumbering  %-25s %8.1f us per instruction' % ('index of changes', elapsed / len(numbers) * 1e6))
+
+
+# A rail vehicle of the synthetic scenario, with the d: namespace declared as it would be on the root element
+entity_template = '<cOwnedEntity xmlns:d="%s"><Component><cWagon><UniqueNumber d:type="cDeltaString"></UniqueNumber>' \
+                  '<Flipped d:type="bool">0</Flipped><Followers></Followers></cWagon><cCargoComponent>' \
+                  '<IsPreLoaded d:type="cDeltaString">eFalse</IsPreLoaded><InitialLevel></InitialLevel>' \
+                  '</cCargoComponent><cEngineSimContainer d:id="1"></cEngineSimContainer></Component><BlueprintID>' \
+                  '<iBlueprintLibrary-cAbsoluteBlueprintID><BlueprintSetID><iBlueprintLibrary-cBlueprintSetID>' \
+                  '<Provider d:type="cDeltaString"></Provider><Product d:type="cDeltaString"></Product>' \
+                  '</iBlueprintLibrary-cBlueprintSetID></BlueprintSetID><BlueprintID d:type="cDeltaString">' \
+                  '</BlueprintID></iBlueprintLibrary-cAbsoluteBlueprintID></BlueprintID>' \
+                  '<Name d:type="cDeltaString"></Name><d:nil></d:nil></cOwnedEntity>'
+
+
+def make_scenario(xml_file, consists, vehicles):
+    # Write a synthetic scenario with the given number of consists, each of that many rail vehicles, laid out as in a
+    # real one (the parts of a vehicle which the swap tool doesn't look at are left out)
+    from ts_xml import delta_namespace, write_ts_xml
+    d = '{' + delta_namespace + '}'
+    random.seed(1)
+    rules = load_rules(False)
+    vehicles_available = [rule for category in rules for rule in rules[category][1:]]
+    root = xml.etree.ElementTree.Element('cRecordSet', {d + 'version': '1.0'})
+    record = xml.etree.ElementTree.SubElement(root, 'Record')
+    for i in range(0, consists):
+        consist = xml.etree.ElementTree.SubElement(record, 'cConsist', {d + 'id': str(i + 1000000)})
+        rail_vehicles = xml.etree.ElementTree.SubElement(consist, 'RailVehicles')
+        for j in range(0, vehicles):
+            (provider, product, blueprint) = random.choice(vehicles_available)
+            entity = xml.etree.ElementTree.fromstring(entity_template % delta_namespace)
+            entity.find('Component/cWagon/UniqueNumber').text = str(random.randrange(10000, 99999))
+            entity.find('BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintSetID/iBlueprintLibrary'
+                        '-cBlueprintSetID/Provider').text = provider
+            entity.find('BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintSetID/iBlueprintLibrary'
+                        '-cBlueprintSetID/Product').text = product
+            entity.find('BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintID').text = \
+                re.sub(r'\\(.)', r'\1', blueprint)
+            entity.find('Name').text = 'Vehicle ' + str(j)
+            rail_vehicles.append(entity)
+    write_ts_xml(root, xml_file)
+
+
+def bench_backends():
+    # Time reading a big synthetic scenario, finding the parts of each rail vehicle the swap tool looks at and writing
+    # it out again, with each of the XML libraries available, and reading it a consist at a time as is done for the
+    # biggest scenarios
+    import ts_xml
+    original_backend = ts_xml.xml_backend
+    backends = ['ElementTree']
+    try:
+        import lxml
+        backends.append('lxml')
+    except ImportError:
+        print('backends  lxml is not installed - timing ElementTree only')
+    paths = ['BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintSetID/iBlueprintLibrary-cBlueprintSetID/'
+             'Provider',
+             'BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintSetID/iBlueprintLibrary-cBlueprintSetID/'
+             'Product',
+             'BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintID', 'Name', 'Component/*/UniqueNumber',
+             'Component/cCargoComponent/IsPreLoaded', 'Component/*/Flipped', 'Component/*/Followers']
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_file = Path(temp_dir) / 'Scenario.xml'
+        (consists, vehicles) = (1000, 40)
+        make_scenario(xml_file, consists, vehicles)
+        print('backends  synthetic scenario of %d rail vehicles, %.1f MB' %
+              (consists * vehicles, xml_file.stat().st_size / 1e6))
+        for backend in backends:
+            ts_xml.use_xml_backend(backend)
+            start = time.perf_counter()
+            tree = ts_xml.parse_file(xml_file)
+            parsed = time.perf_counter()
+            finders = [ts_xml.compile_path(path) for path in paths]
+            for entity in tree.getroot().iterfind('Record/cConsist/RailVehicles/cOwnedEntity'):
+                for finder in finders:
+                    finder(entity)
+            found = time.perf_counter()
+            ts_xml.write_ts_xml(tree.getroot(), Path(temp_dir) / 'Written.xml')
+            written = time.perf_counter()
+            with open(xml_file, 'rb') as xml_in:
+                for (event, elem) in ts_xml.iterparse_file(xml_in, ('end',)):
+                    if elem.tag == 'cConsist':
+                        elem.clear()
+            streamed = time.perf_counter()
+            print('backends  %-12s parse %6.2fs  find %6.2fs  write %6.2fs  iterparse %6.2fs' %
+                  (backend, parsed - start, found - parsed, written - found, streamed - written))
+    ts_xml.use_xml_backend(original_backend)
+
+
+
+def bench_vehicles():
+    # Time finding the parts of each rail vehicle of a synthetic scenario the swap tool looks at, once with a search
+    # for each part and once in the single walk over the vehicle's elements made by RailVehicle
+    from main import RailVehicle
+    import ts_xml
+    paths = ['BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintSetID/iBlueprintLibrary-cBlueprintSetID/'
+             'Provider',
+             'BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintSetID/iBlueprintLibrary-cBlueprintSetID/'
+             'Product',
+             'BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintID', 'Name', 'Component/*/UniqueNumber',
+             'Component/cCargoComponent/IsPreLoaded', 'Component/*/Flipped', 'Component/*/Followers']
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_file = Path(temp_dir) / 'Scenario.xml'
+        make_scenario(xml_file, 250, 40)
+        entities = ts_xml.parse_file(xml_file).getroot().findall('Record/cConsist/RailVehicles/cOwnedEntity')
+    start = time.perf_counter()
+    for entity in entities:
+        for path in paths:
+            entity.find(path)
+    elapsed = time.perf_counter() - start
+    print('vehicles  %-28s %8.1f us per rail vehicle' % ('find for each part', elapsed / len(entities) * 1e6))
+    start = time.perf_counter()
+    for entity in entities:
+        RailVehicle(entity, 1)
+    elapsed = time.perf_counter() - start
+    print('vehicles  %-28s %8.1f us per rail vehicle' % ('RailVehicle', elapsed / len(entities) * 1e6))
+
+
+benchmarks = {
+    'matching': bench_matching,
+    'renumbering': bench_renumbering,
+    'backends': bench_backends,
+    'vehicles': bench_vehicles,
+}
+
+if __name__ == "__main__":
+    for bench in (sys.argv[1:] or benchmarks):
+        if bench not in benchmarks:
+            sys.exit('Unknown benchmark ' + bench + ' - choose from ' + ', '.join(benchmarks))
+        benchmarks[bench]()
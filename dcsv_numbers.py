@@ -0,0 +1,239 @@
+#!/usr/bin/python3
+#
+#     RSSwapTool - A script to swap in up to date or enhanced rolling stock
+#     for older versions of stock in Train Simulator scenarios.
+#     Copyright (C) 2025 James McKenzie jrmknz@yahoo.co.uk
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Access to the .dcsv vehicle number databases which come with AP and other rolling stock packs, shared by the swap
+# tools. A swapped vehicle looks up its new number in one of these, so the same few files are wanted over and over.
+import io
+import os
+import bisect
+import json
+import sqlite3
+import zipfile
+import threading
+from collections import OrderedDict
+from ts_xml import ET, parse_file, xml_parser
+from asset_index import find_packed_file, read_packed_file
+
+# The number databases read so far, least recently used first. Each entry is keyed on the path of the .dcsv file and
+# holds the file's modification time when read, with the list of the <Name> entries found in it.
+dcsv_cache = OrderedDict()
+dcsv_cache_size = 64
+# The same entries are also kept from one run to the next in an SQLite file, once a tool has said where it should be.
+# A file is only read again when its size or modification time has changed, i.e. when the pack has been updated.
+dcsv_index_version = 1
+dcsv_index_path = None
+dcsv_index = None
+# Scenarios may be processed in several threads at once, so only one at a time may use the cache and the index
+dcsv_lock = threading.RLock()
+
+
+def set_dcsv_index(this_path):
+    # Keep the index of number databases in this file, usually next to the tool's config.ini
+    global dcsv_index_path, dcsv_index
+    dcsv_index_path = this_path
+    dcsv_index = None
+
+
+def open_dcsv_index():
+    # Open the index file, starting it afresh if it was written by a different version of this module. Return None if
+    # it can't be used - the number databases will just be read from the .dcsv files.
+    global dcsv_index, dcsv_index_path
+    if dcsv_index is None and dcsv_index_path is not None:
+        try:
+            dcsv_index = sqlite3.connect(str(dcsv_index_path), timeout=10, check_same_thread=False)
+            if dcsv_index.execute('PRAGMA user_version').fetchone()[0] != dcsv_index_version:
+                dcsv_index.execute('DROP TABLE IF EXISTS dcsv')
+                dcsv_index.execute('PRAGMA user_version = ' + str(dcsv_index_version))
+            dcsv_index.execute('CREATE TABLE IF NOT EXISTS dcsv (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, '
+                               'names TEXT)')
+            dcsv_index.commit()
+        except sqlite3.Error:
+            dcsv_index = None
+            dcsv_index_path = None
+    return dcsv_index
+
+
+def read_dcsv_index(this_dcsv, size, mtime):
+    # Return the entries held in the index for this file, or None if they're missing or out of date
+    index = open_dcsv_index()
+    if index is None:
+        return None
+    try:
+        row = index.execute('SELECT size, mtime, names FROM dcsv WHERE path = ?', (this_dcsv,)).fetchone()
+    except sqlite3.Error:
+        return None
+    if row is None or row[0] != size or row[1] != mtime:
+        return None
+    return tuple(json.loads(row[2]))
+
+
+def write_dcsv_index(this_dcsv, size, mtime, names):
+    index = open_dcsv_index()
+    if index is None:
+        return
+    try:
+        index.execute('INSERT OR REPLACE INTO dcsv VALUES (?, ?, ?, ?)', (this_dcsv, size, mtime, json.dumps(names)))
+        index.commit()
+    except sqlite3.Error:
+        # Another process may be holding the index - the entries will be saved next time
+        pass
+
+
+def get_dcsv_names(this_dcsv):
+    # Return the <Name> entries of a .dcsv file, in file order. The file is only read if it isn't in the cache or the
+    # index, or has changed since it was read. FileNotFoundError and ET.ParseError are raised as parse_file raises them.
+    # A file which has only been installed packed in one of its product's .ap archives is read from the archive, and is
+    # counted as changed when the archive is.
+    this_dcsv = str(this_dcsv)
+    packed = None
+    try:
+        stat = os.stat(this_dcsv)
+    except FileNotFoundError:
+        packed = find_packed_file(this_dcsv)
+        if packed is None:
+            raise
+        stat = os.stat(packed[0])
+    mtime = stat.st_mtime_ns
+    with dcsv_lock:
+        if this_dcsv in dcsv_cache and dcsv_cache[this_dcsv][0] == mtime:
+            dcsv_cache.move_to_end(this_dcsv)
+            return dcsv_cache[this_dcsv][1]
+        names = read_dcsv_index(this_dcsv, stat.st_size, mtime)
+        if names is None:
+            if packed is None:
+                dcsv_tree = parse_file(this_dcsv)
+            else:
+                try:
+                    dcsv_tree = ET.parse(io.BytesIO(read_packed_file(packed)), xml_parser())
+                except (OSError, KeyError, zipfile.BadZipFile) as error:
+                    # An archive which can't be read counts as a database which can't be parsed. lxml's ParseError
+                    # needs a code, line and column as well as the message.
+                    raise ET.ParseError(str(error), 0, 0, 0)
+            names = tuple(vnum.text for vnum in dcsv_tree.getroot().findall('./CSVItem/cCSVItem/Name'))
+            write_dcsv_index(this_dcsv, stat.st_size, mtime, names)
+        dcsv_cache[this_dcsv] = (mtime, names)
+        dcsv_cache.move_to_end(this_dcsv)
+        while len(dcsv_cache) > dcsv_cache_size:
+            dcsv_cache.popitem(last=False)
+        return names
+
+
+class NumberAllocator:
+    # Hands out numbers from a number database, each time choosing the free number nearest to the one asked for. The
+    # database's entries are given as (name, number, value) in the order listed, and numbers are used up as their names
+    # appear in the scenario's list of used numbers. The choice is always the one made by walking the list of entries:
+    # skip used entries until reaching a number at or above the one asked for, then take that, unless the last number
+    # passed below it is closer, or the walk crossed one of the boundaries (e.g. into another subclass) to reach it. The
+    # entry above wins a tie, and if there is no free entry below, the fallback value is used instead. When the numbers
+    # are listed in ascending order, as they nearly always are, the walk's answer is found by bisection instead.
+    def __init__(self, entries, boundaries=()):
+        self.names = [entry[0] for entry in entries]
+        self.numbers = [entry[1] for entry in entries]
+        self.values = [entry[2] for entry in entries]
+        self.boundaries = boundaries
+        self.in_order = all(self.numbers[i] <= self.numbers[i + 1] for i in range(0, len(self.numbers) - 1))
+        self.positions = {}
+        for i in range(0, len(self.names)):
+            self.positions.setdefault(self.names[i], []).append(i)
+        self.reset(None)
+
+    def reset(self, rv_list):
+        # Forget the numbers used - used_after[i] and used_before[i + 1] lead from entry i to the nearest free entry
+        # after or before it, with a free sentinel at each end of the list
+        self.rv_list = rv_list
+        self.rv_seen = 0
+        self.used_names = set()
+        self.used_after = list(range(0, len(self.names) + 1))
+        self.used_before = list(range(0, len(self.names) + 1))
+
+    def mark_used(self, rv_list):
+        # Catch up with the numbers added to the list of used numbers since the last call
+        if rv_list is not self.rv_list or len(rv_list) < self.rv_seen:
+            self.reset(rv_list)
+        for name in rv_list[self.rv_seen:]:
+            if name not in self.used_names:
+                self.used_names.add(name)
+                for i in self.positions.get(name, []):
+                    self.used_after[i] = i + 1
+                    self.used_before[i + 1] = i
+        self.rv_seen = len(rv_list)
+
+    def next_free(self, i):
+        # Return the position of the first free entry at or after position i, or the number of entries if none is free
+        root = i
+        while self.used_after[root] != root:
+            root = self.used_after[root]
+        while self.used_after[i] != root:
+            (self.used_after[i], i) = (root, self.used_after[i])
+        return root
+
+    def previous_free(self, i):
+        # Return the position of the last free entry at or before position i, or -1 if none is free
+        i = i + 1
+        root = i
+        while self.used_before[root] != root:
+            root = self.used_before[root]
+        while self.used_before[i] != root:
+            (self.used_before[i], i) = (root, self.used_before[i])
+        return root - 1
+
+    def crosses_boundary(self, this_number, next_number):
+        for boundary in self.boundaries:
+            if this_number < boundary <= next_number:
+                return True
+        return False
+
+    def nearest(self, this_number, fallback, rv_list):
+        # Return the value of the free entry closest to this_number, as described above
+        self.mark_used(rv_list)
+        if not self.in_order:
+            return self.walk(this_number, fallback)
+        above = self.next_free(bisect.bisect_left(self.numbers, this_number))
+        below = self.previous_free(above - 1)
+        if below >= 0:
+            last_value = self.values[below]
+            diff = this_number - self.numbers[below]
+        else:
+            last_value = fallback
+            diff = 0
+        if above == len(self.numbers):
+            return last_value
+        if self.numbers[above] == this_number:
+            return self.values[above]
+        if self.numbers[above] - this_number > diff or self.crosses_boundary(this_number, self.numbers[above]):
+            return last_value
+        return self.values[above]
+
+    def walk(self, this_number, fallback):
+        # Walk the list of entries, for a database whose numbers are not in order
+        diff = 0
+        last_value = fallback
+        for i in range(0, len(self.names)):
+            if self.names[i] in self.used_names:
+                continue
+            if this_number > self.numbers[i]:
+                diff = this_number - self.numbers[i]
+            elif this_number == self.numbers[i]:
+                return self.values[i]
+            elif self.numbers[i] - this_number > diff or self.crosses_boundary(this_number, self.numbers[i]):
+                return last_value
+            else:
+                return self.values[i]
+            last_value = self.values[i]
+        return last_value
@@ -18,18 +18,26 @@
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 import re
 import random
+import bisect
+import mmap
 import csv
-import xml.etree.ElementTree as ET
+import json
 import time
 import sys
 import os
-import subprocess
-import platform
 import configparser
-import PySimpleGUI as sg
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import webbrowser
+from collections import Counter
 from pathlib import Path
-from pathlib import PureWindowsPath
+from dcsv_numbers import get_dcsv_names, set_dcsv_index, NumberAllocator
+from asset_index import set_asset_index, new_asset_run, asset_exists
+from serz import SerzError, read_serz, write_serz, serz_to_xml, xml_to_serz, run_serz
+from scenario_cache import set_scenario_cache, scenario_cache_key, get_cached_scenario, put_cached_scenario
+from ts_xml import ET, parse_file, iterparse_file, compile_path, write_ts_xml, write_ts_element, \
+    write_ts_start_tag, root_prefixes, ts_name, escape_text
 from data_file import hha_e_wagons, hha_l_wagons, HTO_141_numbers, HTO_143_numbers, \
     HTO_146_numbers, HTO_rebodied_numbers, HTV_146_numbers, HTV_rebodied_numbers, c158_s9bl_rr, c158_s9bl_nr, \
     c158_s9bl_fgw, c158_s9bl_tpe, c158_s9bl_swt, c158_nwc, c158_dtg_fc, c158_livman_rr, ap40headcodes_69_77, \
@@ -38,6 +46,13 @@ from data_file import hha_e_wagons, hha_l_wagons, HTO_141_numbers, HTO_143_numbe
     c450_gu_swt, c465_se, c375_dtg_pack, c377_lb_se, c377_lg_sn, c377_fcc, c170_bp_name_lookup, c375_dmos_lookup, \
     c456_nse, c456_southern, c319_dest, c350_lm_wcmls, c375_southern_wcmls, c86_TOPS_HC, c350_lm_cc
 
+# Run with the window unless scenarios are given on the command line (see the end of this script). Without the window,
+# PySimpleGUI is not imported at all, and messages are printed instead of popping up.
+if __name__ == "__main__" and len(sys.argv) < 2:
+    import PySimpleGUI as sg
+else:
+    sg = None
+
 # If you want to run this script on Linux you must enter the path to the wine executable. You need wine in order to
 # run the serz.exe utility which converts between .bin and .xml scenario files.
 # If you're not running this script on Linux this line should be left as the default.
@@ -46,18 +61,18 @@ wine_executable = '/usr/bin/wine'
 # Initialise the script, set the look and feel and get the configuration
 version_number = '1.0.11'
 version_date = '1 December 2025'
-rv_list = []
-rv_pairs = []
-output_vehicle_list = []
-input_vehicle_list = []
 layout = []
 values = {}
 vehicle_db = {}
 user_db = {}
 vp_blue_47_db = {}
-mu_last = 'none'
-mso_num = ''
+vehicle_db_index = {}
+candidate_rules = {}
+vehicle_rule_memo = {}
+prefilter_memo = {}
 railworks_path = ''
+# In a batch run, the semaphore limiting how many serz.exe conversions the worker processes run at once
+serz_slots = None
 c56_opts = ['Use nearest numbered AP enhanced loco', 'Retain original loco if no matching AP plaque / sector available']
 c86_opts = ['Use VP headcode blinds', 'Use AP plated box with markers', 'Do not swap this loco']
 fsafta_opts = ['RFD / 2000 era', 'FL / 2000 era', 'FL / 2010 era', 'FL / 2020 era']
@@ -74,23 +89,33 @@ htx_eras = ['Pre-TOPS only', 'Mixed', 'TOPS only']
 tail_opts = ['Flashing', 'Steady']
 report_opts = ['Don\'t save a report', 'Save details of processed scenario only',
                'Save details of original and processed scenarios']
-sg.LOOK_AND_FEEL_TABLE['Railish'] = {'BACKGROUND': '#00384F',
-                                     'TEXT': '#FFFFFF',
-                                     'INPUT': '#FFFFFF',
-                                     'TEXT_INPUT': '#000000',
-                                     'SCROLL': '#99CC99',
-                                     'BUTTON': ('#FFFFFF', '#002A3C'),
-                                     'PROGRESS': ('#31636d', '#002A3C'),
-                                     'BORDER': 2, 'SLIDER_DEPTH': 0, 'PROGRESS_DEPTH': 2, }
-sg.theme('Railish')
+report_formats = ['HTML web page', 'CSV spreadsheet', 'JSON Lines']
+# The details of each vehicle given in CSV and JSON Lines reports, as they were and as they are after processing
+report_columns = ['provider', 'product', 'blueprint', 'name', 'number', 'loaded']
+if sg is not None:
+    sg.LOOK_AND_FEEL_TABLE['Railish'] = {'BACKGROUND': '#00384F',
+                                         'TEXT': '#FFFFFF',
+                                         'INPUT': '#FFFFFF',
+                                         'TEXT_INPUT': '#000000',
+                                         'SCROLL': '#99CC99',
+                                         'BUTTON': ('#FFFFFF', '#002A3C'),
+                                         'PROGRESS': ('#31636d', '#002A3C'),
+                                         'BORDER': 2, 'SLIDER_DEPTH': 0, 'PROGRESS_DEPTH': 2, }
+    sg.theme('Railish')
 config = configparser.ConfigParser()
 script_path = Path(os.path.abspath(os.path.dirname(sys.argv[0])))
 path_to_config = script_path / 'config.ini'
 config.read(path_to_config)
+# Keep the entries read from AP vehicle number databases in an index alongside the configuration
+set_dcsv_index(script_path / 'dcsv_index.sqlite')
+# and the lists of installed assets, for marking the missing ones in reports
+set_asset_index(script_path / 'asset_index.sqlite')
+# and the scenarios converted from .bin to .xml, which the report tools share
+set_scenario_cache(script_path / 'scenario_cache', config.getint('defaults', 'scenario_cache_mb', fallback=512))
 # Read configuration and find location of RailWorks folder, or ask user to set it
 if config.has_option('RailWorks', 'path'):
     railworks_path = config.get('RailWorks', 'path')
-else:
+elif sg is not None:
     loclayout = [[sg.T('')],
                  [sg.Text('Please locate your RailWorks folder:'), sg.Input(key='-IN2-', change_submits=False,
                                                                             readonly=True),
@@ -164,6 +189,7 @@ if not config.has_section('defaults'):
     config.set('defaults', 'replace_c456', 'False')
     config.set('defaults', 'replace_c465', 'False')
     config.set('defaults', 'save_report', report_opts[0])
+    config.set('defaults', 'report_format', report_formats[0])
     config.set('defaults', 'c56_rf', c56_opts[0])
     config.set('defaults', 'c86_hc', c86_opts[0])
     config.set('defaults', 'fsafta_variant', fsafta_opts[0])
@@ -192,6 +218,14 @@ def get_my_config_boolean(section, configvalue):
         return config.getboolean(section, configvalue)
 
 
+def show_message(*lines, title=None):
+    # Pop up a message for the user, or print it if running from the command line without the window
+    if sg is None:
+        print('\n'.join(str(line) for line in lines), file=sys.stderr)
+    else:
+        sg.popup(*lines, title=title)
+
+
 def get_destination(this_dict, this_key, this_blank):
     if this_key in this_dict:
         return this_dict[this_key]
@@ -199,7 +233,10 @@ def get_destination(this_dict, this_key, this_blank):
         return this_blank
 
 
-def import_data_from_csv(csv_filename):
+def import_data_from_csv(csv_filename, number_table=False):
+    # Read a table of swap rules into the vehicle database, indexing its rules. A table of numbers (number_table set)
+    # is read into a dictionary of its own instead, its columns all left as text and not indexed as rules.
+    this_db = {} if number_table else vehicle_db
     try:
         with open((script_path / csv_filename), 'r') as csv_file:
             reader = csv.reader(csv_file)
@@ -210,22 +247,112 @@ def import_data_from_csv(csv_filename):
                 for col in row:
                     if c == 0:
                         key = col
-                    elif c == 3:
-                        outrow.append(re.escape(col))
+                    elif c == 3 and not number_table:
+                        # Compile the Blueprint pattern once here, rather than on every search when the re module's
+                        # cache of compiled patterns (far smaller than the tables) has long since dropped it
+                        outrow.append(re.compile(re.escape(col), flags=re.IGNORECASE))
                     else:
                         outrow.append(col)
                     c = c + 1
                 if key == seen:
-                    vehicle_db[key].append(outrow)
+                    this_db[key].append(outrow)
                 else:
-                    vehicle_db[key] = [outrow]
+                    this_db[key] = [outrow]
                 seen = key
-            return vehicle_db
+            if not number_table:
+                index_vehicle_db()
+            return this_db
     except FileNotFoundError:
-        sg.popup('Error: vehicle swap data file ' + csv_filename + ' not found. Try re-installing the program.')
+        show_message('Error: vehicle swap data file ' + csv_filename + ' not found. Try re-installing the program.')
         sys.exit('Error: vehicle swap data file ' + csv_filename + ' not found. Try re-installing the program.')
 
 
+def get_literal_blueprint(this_pattern):
+    # If a rule's Blueprint pattern is just a complete blueprint path, return that path in lower case so the rule can be
+    # matched by looking it up. Otherwise - a partial path, which has to be searched for within the blueprint, or a true
+    # regular expression - return False.
+    if not isinstance(this_pattern, re.Pattern):
+        return False
+    this_blueprint = re.sub(r'\\(.)', r'\1', this_pattern.pattern, flags=re.DOTALL)
+    if re.escape(this_blueprint) != this_pattern.pattern:
+        return False
+    this_blueprint = this_blueprint.lower()
+    if this_blueprint.startswith('railvehicles\\') and this_blueprint.endswith('.xml'):
+        return this_blueprint
+    return False
+
+
+def index_vehicle_db():
+    # Index the rows of each category in the vehicle database by their Provider and Product, so a rail vehicle need
+    # only be tested against the rows which could match it. Under each Provider and Product, rules giving a complete
+    # blueprint path go in a dictionary keyed on the lower case path, holding the position of the first such rule.
+    # The positions of the rest, whose patterns must be searched for, are listed in table order.
+    vehicle_db_index.clear()
+    candidate_rules.clear()
+    for category in vehicle_db:
+        index = {}
+        for i in range(0, len(vehicle_db[category])):
+            this_vehicle = vehicle_db[category][i]
+            (literal_rules, pattern_rules) = index.setdefault((this_vehicle[0], this_vehicle[1]), ({}, []))
+            this_blueprint = get_literal_blueprint(this_vehicle[2])
+            if this_blueprint:
+                literal_rules.setdefault(this_blueprint, i)
+            else:
+                pattern_rules.append(i)
+        vehicle_db_index[category] = index
+
+
+def get_candidate_rules(category, this_provider, this_product):
+    # Return the rules of a vehicle database category whose Provider and Product are found in those of the rail vehicle:
+    # a list of the blueprint dictionaries to look the vehicle up in, and the positions of the pattern rules to search,
+    # in table order. These are worked out once for each Provider and Product combination met in a scenario.
+    key = (category, this_provider, this_product)
+    if key not in candidate_rules:
+        literal_rules = []
+        pattern_rules = []
+        for (provider, product), rules in vehicle_db_index.get(category, {}).items():
+            if provider in this_provider and product in this_product:
+                if rules[0]:
+                    literal_rules.append(rules[0])
+                pattern_rules.extend(rules[1])
+        pattern_rules.sort()
+        candidate_rules[key] = (literal_rules, pattern_rules)
+    return candidate_rules[key]
+
+
+def find_vehicle_rule(swapper, category, this_provider, this_product, this_blueprint):
+    # Return the first row of a vehicle database category which matches the rail vehicle, or False if none does.
+    # Scenarios are full of identical vehicles, so the answer is remembered - the vehicle database doesn't change while
+    # the program runs, so it is remembered from one scenario to the next. Only the lookup is remembered - the replacers
+    # still choose liveries, numbers etc. afresh for each vehicle.
+    key = (category, this_provider, this_product, this_blueprint)
+    if key in vehicle_rule_memo:
+        swapper.vehicle_rule_memo_stats['hits'] += 1
+    else:
+        swapper.vehicle_rule_memo_stats['misses'] += 1
+        vehicle_rule_memo[key] = search_vehicle_rule(category, this_provider, this_product, this_blueprint)
+    return vehicle_rule_memo[key]
+
+
+def search_vehicle_rule(category, this_provider, this_product, this_blueprint):
+    # Look up the rules giving complete blueprint paths, then search the patterns of any earlier rules
+    (literal_rules, pattern_rules) = get_candidate_rules(category, this_provider, this_product)
+    first = len(vehicle_db[category])
+    if literal_rules:
+        this_literal = this_blueprint.lower()
+        for rules in literal_rules:
+            first = min(first, rules.get(this_literal, first))
+    for i in pattern_rules:
+        if i > first:
+            break
+        if vehicle_db[category][i][2].search(this_blueprint):
+            first = i
+            break
+    if first < len(vehicle_db[category]):
+        return vehicle_db[category][first]
+    return False
+
+
 # Read in the csv database of vehicles, substitutes and swap datal, store in VehicleDB dictionary
 user_db_path = script_path / 'tables/User.csv'
 if not user_db_path.is_file():
@@ -234,338 +361,285 @@ if not user_db_path.is_file():
     user_db_path.write_text(head)
 vehicle_db = import_data_from_csv('tables/Replacements.csv')
 user_db = import_data_from_csv('tables/User.csv')
-vp_blue_47_db = import_data_from_csv('tables/Class47BRBlue_numbers.csv')
-
-# Set the layout of the GUI
-left_column = [
-    [sg.Text('RSSwapTool', font='Helvetica 16'), sg.Text('v' + version_number, font='Helvetica 8')],
-    [sg.Text('© 2023 JR McKenzie', font='Helvetica 7')],
-    [sg.FileBrowse('Select scenario file to process', key='Scenario_xml', tooltip='Locate the scenario .bin or .xml '
-                                                                                  'file you wish to process')],
-    [sg.Text('Tick the boxes below to choose the\nsubstitutions you would like to make.')],
-    [sg.Checkbox('Replace Mk1 coaches', default=get_my_config_boolean('defaults', 'replace_mk1'), enable_events=True,
-                 tooltip='Tick to enable replacing of Mk1 coaches with AP Mk1 Coach Pack Vol. 1',
-                 key='Replace_Mk1')],
-    [sg.Checkbox('Replace Mk2A-C coaches', default=get_my_config_boolean('defaults', 'replace_mk2ac'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Mk2a coaches with AP Mk2A-C Pack', key='Replace_Mk2ac')],
-    [sg.Checkbox('Replace Mk2D-F coaches', default=get_my_config_boolean('defaults', 'replace_mk2df'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Mk2e coaches with AP Mk2D-F Pack', key='Replace_Mk2df')],
-    [sg.Checkbox('Replace Mk3A-B coaches', default=get_my_config_boolean('defaults', 'replace_mk3ab'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Mk3A-B coaches with AP Mk3A-B Pack', key='Replace_Mk3ab')],
-    [sg.Checkbox('Replace FSA/FTA wagons', default=get_my_config_boolean('defaults', 'replace_fsa'), enable_events=True,
-                 tooltip='Tick to enable replacing of FSA wagons with AP FSA/FTA Wagon Pack', key='Replace_FSA')],
-    [sg.Checkbox('Replace HAA wagons', default=get_my_config_boolean('defaults', 'replace_haa'), enable_events=True,
-                 tooltip='Tick to enable replacing of HAA wagons with AP MGR Wagon Pack', key='Replace_HAA')],
-    [sg.Checkbox('Replace HHA wagons', default=get_my_config_boolean('defaults', 'replace_hha'), enable_events=True,
-                 tooltip='Tick to enable replacing of HHA wagons with AP HHA Wagon Pack', key='Replace_HHA')],
-    [sg.Checkbox('Replace unfitted 21t coal wagons', default=get_my_config_boolean('defaults', 'replace_hto'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of unfitted 21t coal wagons with Fastline Simulation HTO wagons',
-                 key='Replace_HTO')],
-    [sg.Checkbox('Replace fitted 21t coal wagons', default=get_my_config_boolean('defaults', 'replace_htv'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of fitted 21t coal wagons with Fastline Simulation HTV wagons',
-                 key='Replace_HTV')],
-    [sg.Checkbox('Replace TTA wagons', default=get_my_config_boolean('defaults', 'replace_tta'), enable_events=True,
-                 tooltip='Tick to enable replacing of TTA wagons with Armstrong Powerhouse TTA pack',
-                 key='Replace_TTA')],
-    [sg.Checkbox('Replace VDA wagons', default=get_my_config_boolean('defaults', 'replace_vda'), enable_events=True,
-                 tooltip='Tick to enable replacing of VDA wagons with Fastline Simulation VDA pack',
-                 key='Replace_VDA')],
-    [sg.Checkbox('Replace IHH stock', default=get_my_config_boolean('defaults', 'replace_ihh'), enable_events=True,
-                 tooltip='Tick to enable replacing of old Iron Horse House (IHH) stock, if your scenario contains any'
-                         ' (if in doubt, leave this unticked)',
-                 key='Replace_IHH')],
-]
-mid_column = [
-    [sg.Checkbox('Replace User-configured stock', default=get_my_config_boolean('defaults', 'replace_user'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of user-configured stock, contained in file User.csv '
-                         '(leave this unticked unless you have added your own substitutions to User.csv).',
-                 key='Replace_User')],
-    [sg.Checkbox('Replace Class 31s', default=get_my_config_boolean('defaults', 'replace_c31'), enable_events=True,
-                 tooltip='Replace Class 31s with AP enhancement pack equivalent', key='Replace_C31')],
-    [sg.Checkbox('Replace Class 37s', default=get_my_config_boolean('defaults', 'replace_c37'), enable_events=True,
-                 tooltip='Replace Class 37s with AP equivalent', key='Replace_C37')],
-    [sg.Checkbox('Replace Class 40s', default=get_my_config_boolean('defaults', 'replace_c40'), enable_events=True,
-                 tooltip='Replace DT Class 40s with AP/RailRight equivalent', key='Replace_C40')],
-    [sg.Checkbox('Replace Class 47s', default=get_my_config_boolean('defaults', 'replace_c47'), enable_events=True,
-                 tooltip='Replace BR Blue Class 47s with Vulcan Productions BR Blue Class 47 Pack versions',
-                 key='Replace_C47')],
-    [sg.Checkbox('Replace Class 50s', default=get_my_config_boolean('defaults', 'replace_c50'), enable_events=True,
-                 tooltip='Replace MeshTools Class 50s with AP equivalent', key='Replace_C50')],
-    [sg.Checkbox('Replace Class 56s', default=get_my_config_boolean('defaults', 'replace_c56'), enable_events=True,
-                 tooltip='Replace RSC Class 56 Railfreight Sectors with AP enhancement pack equivalent',
-                 key='Replace_C56')],
-    [sg.Checkbox('Replace Class 66s', default=get_my_config_boolean('defaults', 'replace_c66'), enable_events=True,
-                 tooltip='Replace Class 66s with AP enhancement pack equivalent', key='Replace_C66')],
-    [sg.Checkbox('Replace Class 67s', default=get_my_config_boolean('defaults', 'replace_c67'), enable_events=True,
-                 tooltip='Replace Class 67s with AP enhancement pack equivalent', key='Replace_C67')],
-    [sg.Checkbox('Replace Class 68s', default=get_my_config_boolean('defaults', 'replace_c68'), enable_events=True,
-                 tooltip='Replace Class 68s with AP enhancement pack equivalent', key='Replace_C68')],
-    [sg.Checkbox('Replace Class 86s', default=get_my_config_boolean('defaults', 'replace_c86'), enable_events=True,
-                 tooltip='Replace Class 86s with AP enhancement pack equivalent', key='Replace_C86')],
-    [sg.Checkbox('Replace Class 87s', default=get_my_config_boolean('defaults', 'replace_c87'), enable_events=True,
-                 tooltip='Replace Class 87s with AP equivalent', key='Replace_C87')],
-    [sg.Checkbox('Replace HST sets', default=get_my_config_boolean('defaults', 'replace_hst'), enable_events=True,
-                 tooltip='Tick to enable replacing of HST sets with AP enhanced versions (Valenta, MTU, VP185)',
-                 key='Replace_HST')],
-    [sg.Checkbox('Replace Class 91 EC sets', default=get_my_config_boolean('defaults', 'replace_c91'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 91 East Coast sets with AP enhanced versions',
-                 key='Replace_C91')],
-    [sg.Checkbox('Replace Class 101 sets', default=get_my_config_boolean('defaults', 'replace_c101'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of retired RSC Class101Pack with RSC BritishRailClass101 sets',
-                 key='Replace_C101')],
-    [sg.Checkbox('Replace Class 150/2 sets', default=get_my_config_boolean('defaults', 'replace_c150'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing Thomson-Oovee Class 150s with AP Class 150/2', key='Replace_C150')],
-]
-right_column = [
-    [sg.Checkbox('Replace Class 156 sets', default=get_my_config_boolean('defaults', 'replace_c156'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Oovee Class 156s with AP Class 156', key='Replace_C156')],
-    [sg.Checkbox('Replace Class 158, 159 sets', default=get_my_config_boolean('defaults', 'replace_c158'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of North Wales Coast / Settle Carlisle / Fife Circle Class 158s '
-                         'with AP enhanced versions (Cummins, Perkins)',
-                 key='Replace_C158')],
-    [sg.Checkbox('Replace Class 168, 170, 171 sets', default=get_my_config_boolean('defaults', 'replace_c170'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 168s / 170s with AP enhanced versions',
-                 key='Replace_C170')],
-    [sg.Checkbox('Replace Class 175 sets', default=get_my_config_boolean('defaults', 'replace_c175'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 175s with AP enhanced versions',
-                 key='Replace_C175')],
-    [sg.Checkbox('Replace Class 220, 221 sets', default=get_my_config_boolean('defaults', 'replace_c221'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of DTG Voyager with JT Advanced Voyager',
-                 key='Replace_C221')],
-    [sg.Checkbox('Replace Class 319 sets', default=get_my_config_boolean('defaults', 'replace_c319'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 319s with AP versions',
-                 key='Replace_C319')],
-    [sg.Checkbox('Replace Class 325 sets', default=get_my_config_boolean('defaults', 'replace_c325'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 325s with AP enhanced versions',
-                 key='Replace_C325')],
-    [sg.Checkbox('Replace Class 350 sets', default=get_my_config_boolean('defaults', 'replace_c350'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 350s with AP enhanced versions',
-                 key='Replace_C350')],
-    [sg.Checkbox('Replace Class 365 sets', default=get_my_config_boolean('defaults', 'replace_c365'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 365s with AP enhanced versions',
-                 key='Replace_C365')],
-    [sg.Checkbox('Replace Class 375/377/379/387 sets', default=get_my_config_boolean('defaults', 'replace_c375'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 375/377/379/387 with AP enhanced versions',
-                 key='Replace_C375')],
-    [sg.Checkbox('Replace Class 444, 450 sets', default=get_my_config_boolean('defaults', 'replace_c450'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 444, 450s with AP enhanced versions',
-                 key='Replace_C450')],
-    [sg.Checkbox('Replace Class 456 sets', default=get_my_config_boolean('defaults', 'replace_c456'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 456s with AP/Waggonz versions',
-                 key='Replace_C456')],
-    [sg.Checkbox('Replace Class 465 sets', default=get_my_config_boolean('defaults', 'replace_c465'),
-                 enable_events=True,
-                 tooltip='Tick to enable replacing of Class 465s with AP enhanced versions',
-                 key='Replace_C465')],
-    [sg.Button('Replace!'), sg.Button('Settings'), sg.Button('About'), sg.Button('Exit')],
-]
-
-# Set the layout of the application window
-layout = [
-    [
-        sg.Column(left_column),
-        sg.VSeperator(),
-        sg.Column(mid_column),
-        sg.VSeperator(),
-        sg.Column(right_column),
+vp_blue_47_db = import_data_from_csv('tables/Class47BRBlue_numbers.csv', number_table=True)
+
+
+def main_window_layout():
+    # Set the layout of the GUI
+    left_column = [
+        [sg.Text('RSSwapTool', font='Helvetica 16'), sg.Text('v' + version_number, font='Helvetica 8')],
+        [sg.Text('© 2023 JR McKenzie', font='Helvetica 7')],
+        [sg.FileBrowse('Select scenario file to process', key='Scenario_xml',
+                       tooltip='Locate the scenario .bin or .xml file you wish to process')],
+        [sg.Text('Tick the boxes below to choose the\nsubstitutions you would like to make.')],
+        [sg.Checkbox('Replace Mk1 coaches', default=get_my_config_boolean('defaults', 'replace_mk1'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Mk1 coaches with AP Mk1 Coach Pack Vol. 1',
+                     key='Replace_Mk1')],
+        [sg.Checkbox('Replace Mk2A-C coaches', default=get_my_config_boolean('defaults', 'replace_mk2ac'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Mk2a coaches with AP Mk2A-C Pack', key='Replace_Mk2ac')],
+        [sg.Checkbox('Replace Mk2D-F coaches', default=get_my_config_boolean('defaults', 'replace_mk2df'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Mk2e coaches with AP Mk2D-F Pack', key='Replace_Mk2df')],
+        [sg.Checkbox('Replace Mk3A-B coaches', default=get_my_config_boolean('defaults', 'replace_mk3ab'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Mk3A-B coaches with AP Mk3A-B Pack', key='Replace_Mk3ab')],
+        [sg.Checkbox('Replace FSA/FTA wagons', default=get_my_config_boolean('defaults', 'replace_fsa'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of FSA wagons with AP FSA/FTA Wagon Pack', key='Replace_FSA')],
+        [sg.Checkbox('Replace HAA wagons', default=get_my_config_boolean('defaults', 'replace_haa'), enable_events=True,
+                     tooltip='Tick to enable replacing of HAA wagons with AP MGR Wagon Pack', key='Replace_HAA')],
+        [sg.Checkbox('Replace HHA wagons', default=get_my_config_boolean('defaults', 'replace_hha'), enable_events=True,
+                     tooltip='Tick to enable replacing of HHA wagons with AP HHA Wagon Pack', key='Replace_HHA')],
+        [sg.Checkbox('Replace unfitted 21t coal wagons', default=get_my_config_boolean('defaults', 'replace_hto'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of unfitted 21t coal wagons with Fastline Simulation HTO wagons',
+                     key='Replace_HTO')],
+        [sg.Checkbox('Replace fitted 21t coal wagons', default=get_my_config_boolean('defaults', 'replace_htv'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of fitted 21t coal wagons with Fastline Simulation HTV wagons',
+                     key='Replace_HTV')],
+        [sg.Checkbox('Replace TTA wagons', default=get_my_config_boolean('defaults', 'replace_tta'), enable_events=True,
+                     tooltip='Tick to enable replacing of TTA wagons with Armstrong Powerhouse TTA pack',
+                     key='Replace_TTA')],
+        [sg.Checkbox('Replace VDA wagons', default=get_my_config_boolean('defaults', 'replace_vda'), enable_events=True,
+                     tooltip='Tick to enable replacing of VDA wagons with Fastline Simulation VDA pack',
+                     key='Replace_VDA')],
+        [sg.Checkbox('Replace IHH stock', default=get_my_config_boolean('defaults', 'replace_ihh'), enable_events=True,
+                     tooltip='Tick to enable replacing of old Iron Horse House (IHH) stock, if your scenario contains '
+                             'any (if in doubt, leave this unticked)',
+                     key='Replace_IHH')],
+    ]
+    mid_column = [
+        [sg.Checkbox('Replace User-configured stock', default=get_my_config_boolean('defaults', 'replace_user'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of user-configured stock, contained in file User.csv '
+                             '(leave this unticked unless you have added your own substitutions to User.csv).',
+                     key='Replace_User')],
+        [sg.Checkbox('Replace Class 31s', default=get_my_config_boolean('defaults', 'replace_c31'), enable_events=True,
+                     tooltip='Replace Class 31s with AP enhancement pack equivalent', key='Replace_C31')],
+        [sg.Checkbox('Replace Class 37s', default=get_my_config_boolean('defaults', 'replace_c37'), enable_events=True,
+                     tooltip='Replace Class 37s with AP equivalent', key='Replace_C37')],
+        [sg.Checkbox('Replace Class 40s', default=get_my_config_boolean('defaults', 'replace_c40'), enable_events=True,
+                     tooltip='Replace DT Class 40s with AP/RailRight equivalent', key='Replace_C40')],
+        [sg.Checkbox('Replace Class 47s', default=get_my_config_boolean('defaults', 'replace_c47'), enable_events=True,
+                     tooltip='Replace BR Blue Class 47s with Vulcan Productions BR Blue Class 47 Pack versions',
+                     key='Replace_C47')],
+        [sg.Checkbox('Replace Class 50s', default=get_my_config_boolean('defaults', 'replace_c50'), enable_events=True,
+                     tooltip='Replace MeshTools Class 50s with AP equivalent', key='Replace_C50')],
+        [sg.Checkbox('Replace Class 56s', default=get_my_config_boolean('defaults', 'replace_c56'), enable_events=True,
+                     tooltip='Replace RSC Class 56 Railfreight Sectors with AP enhancement pack equivalent',
+                     key='Replace_C56')],
+        [sg.Checkbox('Replace Class 66s', default=get_my_config_boolean('defaults', 'replace_c66'), enable_events=True,
+                     tooltip='Replace Class 66s with AP enhancement pack equivalent', key='Replace_C66')],
+        [sg.Checkbox('Replace Class 67s', default=get_my_config_boolean('defaults', 'replace_c67'), enable_events=True,
+                     tooltip='Replace Class 67s with AP enhancement pack equivalent', key='Replace_C67')],
+        [sg.Checkbox('Replace Class 68s', default=get_my_config_boolean('defaults', 'replace_c68'), enable_events=True,
+                     tooltip='Replace Class 68s with AP enhancement pack equivalent', key='Replace_C68')],
+        [sg.Checkbox('Replace Class 86s', default=get_my_config_boolean('defaults', 'replace_c86'), enable_events=True,
+                     tooltip='Replace Class 86s with AP enhancement pack equivalent', key='Replace_C86')],
+        [sg.Checkbox('Replace Class 87s', default=get_my_config_boolean('defaults', 'replace_c87'), enable_events=True,
+                     tooltip='Replace Class 87s with AP equivalent', key='Replace_C87')],
+        [sg.Checkbox('Replace HST sets', default=get_my_config_boolean('defaults', 'replace_hst'), enable_events=True,
+                     tooltip='Tick to enable replacing of HST sets with AP enhanced versions (Valenta, MTU, VP185)',
+                     key='Replace_HST')],
+        [sg.Checkbox('Replace Class 91 EC sets', default=get_my_config_boolean('defaults', 'replace_c91'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 91 East Coast sets with AP enhanced versions',
+                     key='Replace_C91')],
+        [sg.Checkbox('Replace Class 101 sets', default=get_my_config_boolean('defaults', 'replace_c101'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of retired RSC Class101Pack with RSC BritishRailClass101 sets',
+                     key='Replace_C101')],
+        [sg.Checkbox('Replace Class 150/2 sets', default=get_my_config_boolean('defaults', 'replace_c150'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing Thomson-Oovee Class 150s with AP Class 150/2',
+                     key='Replace_C150')],
+    ]
+    right_column = [
+        [sg.Checkbox('Replace Class 156 sets', default=get_my_config_boolean('defaults', 'replace_c156'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Oovee Class 156s with AP Class 156', key='Replace_C156')],
+        [sg.Checkbox('Replace Class 158, 159 sets', default=get_my_config_boolean('defaults', 'replace_c158'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of North Wales Coast / Settle Carlisle / Fife Circle Class 158s '
+                             'with AP enhanced versions (Cummins, Perkins)',
+                     key='Replace_C158')],
+        [sg.Checkbox('Replace Class 168, 170, 171 sets', default=get_my_config_boolean('defaults', 'replace_c170'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 168s / 170s with AP enhanced versions',
+                     key='Replace_C170')],
+        [sg.Checkbox('Replace Class 175 sets', default=get_my_config_boolean('defaults', 'replace_c175'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 175s with AP enhanced versions',
+                     key='Replace_C175')],
+        [sg.Checkbox('Replace Class 220, 221 sets', default=get_my_config_boolean('defaults', 'replace_c221'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of DTG Voyager with JT Advanced Voyager',
+                     key='Replace_C221')],
+        [sg.Checkbox('Replace Class 319 sets', default=get_my_config_boolean('defaults', 'replace_c319'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 319s with AP versions',
+                     key='Replace_C319')],
+        [sg.Checkbox('Replace Class 325 sets', default=get_my_config_boolean('defaults', 'replace_c325'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 325s with AP enhanced versions',
+                     key='Replace_C325')],
+        [sg.Checkbox('Replace Class 350 sets', default=get_my_config_boolean('defaults', 'replace_c350'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 350s with AP enhanced versions',
+                     key='Replace_C350')],
+        [sg.Checkbox('Replace Class 365 sets', default=get_my_config_boolean('defaults', 'replace_c365'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 365s with AP enhanced versions',
+                     key='Replace_C365')],
+        [sg.Checkbox('Replace Class 375/377/379/387 sets', default=get_my_config_boolean('defaults', 'replace_c375'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 375/377/379/387 with AP enhanced versions',
+                     key='Replace_C375')],
+        [sg.Checkbox('Replace Class 444, 450 sets', default=get_my_config_boolean('defaults', 'replace_c450'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 444, 450s with AP enhanced versions',
+                     key='Replace_C450')],
+        [sg.Checkbox('Replace Class 456 sets', default=get_my_config_boolean('defaults', 'replace_c456'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 456s with AP/Waggonz versions',
+                     key='Replace_C456')],
+        [sg.Checkbox('Replace Class 465 sets', default=get_my_config_boolean('defaults', 'replace_c465'),
+                     enable_events=True,
+                     tooltip='Tick to enable replacing of Class 465s with AP enhanced versions',
+                     key='Replace_C465')],
+        [sg.Button('Replace!'), sg.Button('Settings'), sg.Button('About'), sg.Button('Exit')],
     ]
-]
-
 
-def dcsv_get_num(this_dcsv, this_rv, this_re):
-    # Try to retrieve the closest match for the loco number from the AP vehicle number database
-    try:
-        dcsv_tree = ET.parse(this_dcsv)
-    except FileNotFoundError:
-        sg.popup('AP vehicle number database ' + str(Path(this_dcsv)) + ' not found.',
-                 'Check you have all the required AP products installed, and that you have clicked "Settings" in this '
-                 'program and set the location of your RailWorks folder correctly.',
-                 'This program will now quit.', title='Error')
-        sys.exit('Fatal Error: AP vehicle number database ' + str(Path(this_dcsv)) + ' not found.')
-    except ET.ParseError:
-        sg.popup('AP vehicle number database ' + str(Path(this_dcsv)) + ' was found but could not be parsed.',
-                 'This program will now quit.', title='Error')
-        sys.exit(
-            'Fatal Error: AP vehicle number database ' + str(Path(this_dcsv)) + ' was found but could not be parsed.')
-    diff = 0
-    last_nm = this_rv
-    ithis_rv = int(this_rv)
-    s = set(rv_list)
-    root = dcsv_tree.getroot()
-    for vnum in root.findall("./CSVItem/cCSVItem/Name"):
-        # Iterate through the list of TOPS numbers until we find a number we haven't previously used which is an exact
-        # match or the closest match for the number we're looking for
-        nm = re.search(this_re, vnum.text)
-        if nm:
-            curr_nm = nm.group(1) + nm.group(2)
-            dcsv_nm = int(nm.group(1))
-            if curr_nm in s:
-                # This dcsv number is already in use in another swapped loco - move on and try the next one
-                continue
-            if ithis_rv > dcsv_nm:
-                # This dcsv number is still less than the number we're looking for - but remember how close it is and try the
-                # next one to see if it is a match or is even further away than this number.
-                diff = ithis_rv - dcsv_nm
-            elif ithis_rv == dcsv_nm:
-                # A matching number is available and has been found - use it.
-                return str(curr_nm)
-            elif ithis_rv < dcsv_nm:
-                # We have overshot the number we are looking for - but if this number is even further from the number
-                # we're looking for than the last one we looked at, use the last one.
-                if dcsv_nm - ithis_rv > diff:
-                    return str(last_nm)
-                else:
-                    # We've checked and even though we have overshot the number we are looking for, this number is
-                    # closer to the number we're looking for than the last one we looked at - so use it.
-                    return str(curr_nm)
-            last_nm = curr_nm
-    # We didn't find a number to use. We must have reached the end of the available numbers so we will have to use the
-    # last available number we found.
-    return str(last_nm)
+    # Set the layout of the application window
+    return [
+        [
+            sg.Column(left_column),
+            sg.VSeperator(),
+            sg.Column(mid_column),
+            sg.VSeperator(),
+            sg.Column(right_column),
+        ]
+    ]
 
 
-def csv_get_blue47num(front, this_rv):
+class Swapper:
+    # The state of the swaps being made in one scenario, which is handed to each of the replacers. values holds the
+    # substitutions chosen, keyed on the names of their checkboxes. rv_list holds the vehicle numbers used so far, and
+    # rv_pairs the vehicle numbers changed, as [old number, new number]. mu_last remembers the last driving vehicle seen
+    # in the consist being processed, and mso_num the last Class 319 unit number seen in the scenario - it is not reset
+    # between consists - so the multiple unit replacers can keep the vehicles of a unit together. input_vehicle_list
+    # and output_vehicle_list hold the rows of the report.
+    def __init__(self, values):
+        self.values = values
+        self.rv_list = []
+        self.rv_pairs = []
+        self.mu_last = 'none'
+        self.mso_num = ''
+        self.input_vehicle_list = []
+        self.output_vehicle_list = []
+        # The number allocators set up from vehicle number databases so far, and how often a swap rule lookup was
+        # remembered or searched for
+        self.number_allocators = {}
+        self.vehicle_rule_memo_stats = {'hits': 0, 'misses': 0}
+        # The time spent waiting for serz.exe to convert the scenario
+        self.serz_seconds = 0.0
+        # The number of RailVehicles lists processed so far, which numbers the consists in the report
+        self.consist_nr = 0
+        # The changes in rv_pairs indexed by their old numbers, and how many of them have been indexed
+        self.renumbering = {}
+        self.renumbering_size = 0
+        # The vehicle numbers referred to by the driver instructions of consists already written, when streaming
+        self.instruction_rvs = set()
+        # The positions in swap_handlers of the enabled substitutions, and of those which could claim each distinct
+        # vehicle found so far
+        self.enabled_swap_handlers = [i for i in range(0, len(swap_handlers)) if values[swap_handlers[i][0]]]
+        self.swap_dispatch = {}
+
+
+def get_dcsv_allocator(swapper, this_dcsv, this_re, number_group, name_groups):
+    # Return the number allocator for this AP vehicle number database and regular expression, setting it up from the
+    # database the first time it is asked for in a run. The number is found in group number_group of each match, and
+    # the vehicle number to use is made up from the groups in name_groups.
+    key = (str(this_dcsv), this_re)
+    if key not in swapper.number_allocators:
+        try:
+            dcsv_names = get_dcsv_names(this_dcsv)
+        except FileNotFoundError:
+            show_message('AP vehicle number database ' + str(Path(this_dcsv)) + ' not found.',
+                         'Check you have all the required AP products installed, and that you have clicked '
+                         '"Settings" in this program and set the location of your RailWorks folder correctly.',
+                         'This program will now quit.', title='Error')
+            sys.exit('Fatal Error: AP vehicle number database ' + str(Path(this_dcsv)) + ' not found.')
+        except ET.ParseError:
+            show_message('AP vehicle number database ' + str(Path(this_dcsv)) + ' was found but could not be '
+                                                                                 'parsed.',
+                         'This program will now quit.', title='Error')
+            sys.exit('Fatal Error: AP vehicle number database ' + str(Path(this_dcsv)) +
+                     ' was found but could not be parsed.')
+        entries = []
+        for vnum in dcsv_names:
+            nm = re.search(this_re, vnum)
+            if nm:
+                curr_nm = ''.join(nm.group(g) for g in name_groups)
+                entries.append((curr_nm, int(nm.group(number_group)), curr_nm))
+        swapper.number_allocators[key] = NumberAllocator(entries)
+    return swapper.number_allocators[key]
+
+
+def dcsv_get_num(swapper, this_dcsv, this_rv, this_re):
+    # Try to retrieve the closest match for the loco number from the AP vehicle number database - a number we haven't
+    # previously used which is an exact match or the closest match for the number we're looking for. If there isn't a
+    # lower number to compare with the next one up, keep the number we have.
+    allocator = get_dcsv_allocator(swapper, this_dcsv, this_re, 1, (1, 2))
+    return str(allocator.nearest(int(this_rv), this_rv, swapper.rv_list))
+
+
+def csv_get_blue47num(swapper, front, this_rv):
+    # Find the closest match for the loco number we haven't previously used, within the same subclass
     ithis_rv = int(this_rv)
-    last_loco = vp_blue_47_db[front][0]
-    diff = 0
-    s = set(rv_list)
-    for loco in vp_blue_47_db[front]:
-        # Iterate through the list of TOPS numbers until we find a number we haven't previously used which is an exact
-        # match or the closest match for the number we're looking for, within the same subclass
-        curr_nm = loco[0]
-        dcsv_nm = int(loco[2])
-        if curr_nm in s:
-            # This number is already in use in another swapped loco - move on and try the next one
-            continue
-        if ithis_rv > dcsv_nm:
-            # This number is still less than the number we're looking for - but remember how close it is and try the
-            # next one to see if it is a match or is even further away than this number.
-            diff = ithis_rv - dcsv_nm
-        elif ithis_rv == dcsv_nm:
-            # A matching number is available and has been found - use it.
-            return loco
-        elif ithis_rv < dcsv_nm:
-            # We have overshot the number we are looking for - but if this number is even further from the number we're
-            # looking for than the last one we looked at, use the last one.
-            # Also, check to see if we have crossed the boundary into another subclass and if we have, remember the last
-            # available number we found (from the previous subclass) and use that instead.
-            if (dcsv_nm - ithis_rv > diff) or \
-                    (ithis_rv < 47301 and dcsv_nm >= 47301) or \
-                    (ithis_rv < 47401 and dcsv_nm >= 47401) or \
-                    (ithis_rv < 47701 and dcsv_nm >= 47701):
-                return last_loco
-            else:
-                # We've checked and this number is within the same subclass and even though we have overshot the number
-                # we are looking for, this number is closer to the number we're looking for than the last one we
-                # looked at - so use it.
-                return loco
-        last_loco = loco
-    # We didn't find a number to use. We must have reached the end of the available numbers so we will have to use the
-    # last available number we found.
-    return last_loco
+    key = ('vp_blue_47_db', front)
+    if key not in swapper.number_allocators:
+        swapper.number_allocators[key] = NumberAllocator(
+            [(loco[0], int(loco[2]), loco) for loco in vp_blue_47_db[front]], (47301, 47401, 47701))
+    return swapper.number_allocators[key].nearest(ithis_rv, vp_blue_47_db[front][0], swapper.rv_list)
 
 
-def dcsv_gethstloco(this_dcsv, this_rv):
+def dcsv_gethstloco(swapper, this_dcsv, this_rv):
     # Try to retrieve the closest match for the HST power car number from the AP vehicle number database
-    try:
-        dcsv_tree = ET.parse(this_dcsv)
-    except FileNotFoundError:
-        sg.popup('AP vehicle number database ' + str(Path(this_dcsv)) + ' not found.',
-                 'Check you have all the required AP products installed, and that you have clicked "Settings" in this '
-                 'program and set the location of your RailWorks folder correctly.',
-                 'This program will now quit.', title='Error')
-        sys.exit('Fatal Error: AP vehicle number database ' + str(Path(this_dcsv)) + ' not found.')
-    except ET.ParseError:
-        sg.popup('AP vehicle number database ' + str(Path(this_dcsv)) + ' was found but could not be parsed.',
-                 'This program will now quit.', title='Error')
-        sys.exit(
-            'Fatal Error: AP vehicle number database ' + str(Path(this_dcsv)) + ' was found but could not be parsed.')
-    diff = 0
-    last_nm = this_rv
+    allocator = get_dcsv_allocator(swapper, this_dcsv, '(.?)(43[0-9]{3})(.*)', 2, (1, 2, 3))
     irv = re.search('(43[0-9]{3})', this_rv)
-    ithis_rv = int(irv.group(1))
-    s = set(rv_list)
-    root = dcsv_tree.getroot()
-    for vnum in root.findall("./CSVItem/cCSVItem/Name"):
-        # Iterate through the list of TOPS numbers until we find a number we haven't previously used which is an exact
-        # match or the closest match for the number we're looking for
-        nm = re.search('(.?)(43[0-9]{3})(.*)', vnum.text)
-        if nm:
-            curr_nm = nm.group(1) + nm.group(2) + nm.group(3)
-            dcsv_nm = int(nm.group(2))
-            if curr_nm in s:
-                # This number is already in use in another swapped power car - move on and try the next one
-                continue
-            if ithis_rv > dcsv_nm:
-                # This number is still less than the number we're looking for - but remember how close it is and try the
-                # next one to see if it is a match or is even further away than this number.
-                diff = ithis_rv - dcsv_nm
-            elif ithis_rv == dcsv_nm:
-                # A matching number is available and has been found - use it.
-                return curr_nm
-            elif ithis_rv < dcsv_nm:
-                # We have overshot the number we are looking for - but if this number is even further from the number
-                # we're looking for than the last one we looked at, use the last one.
-                if dcsv_nm - ithis_rv > diff:
-                    return last_nm
-                else:
-                    # We've checked and even though we have overshot the number we are looking for, this number is
-                    # closer to the number we're looking for than the last one we looked at - so use it.
-                    return curr_nm
-            last_nm = curr_nm
-    # We didn't find a number to use. We must have reached the end of the available numbers so we will have to use the
-    # last available number we found.
-    return last_nm
+    return allocator.nearest(int(irv.group(1)), this_rv, swapper.rv_list)
 
 
-def alternate_mu_driving_vehicles(this_bp, this_v_type, vehicle_a, vehicle_b):
+def alternate_mu_driving_vehicles(swapper, this_bp, this_v_type, vehicle_a, vehicle_b):
     # This function makes sure that driving vehicles in a multiple unit consist alternate between DxxA and DxxB
     # so that the AP scripting of multiple unit sets works properly.
-    global mu_last
     if this_v_type.upper() == vehicle_a.upper():
         # Test if last Driving vehicle was a DxxA - if so, swap this one for a DxxB
-        if mu_last == vehicle_a:
+        if swapper.mu_last == vehicle_a:
             # Swap for a DxxB
             this_bp = re.sub(vehicle_a, vehicle_b, this_bp, flags=re.IGNORECASE)
             # Remember that the last driven vehicle in this consist was a DxxB.
-            mu_last = vehicle_b
+            swapper.mu_last = vehicle_b
         else:
             # Leave the DxxA as it is. Remember that the last driving vehicle processed in this
             # consist was a DxxA.
-            mu_last = vehicle_a
+            swapper.mu_last = vehicle_a
         return this_bp
     elif this_v_type.upper() == vehicle_b.upper():
         # Test if last Driving vehicle was a DxxB - if so, swap this one for a DxxA
-        if mu_last == vehicle_b:
+        if swapper.mu_last == vehicle_b:
             # Swap for a DxxA
             this_bp = re.sub(vehicle_b, vehicle_a, this_bp, flags=re.IGNORECASE)
             # Remember that the last cab vehicle in this consist was a DxxA.
-            mu_last = vehicle_a
+            swapper.mu_last = vehicle_a
         else:
             # Leave the DxxB as it is. Remember that the last driving vehicle processed in this
             # consist was a DxxB.
-            mu_last = vehicle_b
+            swapper.mu_last = vehicle_b
     return this_bp
 
 
@@ -690,410 +764,374 @@ def add_taillamp(tailmarker, this_blueprint, bp_suffix, this_name, name_suffix,
     return this_blueprint, this_name
 
 
-def haa_replace(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker):
+def haa_replace(swapper, rv):
     # Replace HAA wagons
-    for i in range(0, len(vehicle_db['HAA'])):
-        this_vehicle = vehicle_db['HAA'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = 'AP'
-                    product.text = 'HAAWagonPack01'
-                    weathering = random.choice([('', ''), ('2', ' W1'), ('2', ' W1'), ('3', ' W2'), ('3', ' W2')])
-                    if 'eTrue' in loaded.text:
-                        load = ['_LD', 'Loaded']
-                    else:
-                        load = ['', 'Empty']
-                    variant = config.get('defaults', 'mgr_variant', fallback='HAA')
-                    livery = config.get('defaults', 'mgr_livery', fallback='Maroon Only')
-                    if variant == 'HAA only':
-                        bp = 'HAA'
-                    elif variant == 'HCA (canopy) only':
-                        bp = 'HCA'
-                    elif variant == 'HFA (canopy) only':
-                        bp = 'HFA'
-                    elif variant == 'HAA and HCA (canopy) mixed':
-                        bp = random.choice(['HAA', 'HCA'])
-                    elif variant == 'HAA, HCA (canopy) and HFA (canopy) mixed':
-                        bp = random.choice(['HAA', 'HCA', 'HFA'])
-                    elif variant == 'HDA only':
-                        bp = 'HDA'
-                    elif variant == 'HBA (canopy) only':
-                        bp = 'HBA'
-                    elif variant == 'HDA and HBA (canopy) mixed':
-                        bp = random.choice(['HDA', 'HBA'])
-                    elif variant == 'HMA only':
-                        bp = 'HMA'
-                    elif variant == 'HNA (canopy) only':
-                        bp = 'HNA'
-                    elif variant == 'HMA and HNA (canopy) mixed':
-                        bp = random.choice(['HMA', 'HNA'])
-                    else:
-                        # Completely random MGR wagon
-                        bp = random.choice(['HAA', 'HBA', 'HCA', 'HDA', 'HFA', 'HMA', 'HNA'])
-                    if livery == 'Maroon only':
-                        lv = ['EWS', ' Red ']
-                    elif livery == 'Blue only':
-                        lv = ['Blue', ' Blue ']
-                    elif livery == 'Maroon and Blue':
-                        lv = random.choice([('EWS', ' Red '), ('Blue', ' Blue ')])
-                    elif livery == 'Sectors and Maroon':
-                        lv = random.choice([('Sector', ' Sector '), ('EWS', ' Red ')])
-                    elif livery == 'Sectors and Blue':
-                        lv = random.choice([('Sector', ' Sector '), ('Blue', ' Blue ')])
-                    else:
-                        # Completely random livery
-                        lv = random.choice([('EWS', ' Red '), ('Blue', ' Blue '), ('Sector', ' Sector ')])
-                    blueprint.text = 'RailVehicles\\Freight\\HAA\\' + lv[0] + weathering[0] + '\\' + bp + load[
-                        0] + '.xml'
-                    name.text = 'AP ' + bp + lv[1] + load[1] + weathering[1]
-                    if not tailmarker == 1:
-                        # change to a tail lamp carrying wagon and try to orient it with the lamp outward facing
-                        blueprint.text, name.text = add_taillamp(tailmarker, blueprint.text, '_TL.xml', name.text,
-                                                                 ' TL', flipped, followers)
-                    # Now extract the vehicle number
-                    rv_list.append(number.text)
-                    return True
+    this_vehicle = find_vehicle_rule(swapper, 'HAA', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = 'AP'
+        rv.product.text = 'HAAWagonPack01'
+        weathering = random.choice([('', ''), ('2', ' W1'), ('2', ' W1'), ('3', ' W2'), ('3', ' W2')])
+        if 'eTrue' in rv.loaded.text:
+            load = ['_LD', 'Loaded']
+        else:
+            load = ['', 'Empty']
+        variant = config.get('defaults', 'mgr_variant', fallback='HAA')
+        livery = config.get('defaults', 'mgr_livery', fallback='Maroon Only')
+        if variant == 'HAA only':
+            bp = 'HAA'
+        elif variant == 'HCA (canopy) only':
+            bp = 'HCA'
+        elif variant == 'HFA (canopy) only':
+            bp = 'HFA'
+        elif variant == 'HAA and HCA (canopy) mixed':
+            bp = random.choice(['HAA', 'HCA'])
+        elif variant == 'HAA, HCA (canopy) and HFA (canopy) mixed':
+            bp = random.choice(['HAA', 'HCA', 'HFA'])
+        elif variant == 'HDA only':
+            bp = 'HDA'
+        elif variant == 'HBA (canopy) only':
+            bp = 'HBA'
+        elif variant == 'HDA and HBA (canopy) mixed':
+            bp = random.choice(['HDA', 'HBA'])
+        elif variant == 'HMA only':
+            bp = 'HMA'
+        elif variant == 'HNA (canopy) only':
+            bp = 'HNA'
+        elif variant == 'HMA and HNA (canopy) mixed':
+            bp = random.choice(['HMA', 'HNA'])
+        else:
+            # Completely random MGR wagon
+            bp = random.choice(['HAA', 'HBA', 'HCA', 'HDA', 'HFA', 'HMA', 'HNA'])
+        if livery == 'Maroon only':
+            lv = ['EWS', ' Red ']
+        elif livery == 'Blue only':
+            lv = ['Blue', ' Blue ']
+        elif livery == 'Maroon and Blue':
+            lv = random.choice([('EWS', ' Red '), ('Blue', ' Blue ')])
+        elif livery == 'Sectors and Maroon':
+            lv = random.choice([('Sector', ' Sector '), ('EWS', ' Red ')])
+        elif livery == 'Sectors and Blue':
+            lv = random.choice([('Sector', ' Sector '), ('Blue', ' Blue ')])
+        else:
+            # Completely random livery
+            lv = random.choice([('EWS', ' Red '), ('Blue', ' Blue '), ('Sector', ' Sector ')])
+        rv.blueprint.text = 'RailVehicles\\Freight\\HAA\\' + lv[0] + weathering[0] + '\\' + bp + load[
+               0] + '.xml'
+        rv.name.text = 'AP ' + bp + lv[1] + load[1] + weathering[1]
+        if not rv.tailmarker == 1:
+            # change to a tail lamp carrying wagon and try to orient it with the lamp outward facing
+            rv.blueprint.text, rv.name.text = add_taillamp(rv.tailmarker, rv.blueprint.text, '_TL.xml', rv.name.text,
+                                                           ' TL', rv.flipped, rv.followers)
+        # Now extract the vehicle number
+        swapper.rv_list.append(rv.number.text)
+        return True
     return False
 
 
-def hha_replace(provider, product, blueprint, name, number, loaded):
+def hha_replace(swapper, rv):
     # Replace HHA wagons
-    for i in range(0, len(vehicle_db['HHA'])):
-        this_vehicle = vehicle_db['HHA'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = 'AP'
-                    product.text = 'HHAWagonPack01'
-                    # Replace a loaded wagon
-                    if 'eTrue' in loaded.text or bool(re.search('_LOADED', blueprint.text, flags=re.IGNORECASE)):
-                        idx = random.randrange(0, len(hha_l_wagons))
-                        # Select at random one of the wagons in the list of HHA loaded wagons to swap in
-                        blueprint.text = hha_l_wagons[idx][0]
-                        name.text = hha_l_wagons[idx][1]
-                    # Replace an empty wagon
-                    else:
-                        idx = random.randrange(0, len(hha_e_wagons))
-                        # Select at random one of the wagons in the list of HHA empty wagons to swap in
-                        blueprint.text = hha_e_wagons[idx][0]
-                        name.text = hha_e_wagons[idx][1]
-                    # Now extract the vehicle number
-                    rv_list.append(number.text)
-                    return True
+    this_vehicle = find_vehicle_rule(swapper, 'HHA', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = 'AP'
+        rv.product.text = 'HHAWagonPack01'
+        # Replace a loaded wagon
+        if 'eTrue' in rv.loaded.text or bool(re.search('_LOADED', rv.blueprint.text, flags=re.IGNORECASE)):
+            idx = random.randrange(0, len(hha_l_wagons))
+            # Select at random one of the wagons in the list of HHA loaded wagons to swap in
+            rv.blueprint.text = hha_l_wagons[idx][0]
+            rv.name.text = hha_l_wagons[idx][1]
+        # Replace an empty wagon
+        else:
+            idx = random.randrange(0, len(hha_e_wagons))
+            # Select at random one of the wagons in the list of HHA empty wagons to swap in
+            rv.blueprint.text = hha_e_wagons[idx][0]
+            rv.name.text = hha_e_wagons[idx][1]
+        # Now extract the vehicle number
+        swapper.rv_list.append(rv.number.text)
+        return True
     return False
 
 
-def fsafta_replace(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker):
-    if bool(fsa_replace(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker)):
+def fsafta_replace(swapper, rv):
+    if bool(fsa_replace(swapper, rv)):
         return True
-    if bool(fta_replace(provider, product, blueprint, name, number, loaded)):
+    if bool(fta_replace(swapper, rv)):
         return True
     return False
 
 
-def fsa_replace(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker):
-    for i in range(0, len(vehicle_db['FSA'])):
-        this_vehicle = vehicle_db['FSA'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    era = config.get('defaults', 'fsafta_variant', fallback='FL / 2000 era')
-                    if era == 'RFD / 2000 era':
-                        w = ['RfD', '', '']
-                    elif era == 'FL / 2000 era':
-                        w = ['FL', '_2000', '(2000)']
-                    elif era == 'FL / 2010 era':
-                        w = ['FL', '_2010', '(2010)']
-                    else:
-                        # FL / 2020 era
-                        w = ['FL', '_2020', '(2020)']
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = re.sub("RFD|FL", w[0].upper(), re.sub("_20[0-2]0", w[1], this_vehicle[5]),
-                                            flags=re.IGNORECASE)
-                    name.text = re.sub("RFD|FL", w[0], re.sub('(20[0-2]0)', w[2], this_vehicle[6]),
-                                       flags=re.IGNORECASE)
-                    rv_orig = number.text
-                    if 'eFalse' in loaded.text:
-                        # Wagon is unloaded
-                        number.text = dcsv_get_num(
-                            Path(railworks_path, 'Assets/AP/FSAWagonPack/RailVehicles/Freight/FL/FSA.dcsv'),
-                            number.text,
-                            '([0-9]{6})(.*)')
-                        # Change the blueprint and name to the unloaded wagon
-                        blueprint.text = re.sub('FSA[a-zA-Z0-9_]*.xml', 'FSA.xml', blueprint.text, flags=re.IGNORECASE)
-                        name.text = re.sub('AP.FSA.([a-zA-Z]*).*', r'AP FSA \1', name.text, flags=re.IGNORECASE)
-                    else:
-                        # Check if high cube containers are allowed
-                        if config.get('defaults', 'fsafta_hc',
-                                      fallback='No high cube containers') == 'Allow high cube containers':
-                            dcsv = re.sub('_No_HC', '', this_vehicle[7].replace('\\', '/'))
-                        else:
-                            dcsv = this_vehicle[7].replace('\\', '/')
-                        number.text = dcsv_get_num(
-                            Path(railworks_path, 'Assets/AP/FSAWagonPack', dcsv), number.text,
-                            '([0-9]{6})(.*)')
-                    if not tailmarker == 1:
-                        # change to a tail lamp carrying wagon and try to orient it with the lamp outward facing
-                        blueprint.text, name.text = add_taillamp(tailmarker, blueprint.text, '.xml', name.text,
-                                                                 '', flipped, followers)
-                    rv_pairs.append([rv_orig, number.text])
-                    rv_list.append(number.text)
-                    return True
+def fsa_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'FSA', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        era = config.get('defaults', 'fsafta_variant', fallback='FL / 2000 era')
+        if era == 'RFD / 2000 era':
+            w = ['RfD', '', '']
+        elif era == 'FL / 2000 era':
+            w = ['FL', '_2000', '(2000)']
+        elif era == 'FL / 2010 era':
+            w = ['FL', '_2010', '(2010)']
+        else:
+            # FL / 2020 era
+            w = ['FL', '_2020', '(2020)']
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = re.sub("RFD|FL", w[0].upper(), re.sub("_20[0-2]0", w[1], this_vehicle[5]),
+                                   flags=re.IGNORECASE)
+        rv.name.text = re.sub("RFD|FL", w[0], re.sub('(20[0-2]0)', w[2], this_vehicle[6]),
+                              flags=re.IGNORECASE)
+        rv_orig = rv.number.text
+        if 'eFalse' in rv.loaded.text:
+            # Wagon is unloaded
+            rv.number.text = dcsv_get_num(
+                   swapper, Path(railworks_path, 'Assets/AP/FSAWagonPack/RailVehicles/Freight/FL/FSA.dcsv'),
+                   rv.number.text,
+                   '([0-9]{6})(.*)')
+            # Change the blueprint and name to the unloaded wagon
+            rv.blueprint.text = re.sub('FSA[a-zA-Z0-9_]*.xml', 'FSA.xml', rv.blueprint.text, flags=re.IGNORECASE)
+            rv.name.text = re.sub('AP.FSA.([a-zA-Z]*).*', r'AP FSA \1', rv.name.text, flags=re.IGNORECASE)
+        else:
+            # Check if high cube containers are allowed
+            if config.get('defaults', 'fsafta_hc',
+                          fallback='No high cube containers') == 'Allow high cube containers':
+                dcsv = re.sub('_No_HC', '', this_vehicle[7].replace('\\', '/'))
+            else:
+                dcsv = this_vehicle[7].replace('\\', '/')
+            rv.number.text = dcsv_get_num(
+                   swapper, Path(railworks_path, 'Assets/AP/FSAWagonPack', dcsv), rv.number.text,
+                   '([0-9]{6})(.*)')
+        if not rv.tailmarker == 1:
+            # change to a tail lamp carrying wagon and try to orient it with the lamp outward facing
+            rv.blueprint.text, rv.name.text = add_taillamp(rv.tailmarker, rv.blueprint.text, '.xml', rv.name.text,
+                                                           '', rv.flipped, rv.followers)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        swapper.rv_list.append(rv.number.text)
+        return True
     return False
 
 
-def fta_replace(provider, product, blueprint, name, number, loaded):
-    for i in range(0, len(vehicle_db['FTA'])):
-        this_vehicle = vehicle_db['FTA'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    era = config.get('defaults', 'fsafta_variant', fallback='FL / 2000 era')
-                    if era == 'RFD / 2000 era':
-                        w = ['RfD', '', '']
-                    elif era == 'FL / 2000 era':
-                        w = ['FL', '_2000', '(2000)']
-                    elif era == 'FL / 2010 era':
-                        w = ['FL', '_2010', '(2010)']
-                    else:
-                        # FL / 2020 era
-                        w = ['FL', '_2020', '(2020)']
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = re.sub("RFD|FL", w[0].upper(), re.sub("_20[0-2]0", w[1], this_vehicle[5]),
-                                            flags=re.IGNORECASE)
-                    name.text = re.sub("RFD|FL", w[0], re.sub('(20[0-2]0)', w[2], this_vehicle[6]),
-                                       flags=re.IGNORECASE)
-                    rv_orig = number.text
-                    if 'eFalse' in loaded.text:
-                        # Wagon is unloaded
-                        number.text = dcsv_get_num(
-                            Path(railworks_path, 'Assets/AP/FSAWagonPack/RailVehicles/Freight/FL/FTA.dcsv'),
-                            number.text,
-                            '([0-9]{6})(.*)')
-                        # Change the blueprint and name to the unloaded wagon
-                        blueprint.text = re.sub('FTA[a-zA-Z0-9_]*.xml', 'FTA.xml', blueprint.text, flags=re.IGNORECASE)
-                        name.text = re.sub('AP.FTA.([a-zA-Z]*).*', r'AP FTA \1', name.text, flags=re.IGNORECASE)
-                    else:
-                        # Check if high cube containers are allowed
-                        if config.get('defaults', 'fsafta_hc',
-                                      fallback='No high cube containers') == 'Allow high cube containers':
-                            dcsv = re.sub('_No_HC', '', this_vehicle[7].replace('\\', '/'))
-                        else:
-                            dcsv = this_vehicle[7].replace('\\', '/')
-                        number.text = dcsv_get_num(
-                            Path(railworks_path, 'Assets/AP/FSAWagonPack', dcsv), number.text,
-                            '([0-9]{6})(.*)')
-                    rv_pairs.append([rv_orig, number.text])
-                    rv_list.append(number.text)
-                    return True
+def fta_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'FTA', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        era = config.get('defaults', 'fsafta_variant', fallback='FL / 2000 era')
+        if era == 'RFD / 2000 era':
+            w = ['RfD', '', '']
+        elif era == 'FL / 2000 era':
+            w = ['FL', '_2000', '(2000)']
+        elif era == 'FL / 2010 era':
+            w = ['FL', '_2010', '(2010)']
+        else:
+            # FL / 2020 era
+            w = ['FL', '_2020', '(2020)']
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = re.sub("RFD|FL", w[0].upper(), re.sub("_20[0-2]0", w[1], this_vehicle[5]),
+                                   flags=re.IGNORECASE)
+        rv.name.text = re.sub("RFD|FL", w[0], re.sub('(20[0-2]0)', w[2], this_vehicle[6]),
+                              flags=re.IGNORECASE)
+        rv_orig = rv.number.text
+        if 'eFalse' in rv.loaded.text:
+            # Wagon is unloaded
+            rv.number.text = dcsv_get_num(
+                   swapper, Path(railworks_path, 'Assets/AP/FSAWagonPack/RailVehicles/Freight/FL/FTA.dcsv'),
+                   rv.number.text,
+                   '([0-9]{6})(.*)')
+            # Change the blueprint and name to the unloaded wagon
+            rv.blueprint.text = re.sub('FTA[a-zA-Z0-9_]*.xml', 'FTA.xml', rv.blueprint.text, flags=re.IGNORECASE)
+            rv.name.text = re.sub('AP.FTA.([a-zA-Z]*).*', r'AP FTA \1', rv.name.text, flags=re.IGNORECASE)
+        else:
+            # Check if high cube containers are allowed
+            if config.get('defaults', 'fsafta_hc',
+                          fallback='No high cube containers') == 'Allow high cube containers':
+                dcsv = re.sub('_No_HC', '', this_vehicle[7].replace('\\', '/'))
+            else:
+                dcsv = this_vehicle[7].replace('\\', '/')
+            rv.number.text = dcsv_get_num(
+                   swapper, Path(railworks_path, 'Assets/AP/FSAWagonPack', dcsv), rv.number.text,
+                   '([0-9]{6})(.*)')
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        swapper.rv_list.append(rv.number.text)
+        return True
     return False
 
 
-def tta_replace(provider, product, blueprint, name, number, loaded):
-    for i in range(0, len(vehicle_db['TTA'])):
-        this_vehicle = vehicle_db['TTA'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    (w_blueprint, w_name) = set_weathering(3, this_vehicle)
-                    blueprint.text = w_blueprint
-                    name.text = w_name
-                    number_suffix = this_vehicle[7]
-                    rv_orig = number.text
-                    if number_suffix[0:1] == ';' and 'eTrue' in loaded.text:
-                        # Wagon is loaded
-                        # Change the blueprint and name to the unloaded wagon
-                        blueprint.text = re.sub('.xml', '_LD.xml', blueprint.text, flags=re.IGNORECASE)
-                        name.text = re.sub('Empty', 'Loaded', name.text, flags=re.IGNORECASE)
-                    elif number_suffix[0:1] != ';':
-                        number_suffix = number_suffix[1:]
-                    loaded.text = 'eFalse'
-                    number.text = rv_orig + number_suffix
-                    rv_pairs.append([rv_orig, number.text])
-                    rv_list.append(number.text)
-                    return True
+def tta_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'TTA', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        (w_blueprint, w_name) = set_weathering(3, this_vehicle)
+        rv.blueprint.text = w_blueprint
+        rv.name.text = w_name
+        number_suffix = this_vehicle[7]
+        rv_orig = rv.number.text
+        if number_suffix[0:1] == ';' and 'eTrue' in rv.loaded.text:
+            # Wagon is loaded
+            # Change the blueprint and name to the unloaded wagon
+            rv.blueprint.text = re.sub('.xml', '_LD.xml', rv.blueprint.text, flags=re.IGNORECASE)
+            rv.name.text = re.sub('Empty', 'Loaded', rv.name.text, flags=re.IGNORECASE)
+        elif number_suffix[0:1] != ';':
+            number_suffix = number_suffix[1:]
+        rv.loaded.text = 'eFalse'
+        rv.number.text = rv_orig + number_suffix
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        swapper.rv_list.append(rv.number.text)
+        return True
     return False
 
 
-def mk1_replace(provider, product, blueprint, name, number):
+def mk1_replace(swapper, rv):
     # Replace any Mk1s - loop through the VehicleDB['Mk1'] array of coaches to search for
-    for i in range(0, len(vehicle_db['Mk1'])):
-        this_vehicle = vehicle_db['Mk1'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    # Now extract the region code (if there is one) and the coach number
-                    nm = re.search('([a-zA-Z]{0,2})([0-9]{4,5})', number.text)
-                    if nm:
-                        rv_orig = number.text
-                        region = nm.group(1).upper()
-                        num = nm.group(2)
-                        # Express the region prefix (or lack of) in a manner compatible with AP numbering scheme
-                        if region == 'E' or region == 'S' or region == 'W' or region == 'SC':
-                            ap_suffix = ';R=' + region
-                        elif len(region) < 1:
-                            ap_suffix = ';R=Z'
-                        else:
-                            ap_suffix = ''
-                        num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                 this_vehicle[7].replace('\\', '/')), num, '([0-9]{4,5})(.*)')
-                        if ' (Newspapers)' in name.text:
-                            # Add the AP coach number suffix to display the Newspapers branding on BG coaches
-                            ap_suffix = ap_suffix + ";L=6"
-                        elif ' (Parcels)' in name.text:
-                            # Add the AP coach number suffix to display the Parcels branding on BG coaches
-                            ap_suffix = ap_suffix + ";L=3"
-                        elif ' (ScotRail)' in name.text:
-                            # Add the AP coach number suffix to display the ScotRail branding on BR Blue/Grey coaches
-                            ap_suffix = ";R=SC;L=5"
-                        elif ' (Swallow)' in name.text:
-                            # Add the AP coach number suffix to display the Swallow brand on InterCity coaches
-                            ap_suffix = ap_suffix + ";L=2"
-                        elif 'BR Blue/Grey (NSE)' in name.text:
-                            # Add the AP coach number suffix to display the NSE branding on BR Blue/Grey coaches
-                            ap_suffix = ";L=2"
-                        elif ' (unbranded)' in name.text:
-                            # Add the AP coach number suffix to remove logos
-                            ap_suffix = ";L=0"
-                        rv_num = num + ap_suffix
-                        number.text = rv_num
-                        rv_pairs.append([rv_orig, number.text])
-                        rv_list.append(number.text)
-                        # Following line sets AP coach Number
-                    return True
+    this_vehicle = find_vehicle_rule(swapper, 'Mk1', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        # Now extract the region code (if there is one) and the coach number
+        nm = re.search('([a-zA-Z]{0,2})([0-9]{4,5})', rv.number.text)
+        if nm:
+            rv_orig = rv.number.text
+            region = nm.group(1).upper()
+            num = nm.group(2)
+            # Express the region prefix (or lack of) in a manner compatible with AP numbering scheme
+            if region == 'E' or region == 'S' or region == 'W' or region == 'SC':
+                ap_suffix = ';R=' + region
+            elif len(region) < 1:
+                ap_suffix = ';R=Z'
+            else:
+                ap_suffix = ''
+            num = dcsv_get_num(
+                swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                     this_vehicle[7].replace('\\', '/')), num, '([0-9]{4,5})(.*)')
+            if ' (Newspapers)' in rv.name.text:
+                # Add the AP coach number suffix to display the Newspapers branding on BG coaches
+                ap_suffix = ap_suffix + ";L=6"
+            elif ' (Parcels)' in rv.name.text:
+                # Add the AP coach number suffix to display the Parcels branding on BG coaches
+                ap_suffix = ap_suffix + ";L=3"
+            elif ' (ScotRail)' in rv.name.text:
+                # Add the AP coach number suffix to display the ScotRail branding on BR Blue/Grey coaches
+                ap_suffix = ";R=SC;L=5"
+            elif ' (Swallow)' in rv.name.text:
+                # Add the AP coach number suffix to display the Swallow brand on InterCity coaches
+                ap_suffix = ap_suffix + ";L=2"
+            elif 'BR Blue/Grey (NSE)' in rv.name.text:
+                # Add the AP coach number suffix to display the NSE branding on BR Blue/Grey coaches
+                ap_suffix = ";L=2"
+            elif ' (unbranded)' in rv.name.text:
+                # Add the AP coach number suffix to remove logos
+                ap_suffix = ";L=0"
+            rv_num = num + ap_suffix
+            rv.number.text = rv_num
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
+            swapper.rv_list.append(rv.number.text)
+            # Following line sets AP coach Number
+        return True
     return False
 
 
-def mk2ac_replace(provider, product, blueprint, name, number):
+def mk2ac_replace(swapper, rv):
     # Replace any Mk2a/b/cs - loop through the VehicleDB['Mk2ac'] array of coaches to search for
-    for i in range(0, len(vehicle_db['Mk2ac'])):
-        this_vehicle = vehicle_db['Mk2ac'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    # Now extract the region code (if there is one) and the coach number
-                    nm = re.search('([a-zA-Z]{0,2})([0-9]{4,5})', number.text)
-                    if nm:
-                        rv_orig = number.text
-                        region = nm.group(1).upper()
-                        num = nm.group(2)
-                        ap_suffix = ''
-                        # Express the region prefix (or lack of) in a manner compatible with AP numbering scheme
-                        if region == 'E' or region == 'S' or region == 'W' or region == 'SC':
-                            ap_suffix = ";R=" + region
-                        elif len(region) < 1:
-                            ap_suffix = ";R=Z"
-                        if 'BR Blue/Grey NSE' in name.text:
-                            # Add the AP coach number suffix to display the BR Blue/Grey NSE branding
-                            ap_suffix = ap_suffix + ";L=2"
-                        elif 'VintageTrains' in name.text:
-                            # Add the AP coach number suffix to remove branding as per Vintage Trains
-                            ap_suffix = ap_suffix + ";L=0"
-                        elif 'BR Blue/Grey ScotRail' in name.text:
-                            # Add the AP coach number suffix to display the BR Blue/Grey ScotRail branding
-                            nm = re.search('R=[^Z]', ap_suffix)
-                            if nm:
-                                # If the original has a non-Scottish region, change it to Sc
-                                ap_suffix = ";R=SC;L=3"
-                            else:
-                                # If the original has no region letter, leave it with no region
-                                ap_suffix = ";R=Z;L=3"
-                        rv_num = num + ap_suffix
-                        rv_pairs.append([rv_orig, rv_num])
-                        rv_list.append(rv_num)
-                        # Following line sets AP coach number
-                        number.text = rv_num
-                    return True
+    this_vehicle = find_vehicle_rule(swapper, 'Mk2ac', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        # Now extract the region code (if there is one) and the coach number
+        nm = re.search('([a-zA-Z]{0,2})([0-9]{4,5})', rv.number.text)
+        if nm:
+            rv_orig = rv.number.text
+            region = nm.group(1).upper()
+            num = nm.group(2)
+            ap_suffix = ''
+            # Express the region prefix (or lack of) in a manner compatible with AP numbering scheme
+            if region == 'E' or region == 'S' or region == 'W' or region == 'SC':
+                ap_suffix = ";R=" + region
+            elif len(region) < 1:
+                ap_suffix = ";R=Z"
+            if 'BR Blue/Grey NSE' in rv.name.text:
+                # Add the AP coach number suffix to display the BR Blue/Grey NSE branding
+                ap_suffix = ap_suffix + ";L=2"
+            elif 'VintageTrains' in rv.name.text:
+                # Add the AP coach number suffix to remove branding as per Vintage Trains
+                ap_suffix = ap_suffix + ";L=0"
+            elif 'BR Blue/Grey ScotRail' in rv.name.text:
+                # Add the AP coach number suffix to display the BR Blue/Grey ScotRail branding
+                nm = re.search('R=[^Z]', ap_suffix)
+                if nm:
+                    # If the original has a non-Scottish region, change it to Sc
+                    ap_suffix = ";R=SC;L=3"
+                else:
+                    # If the original has no region letter, leave it with no region
+                    ap_suffix = ";R=Z;L=3"
+            rv_num = num + ap_suffix
+            swapper.rv_pairs.append([rv_orig, rv_num])
+            swapper.rv_list.append(rv_num)
+            # Following line sets AP coach number
+            rv.number.text = rv_num
+        return True
     return False
 
 
-def mk2df_replace(provider, product, blueprint, name, number):
+def mk2df_replace(swapper, rv):
     # Replace any Mk2d/e/fs - loop through the VehicleDB['Mk2df'] array of coaches to search for
-    for i in range(0, len(vehicle_db['Mk2df'])):
-        this_vehicle = vehicle_db['Mk2df'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    rv_orig = number.text
-                    # Now extract the region code (if there is one) and the coach number
-                    nm = re.search('([0-9]{4,5})', number.text)
-                    if nm:
-                        num = nm.group(1)
-                        ap_suffix = ";R=Z"
-                        rv_num = num + ap_suffix
-                        rv_pairs.append([rv_orig, rv_num])
-                        rv_list.append(rv_num)
-                        # Following line sets AP coach number
-                        number.text = rv_num
-                    return True
+    this_vehicle = find_vehicle_rule(swapper, 'Mk2df', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        rv_orig = rv.number.text
+        # Now extract the region code (if there is one) and the coach number
+        nm = re.search('([0-9]{4,5})', rv.number.text)
+        if nm:
+            num = nm.group(1)
+            ap_suffix = ";R=Z"
+            rv_num = num + ap_suffix
+            swapper.rv_pairs.append([rv_orig, rv_num])
+            swapper.rv_list.append(rv_num)
+            # Following line sets AP coach number
+            rv.number.text = rv_num
+        return True
     return False
 
 
-def mk3ab_replace(provider, product, blueprint, name, number):
+def mk3ab_replace(swapper, rv):
     # Replace any Mk3a/bs - loop through the VehicleDB['Mk3ab'] array of coaches to search for
-    for i in range(0, len(vehicle_db['Mk3ab'])):
-        this_vehicle = vehicle_db['Mk3ab'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    ap_suffix = this_vehicle[7]
-                    rv_orig = number.text
-                    # Now extract the region code (if there is one) and the coach number
-                    nm = re.search('([a-zA-Z]{0,1})([0-9]{5})', number.text)
-                    if nm:
-                        reg = nm.group(1).upper()
-                        num = nm.group(2)
-                        if len(reg) > 0 and 'R=Z' not in ap_suffix:
-                            ap_suffix = ap_suffix + ";R=" + reg
-                        rv_num = num + ap_suffix
-                        rv_pairs.append([rv_orig, rv_num])
-                        rv_list.append(rv_num)
-                        # Following line sets AP coach number
-                        number.text = rv_num
-                    return True
+    this_vehicle = find_vehicle_rule(swapper, 'Mk3ab', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        ap_suffix = this_vehicle[7]
+        rv_orig = rv.number.text
+        # Now extract the region code (if there is one) and the coach number
+        nm = re.search('([a-zA-Z]{0,1})([0-9]{5})', rv.number.text)
+        if nm:
+            reg = nm.group(1).upper()
+            num = nm.group(2)
+            if len(reg) > 0 and 'R=Z' not in ap_suffix:
+                ap_suffix = ap_suffix + ";R=" + reg
+            rv_num = num + ap_suffix
+            swapper.rv_pairs.append([rv_orig, rv_num])
+            swapper.rv_list.append(rv_num)
+            # Following line sets AP coach number
+            rv.number.text = rv_num
+        return True
     return False
 
 
-def vda_replace(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker):
+def vda_replace(swapper, rv):
     # Replace VDA wagons
-    if 'JL' in provider.text:
-        if 'WHL' in product.text:
-            bp = re.search(re.escape(r'RailVehicles\Freight\VDA\VDA.xml'), blueprint.text, flags=re.IGNORECASE)
+    if 'JL' in rv.provider.text:
+        if 'WHL' in rv.product.text:
+            bp = re.search(re.escape(r'RailVehicles\Freight\VDA\VDA.xml'), rv.blueprint.text, flags=re.IGNORECASE)
             if bp:
-                provider.text = 'FastlineSimulation'
-                rv_orig = number.text
-                if 'eTrue' in loaded.text:
+                rv.provider.text = 'FastlineSimulation'
+                rv_orig = rv.number.text
+                if 'eTrue' in rv.loaded.text:
                     load = 'L'  # Replace a loaded wagon
                 else:
                     load = 'E'  # Replace an empty wagon
@@ -1125,7 +1163,7 @@ def vda_replace(provider, product, blueprint, name, number, loaded, flipped, fol
                 # allocated. 750 vehicles were constructed, 330 in lot 3855, 20 in lot 3890, 100 in lot 3856 and 300
                 # in lot 3908.
                 x = random.randrange(0, 750)
-                rv_num = int(number.text)
+                rv_num = int(rv.number.text)
                 if 0 <= x < 330:
                     lot = '3855'
                     m = rv_num % 330
@@ -1139,10 +1177,11 @@ def vda_replace(provider, product, blueprint, name, number, loaded, flipped, fol
                     lot = '3908'
                     m = 9450 + rv_num % 300
                 rv_num = str(m + 200650) + '#####'
-                product.text = 'VDA Vans lot ' + lot
-                blueprint.text = 'RailVehicles\\Freight\\VDA Vans\\VDA_' + lot + '_' + lv + white + '_' + load + weathering + '.xml'
-                name.text = 'VDA: ' + lv + white + ' ' + lot + ' - ' + load + '.' + weathering
-                if not tailmarker == 1:
+                rv.product.text = 'VDA Vans lot ' + lot
+                rv.blueprint.text = 'RailVehicles\\Freight\\VDA Vans\\VDA_' + lot + '_' + lv + white + '_' + load + \
+                                    weathering + '.xml'
+                rv.name.text = 'VDA: ' + lv + white + ' ' + lot + ' - ' + load + '.' + weathering
+                if not rv.tailmarker == 1:
                     # change to a tail lamp carrying wagon and try to orient it with the lamp outward facing
                     tail_style = config.get('defaults', 'tail_style', fallback='Flashing')
                     tail_bp = 'R.xml'
@@ -1152,351 +1191,340 @@ def vda_replace(provider, product, blueprint, name, number, loaded, flipped, fol
                         if lv == 'RF' or (lv == 'M' and weathering == 'D'):
                             tail_bp = 'Rb.xml'
                             tail_name = 'Rb'
-                    blueprint.text, name.text = add_taillamp(tailmarker, blueprint.text, tail_bp, name.text,
-                                                             tail_name, flipped, followers)
+                    rv.blueprint.text, rv.name.text = add_taillamp(rv.tailmarker, rv.blueprint.text, tail_bp,
+                                                                   rv.name.text, tail_name, rv.flipped, rv.followers)
                     # If the vehicle is it the top of the consist it will need to be flipped to have the tail
                     # light facing the right direction
-                    if tailmarker == 0:
-                        if flipped.text == '0':
-                            direction_flip(flipped, followers)
-                    if tailmarker == 2:
-                        if flipped.text == '1':
-                            direction_flip(flipped, followers)
+                    if rv.tailmarker == 0:
+                        if rv.flipped.text == '0':
+                            direction_flip(rv.flipped, rv.followers)
+                    if rv.tailmarker == 2:
+                        if rv.flipped.text == '1':
+                            direction_flip(rv.flipped, rv.followers)
                 # Now process the vehicle number
-                rv_list.append(str(rv_num))
-                rv_pairs.append([rv_orig, str(rv_num)])
+                swapper.rv_list.append(str(rv_num))
+                swapper.rv_pairs.append([rv_orig, str(rv_num)])
                 # Set Fastline wagon number
-                number.text = str(rv_num)
+                rv.number.text = str(rv_num)
                 return True
     return False
 
 
-def coal21_t_hto_replace(provider, product, blueprint, name, number, loaded):
-    for i in range(0, len(vehicle_db['HTO'])):
-        this_vehicle = vehicle_db['HTO'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = 'FastlineSimulation'
-                    rv_orig = number.text
-                    rv_num = int(number.text.replace('B', ''))
-                    if 'eTrue' in loaded.text:
-                        load = 'L'  # Replace a loaded wagon
-                    else:
-                        load = 'E'  # Replace an empty wagon
-                    # Choose a random HTO lot and remap the vehicle number to somewhere within the numbers this lot was
-                    # allocated. 11708 vehicle numbers are possible: 1200 in lot 141, 2750 in lot 143, 6050 in lot 146,
-                    # and 1708 rebodied.
-                    x = random.randrange(0, 11708)
-                    pretops_only = random.choice(['a', 'b', 'c'])
-                    no_pretops = 'd'
-                    if 0 <= x < 1200:
-                        lot = ['Dia 141', '01']
-                        m = HTO_141_numbers[rv_num % 1200]
-                        dirty_w = random.choice([('W2_', 'W2.'), ('W_', 'W1.')])
-                        clean_w = random.choice([('C2_', 'C2.'), ('C_', 'C1.')])
-                    elif 1200 <= x < 3950:
-                        lot = ['Dia 143', '02']
-                        m = HTO_143_numbers[rv_num % 2750]
-                        dirty_w = random.choice([('02_W_', 'W2.'), ('W_', 'W1.')])
-                        clean_w = random.choice([('02_C_', 'C2.'), ('C_', 'C1.')])
-                    elif 3950 <= x < 10000:
-                        lot = ['Dia 146', '04']
-                        m = HTO_146_numbers[rv_num % 6050]
-                        dirty_w = random.choice([('W2_', 'W2.'), ('W_', 'W.')])
-                        clean_w = random.choice([('C2_', 'C2.'), ('C_', 'C.')])
-                    else:
-                        lot = ['Rebodied', '18']
-                        m = HTO_rebodied_numbers[rv_num % 1708]
-                        dirty_w = random.choice([('B_W_', 'B.W.'), ('G_W_', 'G.W.')])
-                        clean_w = random.choice([('B_C_', 'B.C.'), ('G_C_', 'G.C.')])
-                        pretops_only = 'c'
-                        no_pretops = random.choice(['a', 'b', 'd'])
-                    dirty_probability = int(config.get('defaults', 'htx_dirty_probability', fallback='90'))
-                    dirty_dicethrow = random.randrange(1, 101)
-                    if dirty_dicethrow <= dirty_probability:
-                        weathering = dirty_w
-                    else:
-                        weathering = clean_w
-                    data_paneltypes = config.get('defaults', 'htx_era', fallback='Mixed')
-                    if data_paneltypes == 'Pre-TOPS only':
-                        rv_prefix = pretops_only
-                    elif data_paneltypes == 'TOPS only':
-                        rv_prefix = no_pretops
-                    else:
-                        rv_prefix = ''
-                    this_blueprint = 'RailVehicles\\Freight\\HTO\\FS_HT0' + lot[1] + 'A_' + weathering[
-                        0] + load + '.xml'
-                    this_name = 'HTO 21t Hopper - ' + lot[0] + ': ' + weathering[1] + load
-                    rv_num = rv_prefix + 'B' + str(m)
-                    product.text = 'HTO 21t Hoppers - ' + lot[0]
-                    blueprint.text = this_blueprint
-                    name.text = this_name
-                    number.text = rv_num
-                    rv_list.append(rv_num)
-                    rv_pairs.append([rv_orig, rv_num])
-                    return True
+def coal21_t_hto_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'HTO', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = 'FastlineSimulation'
+        rv_orig = rv.number.text
+        rv_num = int(rv.number.text.replace('B', ''))
+        if 'eTrue' in rv.loaded.text:
+            load = 'L'  # Replace a loaded wagon
+        else:
+            load = 'E'  # Replace an empty wagon
+        # Choose a random HTO lot and remap the vehicle number to somewhere within the numbers this lot was
+        # allocated. 11708 vehicle numbers are possible: 1200 in lot 141, 2750 in lot 143, 6050 in lot 146,
+        # and 1708 rebodied.
+        x = random.randrange(0, 11708)
+        pretops_only = random.choice(['a', 'b', 'c'])
+        no_pretops = 'd'
+        if 0 <= x < 1200:
+            lot = ['Dia 141', '01']
+            m = HTO_141_numbers[rv_num % 1200]
+            dirty_w = random.choice([('W2_', 'W2.'), ('W_', 'W1.')])
+            clean_w = random.choice([('C2_', 'C2.'), ('C_', 'C1.')])
+        elif 1200 <= x < 3950:
+            lot = ['Dia 143', '02']
+            m = HTO_143_numbers[rv_num % 2750]
+            dirty_w = random.choice([('02_W_', 'W2.'), ('W_', 'W1.')])
+            clean_w = random.choice([('02_C_', 'C2.'), ('C_', 'C1.')])
+        elif 3950 <= x < 10000:
+            lot = ['Dia 146', '04']
+            m = HTO_146_numbers[rv_num % 6050]
+            dirty_w = random.choice([('W2_', 'W2.'), ('W_', 'W.')])
+            clean_w = random.choice([('C2_', 'C2.'), ('C_', 'C.')])
+        else:
+            lot = ['Rebodied', '18']
+            m = HTO_rebodied_numbers[rv_num % 1708]
+            dirty_w = random.choice([('B_W_', 'B.W.'), ('G_W_', 'G.W.')])
+            clean_w = random.choice([('B_C_', 'B.C.'), ('G_C_', 'G.C.')])
+            pretops_only = 'c'
+            no_pretops = random.choice(['a', 'b', 'd'])
+        dirty_probability = int(config.get('defaults', 'htx_dirty_probability', fallback='90'))
+        dirty_dicethrow = random.randrange(1, 101)
+        if dirty_dicethrow <= dirty_probability:
+            weathering = dirty_w
+        else:
+            weathering = clean_w
+        data_paneltypes = config.get('defaults', 'htx_era', fallback='Mixed')
+        if data_paneltypes == 'Pre-TOPS only':
+            rv_prefix = pretops_only
+        elif data_paneltypes == 'TOPS only':
+            rv_prefix = no_pretops
+        else:
+            rv_prefix = ''
+        this_blueprint = 'RailVehicles\\Freight\\HTO\\FS_HT0' + lot[1] + 'A_' + weathering[
+            0] + load + '.xml'
+        this_name = 'HTO 21t Hopper - ' + lot[0] + ': ' + weathering[1] + load
+        rv_num = rv_prefix + 'B' + str(m)
+        rv.product.text = 'HTO 21t Hoppers - ' + lot[0]
+        rv.blueprint.text = this_blueprint
+        rv.name.text = this_name
+        rv.number.text = rv_num
+        swapper.rv_list.append(rv_num)
+        swapper.rv_pairs.append([rv_orig, rv_num])
+        return True
     return False
 
 
-def coal21_t_htv_replace(provider, product, blueprint, name, number, loaded):
-    for i in range(0, len(vehicle_db['HTV'])):
-        # Replace fitted wagons
-        this_vehicle = vehicle_db['HTV'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = 'FastlineSimulation'
-                    rv_orig = number.text
-                    rv_num = int(number.text.replace('B', ''))
-                    if 'eTrue' in loaded.text:
-                        load = 'L'  # Replace a loaded wagon
-                    else:
-                        load = 'E'  # Replace an empty wagon
-                    # Choose a random HTV lot and remap the vehicle number to somewhere within the numbers this lot was
-                    # allocated. 2579 vehicle numbers are possible: 441 in lot 146, 2138 rebodied.
-                    x = random.randrange(0, 2579)
-                    if 0 <= x < 441:
-                        lot = 'Dia 146'
-                        m = HTV_146_numbers[rv_num % 441]
-                        dirty_w = random.choice([('FS_HT004D_01_W_', 'B1.W.'), ('FS_HT004D_02_W_', 'B2.W.')])
-                        clean_w = random.choice([('FS_HT004D_01_C_', 'B1.C.'), ('FS_HT004D_02_C_', 'B2.C.')])
-                        pretops_only = random.choice(['a', 'b', 'c'])
-                        no_pretops = 'd'
-                    else:
-                        lot = 'Rebodied'
-                        m = HTV_rebodied_numbers[rv_num % 2138]
-                        dirty_w = random.choice([('Dirty\\HTV_B1_W_', 'B1.W.'), ('Dirty 2\\HTV_B2_W_', 'B2.W.'),
-                                                 ('Dirty 3\\HTV_M_W_', 'M.W.')])
-                        clean_w = random.choice([('Clean\\HTV_B1_C_', 'B1.C.'), ('Clean 2\\HTV_B2_C_', 'B2.C.'),
-                                                 ('Clean 3\\HTV_M_C_', 'M.C.')])
-                        pretops_only = '4'
-                        no_pretops = random.choice(['1', '2', '3'])
-                    dirty_probability = int(config.get('defaults', 'htx_dirty_probability', fallback='90'))
-                    dirty_dicethrow = random.randrange(1, 101)
-                    if dirty_dicethrow <= dirty_probability:
-                        weathering = dirty_w
-                    else:
-                        weathering = clean_w
-                    data_paneltypes = config.get('defaults', 'htx_era', fallback='Mixed')
-                    if data_paneltypes == 'Pre-TOPS only':
-                        rv_prefix = pretops_only
-                    elif data_paneltypes == 'TOPS only':
-                        rv_prefix = no_pretops
-                    else:
-                        rv_prefix = ''
-                    this_blueprint = 'RailVehicles\\Freight\\HTV\\' + weathering[0] + load + '.xml'
-                    this_name = 'HTV 21t ' + lot + ': ' + weathering[1] + load
-                    rv_num = rv_prefix + 'B' + str(m)
-                    product.text = 'HTV 21t Hoppers - ' + lot
-                    blueprint.text = this_blueprint
-                    name.text = this_name
-                    number.text = rv_num
-                    rv_list.append(rv_num)
-                    rv_pairs.append([rv_orig, rv_num])
-                    return True
+def coal21_t_htv_replace(swapper, rv):
+    # Replace fitted wagons
+    this_vehicle = find_vehicle_rule(swapper, 'HTV', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = 'FastlineSimulation'
+        rv_orig = rv.number.text
+        rv_num = int(rv.number.text.replace('B', ''))
+        if 'eTrue' in rv.loaded.text:
+            load = 'L'  # Replace a loaded wagon
+        else:
+            load = 'E'  # Replace an empty wagon
+        # Choose a random HTV lot and remap the vehicle number to somewhere within the numbers this lot was
+        # allocated. 2579 vehicle numbers are possible: 441 in lot 146, 2138 rebodied.
+        x = random.randrange(0, 2579)
+        if 0 <= x < 441:
+            lot = 'Dia 146'
+            m = HTV_146_numbers[rv_num % 441]
+            dirty_w = random.choice([('FS_HT004D_01_W_', 'B1.W.'), ('FS_HT004D_02_W_', 'B2.W.')])
+            clean_w = random.choice([('FS_HT004D_01_C_', 'B1.C.'), ('FS_HT004D_02_C_', 'B2.C.')])
+            pretops_only = random.choice(['a', 'b', 'c'])
+            no_pretops = 'd'
+        else:
+            lot = 'Rebodied'
+            m = HTV_rebodied_numbers[rv_num % 2138]
+            dirty_w = random.choice([('Dirty\\HTV_B1_W_', 'B1.W.'), ('Dirty 2\\HTV_B2_W_', 'B2.W.'),
+                                     ('Dirty 3\\HTV_M_W_', 'M.W.')])
+            clean_w = random.choice([('Clean\\HTV_B1_C_', 'B1.C.'), ('Clean 2\\HTV_B2_C_', 'B2.C.'),
+                                     ('Clean 3\\HTV_M_C_', 'M.C.')])
+            pretops_only = '4'
+            no_pretops = random.choice(['1', '2', '3'])
+        dirty_probability = int(config.get('defaults', 'htx_dirty_probability', fallback='90'))
+        dirty_dicethrow = random.randrange(1, 101)
+        if dirty_dicethrow <= dirty_probability:
+            weathering = dirty_w
+        else:
+            weathering = clean_w
+        data_paneltypes = config.get('defaults', 'htx_era', fallback='Mixed')
+        if data_paneltypes == 'Pre-TOPS only':
+            rv_prefix = pretops_only
+        elif data_paneltypes == 'TOPS only':
+            rv_prefix = no_pretops
+        else:
+            rv_prefix = ''
+        this_blueprint = 'RailVehicles\\Freight\\HTV\\' + weathering[0] + load + '.xml'
+        this_name = 'HTV 21t ' + lot + ': ' + weathering[1] + load
+        rv_num = rv_prefix + 'B' + str(m)
+        rv.product.text = 'HTV 21t Hoppers - ' + lot
+        rv.blueprint.text = this_blueprint
+        rv.name.text = this_name
+        rv.number.text = rv_num
+        swapper.rv_list.append(rv_num)
+        swapper.rv_pairs.append([rv_orig, rv_num])
+        return True
     return False
 
 
-def ihh_replace(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker):
-    if bool(ihh_bonus_replace(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker)):
+def ihh_replace(swapper, rv):
+    if bool(ihh_bonus_replace(swapper, rv)):
         return True
-    if bool(ihh_c17_replace(provider, product, blueprint, name, number)):
+    if bool(ihh_c17_replace(swapper, rv)):
         return True
-    if bool(ihh_c20_replace(provider, product, blueprint, name, number)):
+    if bool(ihh_c20_replace(swapper, rv)):
         return True
-    if bool(ihh_c25_replace(provider, product, blueprint, name, number)):
+    if bool(ihh_c25_replace(swapper, rv)):
         return True
-    if bool(ihh_c27_replace(provider, product, blueprint, name, number)):
+    if bool(ihh_c27_replace(swapper, rv)):
         return True
-    if bool(ihh_c40_replace(provider, product, blueprint, name, number)):
+    if bool(ihh_c40_replace(swapper, rv)):
         return True
-    if bool(ihh_c45_replace(provider, product, blueprint, name, number)):
+    if bool(ihh_c45_replace(swapper, rv)):
         return True
-    if bool(ihh_c56_replace(provider, product, blueprint, name, number)):
+    if bool(ihh_c56_replace(swapper, rv)):
         return True
     return False
 
 
-def ihh_bonus_replace(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker):
-    for i in range(0, len(vehicle_db['IHH_Bonus'])):
-        this_vehicle = vehicle_db['IHH_Bonus'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = number.text
-                    guv = re.search('guv', blueprint.text, flags=re.IGNORECASE)
-                    cao = re.search('20t', blueprint.text, flags=re.IGNORECASE)
-                    hea = re.search('hea railfreight', blueprint.text, flags=re.IGNORECASE)
-                    mcv = re.search('16tmineralwagon', blueprint.text, flags=re.IGNORECASE)
-                    tip = re.search('iron ore tippler', blueprint.text, flags=re.IGNORECASE)
-                    c47 = re.search('brush_4_bue', blueprint.text, flags=re.IGNORECASE)
-                    if guv:
-                        if not bool(re.match('[A-Z][0-9]{5}', number.text)):
-                            # If the number is not in expected format, choose a random one.
-                            number.text = 'M' + str(random.randint(86078, 86984))
-                    elif cao:
-                        # As the IHH number format for 20t brake vans is not known, choose a random number.
-                        number.text = '####B' + str(random.randint(953676, 954520)) + '#'
-                    elif hea:
-                        # Swap for a Fastline Simulations HEA wagon in railfreight livery
-                        rv_int = int(rv_orig[2:6])
-                        if 'eTrue' in loaded.text:
-                            load = 'L'  # Replace a loaded wagon
-                        else:
-                            load = 'E'  # Replace an empty wagon
-                        if rv_int < 231:
-                            blueprint.text = r'RailVehicles\Freight\HEA\HEA_RF_CL_C_' + load + '.xml'
-                            name.text = 'HEA_RF_CL_C_' + load
-                        else:
-                            blueprint.text = r'RailVehicles\Freight\HEA\HEA_RF_OL_C_' + load + '.xml'
-                            name.text = 'HEA_RF_OL_C_' + load
-                        HEA_RF_suffixes = ['£####(###', '#$###(###', '##%##(###', '###^##)##', '####&amp;#)##']
-                        provider.text = 'FastlineSimulation'
-                        product.text = 'HBA HEA Hoppers'
-                        number.text = 'HEA' + str(360000 + rv_int) + HEA_RF_suffixes[random.randrange(0, 5)]
-                        if not tailmarker == 1:
-                            # change to a tail lamp carrying wagon and try to orient it with the lamp outward facing
-                            if tail_style == 'Flashing':
-                                tail_bp = '_Rb.xml'
-                                tail_name = '_Rb'
-                            else:
-                                tail_bp = '_Ro.xml'
-                                tail_name = '_Ro'
-                            blueprint.text, name.text = add_taillamp(tailmarker, blueprint.text, tail_bp, name.text,
-                                                                     tail_name, flipped, followers)
-                        rv_list.append(number.text)
-                        rv_pairs.append([rv_orig, number.text])
-                        return True
-                    elif mcv or tip:
-                        provider.text = this_vehicle[3]
-                        product.text = this_vehicle[4]
-                        random_variant = str(random.randrange(1, 4))
-                        blueprint.text = this_vehicle[5].replace('BR 1', 'BR ' + random_variant)
-                        name.text = this_vehicle[6].replace('BR 1', 'BR ' + random_variant)
-                        number.text = str(550000 + int(rv_orig[2:6]))
-                        rv_list.append(number.text)
-                        rv_pairs.append([rv_orig, number.text])
-                        return True
-                    elif c47:
-                        # Initialise a random Class 47/0 number in case no valid number found
-                        rv_num = str(random.randint(47001, 47298))
-                        # Try to extract loco number from IHH number string
-                        nm_tops = re.search('^47#([0-9]{3}).*', number.text)
-                        nm_pretops = re.search('^D#([0-9]{4}).*', number.text)
-                        if nm_tops:
-                            rv_num = str(47000 + int(nm_tops.group(1)))
-                        elif nm_pretops:
-                            # It's a pre-tops number - select a 47/0 TOPS number instead
-                            rv_num = str(47001 + ((int(nm_pretops.group(1)) - 1) % 298))
-                        # look up the TOPS number and retrieve details for VP blueprints and number
-                        loco = csv_get_blue47num('Class47_dom', rv_num)
-                        this_vehicle[3] = 'Kuju'
-                        this_vehicle[4] = 'RailSimulator'
-                        this_vehicle[5] = loco[4]
-                        this_vehicle[6] = loco[3]
-                        number.text = loco[0]
-                    else:
-                        return False
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def ihh_bonus_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'IHH_Bonus', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv.number.text
+        guv = re.search('guv', rv.blueprint.text, flags=re.IGNORECASE)
+        cao = re.search('20t', rv.blueprint.text, flags=re.IGNORECASE)
+        hea = re.search('hea railfreight', rv.blueprint.text, flags=re.IGNORECASE)
+        mcv = re.search('16tmineralwagon', rv.blueprint.text, flags=re.IGNORECASE)
+        tip = re.search('iron ore tippler', rv.blueprint.text, flags=re.IGNORECASE)
+        c47 = re.search('brush_4_bue', rv.blueprint.text, flags=re.IGNORECASE)
+        if guv:
+            if not bool(re.match('[A-Z][0-9]{5}', rv.number.text)):
+                # If the number is not in expected format, choose a random one.
+                rv.number.text = 'M' + str(random.randint(86078, 86984))
+        elif cao:
+            # As the IHH number format for 20t brake vans is not known, choose a random number.
+            rv.number.text = '####B' + str(random.randint(953676, 954520)) + '#'
+        elif hea:
+            # Swap for a Fastline Simulations HEA wagon in railfreight livery
+            rv_int = int(rv_orig[2:6])
+            if 'eTrue' in rv.loaded.text:
+                load = 'L'  # Replace a loaded wagon
+            else:
+                load = 'E'  # Replace an empty wagon
+            if rv_int < 231:
+                rv.blueprint.text = r'RailVehicles\Freight\HEA\HEA_RF_CL_C_' + load + '.xml'
+                rv.name.text = 'HEA_RF_CL_C_' + load
+            else:
+                rv.blueprint.text = r'RailVehicles\Freight\HEA\HEA_RF_OL_C_' + load + '.xml'
+                rv.name.text = 'HEA_RF_OL_C_' + load
+            HEA_RF_suffixes = ['£####(###', '#$###(###', '##%##(###', '###^##)##', '####&amp;#)##']
+            rv.provider.text = 'FastlineSimulation'
+            rv.product.text = 'HBA HEA Hoppers'
+            rv.number.text = 'HEA' + str(360000 + rv_int) + HEA_RF_suffixes[random.randrange(0, 5)]
+            if not rv.tailmarker == 1:
+                # change to a tail lamp carrying wagon and try to orient it with the lamp outward facing
+                tail_style = config.get('defaults', 'tail_style', fallback='Flashing')
+                if tail_style == 'Flashing':
+                    tail_bp = '_Rb.xml'
+                    tail_name = '_Rb'
+                else:
+                    tail_bp = '_Ro.xml'
+                    tail_name = '_Ro'
+                rv.blueprint.text, rv.name.text = add_taillamp(rv.tailmarker, rv.blueprint.text, tail_bp, rv.name.text,
+                                                               tail_name, rv.flipped, rv.followers)
+            swapper.rv_list.append(rv.number.text)
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
+            return True
+        elif mcv or tip:
+            rv.provider.text = this_vehicle[3]
+            rv.product.text = this_vehicle[4]
+            random_variant = str(random.randrange(1, 4))
+            rv.blueprint.text = this_vehicle[5].replace('BR 1', 'BR ' + random_variant)
+            rv.name.text = this_vehicle[6].replace('BR 1', 'BR ' + random_variant)
+            rv.number.text = str(550000 + int(rv_orig[2:6]))
+            swapper.rv_list.append(rv.number.text)
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
+            return True
+        elif c47:
+            # Initialise a random Class 47/0 number in case no valid number found
+            rv_num = str(random.randint(47001, 47298))
+            # Try to extract loco number from IHH number string
+            nm_tops = re.search('^47#([0-9]{3}).*', rv.number.text)
+            nm_pretops = re.search('^D#([0-9]{4}).*', rv.number.text)
+            if nm_tops:
+                rv_num = str(47000 + int(nm_tops.group(1)))
+            elif nm_pretops:
+                # It's a pre-tops number - select a 47/0 TOPS number instead
+                rv_num = str(47001 + ((int(nm_pretops.group(1)) - 1) % 298))
+            # look up the TOPS number and retrieve details for VP blueprints and number
+            loco = csv_get_blue47num(swapper, 'Class47_dom', rv_num)
+            this_vehicle[3] = 'Kuju'
+            this_vehicle[4] = 'RailSimulator'
+            this_vehicle[5] = loco[4]
+            this_vehicle[6] = loco[3]
+            rv.number.text = loco[0]
+        else:
+            return False
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def ihh_c14_replace(provider, product, blueprint, name, number):
-    if 'IHH' in provider.text:
-        if 'Class_14' in product.text:
+def ihh_c14_replace(swapper, rv):
+    if 'IHH' in rv.provider.text:
+        if 'Class_14' in rv.product.text:
             for i in range(0, len(vehicle_db['IHH_Class14'])):
                 this_vehicle = vehicle_db['IHH_Class14'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
                     # Replace with a RSC Class 20 and format number accordingly
-                    rv_orig = number.text
+                    rv_orig = rv.number.text
                     rv_num = str(random.randint(9500, 9555)) + str(random.randint(5, 8)) + 'K' \
                              + str(random.randint(0, 9)) + str(random.randint(0, 9))
-                    nm = re.search('^D([0-9]{4})([0-9][a-zA-Z][0-9]{2})', number.text)
+                    nm = re.search('^D([0-9]{4})([0-9][a-zA-Z][0-9]{2})', rv.number.text)
                     if nm:
                         rv_num = str((int(nm.group(1)) % 56) + 9500) + nm.group(2).upper()
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = rv_num
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    rv.number.text = rv_num
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def ihh_c17_replace(provider, product, blueprint, name, number):
-    if 'IHH' in provider.text:
-        if 'Class_17' in product.text:
+def ihh_c17_replace(swapper, rv):
+    if 'IHH' in rv.provider.text:
+        if 'Class_17' in rv.product.text:
             for i in range(0, len(vehicle_db['IHH_Class17'])):
                 this_vehicle = vehicle_db['IHH_Class17'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
                     # Replace with a RSC Class 20 and format number accordingly
-                    rv_orig = number.text
+                    rv_orig = rv.number.text
                     rv_num = str(random.randint(9500, 9555)) + str(random.randint(5, 8)) + 'K' \
                              + str(random.randint(0, 9)) + str(random.randint(0, 9))
-                    pretops_nm = re.search('^D([0-9]{4})([0-9])[a-zA-Z][0-9]{2}', number.text)
+                    pretops_nm = re.search('^D([0-9]{4})([0-9])[a-zA-Z][0-9]{2}', rv.number.text)
                     if pretops_nm:
                         # A pre-tops loco - only BR Green disc is available as standard DLC
                         # Take a guess that the loco faces cab forwards and append 'F' (forward) not 'R' (rear)
                         rv_num = rsc20headcodes_62_69[pretops_nm.group(2)] + 'F' + pretops_nm.group(1)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = rv_num
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    rv.number.text = rv_num
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def ihh_c20_replace(provider, product, blueprint, name, number):
-    if 'IHH' in provider.text:
-        if 'Class 20' in product.text:
+def ihh_c20_replace(swapper, rv):
+    if 'IHH' in rv.provider.text:
+        if 'Class 20' in rv.product.text:
             for i in range(0, len(vehicle_db['IHH_Class20'])):
                 this_vehicle = vehicle_db['IHH_Class20'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
-                    rv_orig = number.text
+                    rv_orig = rv.number.text
                     rv_num = str(random.randint(20001, 20126))
-                    tops_nm = re.search('^.20#([0-9]{3})', number.text)
+                    tops_nm = re.search('^.20#([0-9]{3})', rv.number.text)
                     if tops_nm:
                         if int(tops_nm.group(1)) < 127:
                             rv_num = str(20000 + int(tops_nm.group(1)))
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = rv_num
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    rv.number.text = rv_num
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def ihh_c25_replace(provider, product, blueprint, name, number):
-    if 'IHH' in provider.text:
-        if 'Class_25' in product.text:
+def ihh_c25_replace(swapper, rv):
+    if 'IHH' in rv.provider.text:
+        if 'Class_25' in rv.product.text:
             for i in range(0, len(vehicle_db['IHH_Class25'])):
                 this_vehicle = vehicle_db['IHH_Class25'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
                     rv_num = '251040000'
-                    rv_orig = number.text
-                    nm = re.search('^(25[0-9]{3})(....).*', number.text)
+                    rv_orig = rv.number.text
+                    nm = re.search('^(25[0-9]{3})(....).*', rv.number.text)
                     if nm:
                         rv_num = nm.group(1)
                         headcode = '0000'
@@ -1506,85 +1534,85 @@ def ihh_c25_replace(provider, product, blueprint, name, number):
                         elif this_vehicle[3] == 'RSderek':
                             headcode = '@##@'
                         rv_num = rv_num + headcode
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = rv_num
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    rv.number.text = rv_num
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def ihh_c27_replace(provider, product, blueprint, name, number):
-    if 'IHH' in provider.text:
-        if 'Class_27' in product.text:
+def ihh_c27_replace(swapper, rv):
+    if 'IHH' in rv.provider.text:
+        if 'Class_27' in rv.product.text:
             for i in range(0, len(vehicle_db['IHH_Class27'])):
                 this_vehicle = vehicle_db['IHH_Class27'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
                     rv_num = '27036'
-                    rv_orig = number.text
-                    nm_tops = re.search('^(2[6-7][0-9]{3}).*', number.text)
-                    nm_pretops = re.search('^D([0-9]{4})([0-9][A-Z][0-9]{2})', number.text)
+                    rv_orig = rv.number.text
+                    nm_tops = re.search('^(2[6-7][0-9]{3}).*', rv.number.text)
+                    nm_pretops = re.search('^D([0-9]{4})([0-9][A-Z][0-9]{2})', rv.number.text)
                     if nm_tops:
                         rv_num = nm_tops.group(1)
                     if nm_pretops:
                         rv_num = nm_pretops.group(1) + nm_pretops.group(2)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = rv_num
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    rv.number.text = rv_num
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def ihh_c40_replace(provider, product, blueprint, name, number):
-    if 'IHH' in provider.text:
-        if 'Class_40' in product.text:
+def ihh_c40_replace(swapper, rv):
+    if 'IHH' in rv.provider.text:
+        if 'Class_40' in rv.product.text:
             for i in range(0, len(vehicle_db['IHH_Class40'])):
                 this_vehicle = vehicle_db['IHH_Class40'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    rv_num = number.text
-                    rv_orig = number.text
-                    if bool(re.search('disc_blue|late_blue', this_vehicle[2], flags=re.IGNORECASE)):
-                        tops_disc = re.search('^(40[0-9]{3})(....).*', number.text)
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    rv_num = rv.number.text
+                    rv_orig = rv.number.text
+                    if bool(re.search('disc_blue|late_blue', this_vehicle[2].pattern, flags=re.IGNORECASE)):
+                        tops_disc = re.search('^(40[0-9]{3})(....).*', rv.number.text)
                         if tops_disc:
                             rv_tops = '1111' + tops_disc.group(1)
                             ap_num = dcsv_get_num(
-                                Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                                swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
                                      this_vehicle[7].replace('\\', '/')), rv_tops, '([0-9]{9})(.*)')
                             rv_num = ap_num[0:9] + '2121'
                     else:
-                        tops_headcode = re.search('^(40[0-9]{3})(....).*', number.text)
+                        tops_headcode = re.search('^(40[0-9]{3})(....).*', rv.number.text)
                         if tops_headcode:
                             rv_tops = '11111' + tops_headcode.group(1)
                             ap_num = dcsv_get_num(
-                                Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                                swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
                                      this_vehicle[7].replace('\\', '/')), rv_tops, '([0-9]{10})(.*)')
                             hc_search = re.search('([0-9][A-Z][0-9]{2})', tops_headcode.group(2))
                             if hc_search:
                                 rv_num = '110' + ap_num[3:10] + hc_search.group(0)
                             else:
                                 rv_num = ap_num
-                    pretops_num = re.search('D([0-9]{3})([0-9][A-Z][0-9]{2})$', number.text, flags=re.IGNORECASE)
-                    pretops_disc = re.search('disc', this_vehicle[2], flags=re.IGNORECASE)
+                    pretops_num = re.search('D([0-9]{3})([0-9][A-Z][0-9]{2})$', rv.number.text, flags=re.IGNORECASE)
+                    pretops_disc = re.search('disc', this_vehicle[2].pattern, flags=re.IGNORECASE)
                     if pretops_disc and pretops_num:
                         rv_dnum = '0' + pretops_num.group(1)
                         headcode = ap40headcodes_62_69[pretops_num.group(2)[0:1]]
                         ap_num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                            swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
                                  this_vehicle[7].replace('\\', '/')), rv_dnum, '([0-9]{4})(.*)')
-                        hy = re.search('panel', this_vehicle[2], flags=re.IGNORECASE)
+                        hy = re.search('panel', this_vehicle[2].pattern, flags=re.IGNORECASE)
                         if hy:
                             # Number the loco as a Half Yellow front class 40
                             rv_num = '1' + ap_num[1:4] + headcode
@@ -1592,206 +1620,194 @@ def ihh_c40_replace(provider, product, blueprint, name, number):
                             # Number the loco as a Full Green front class 40
                             rv_num = '0' + ap_num[1:4] + headcode
                     # Set AP Class 40 number
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.number.text = str(rv_num)
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def ihh_c45_replace(provider, product, blueprint, name, number):
-    if 'IHH' in provider.text:
-        if 'Class_45' in product.text:
+def ihh_c45_replace(swapper, rv):
+    if 'IHH' in rv.provider.text:
+        if 'Class_45' in rv.product.text:
             for i in range(0, len(vehicle_db['IHH_Class45'])):
                 this_vehicle = vehicle_db['IHH_Class45'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
-                    rv_num = number.text
-                    rv_orig = number.text
-                    nm = re.search('^(45|46)#([0-9]{3}).*', number.text)
+                    rv_num = rv.number.text
+                    rv_orig = rv.number.text
+                    nm = re.search('^(45|46)#([0-9]{3}).*', rv.number.text)
                     if nm:
                         rv_num = nm.group(1) + nm.group(2)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = rv_num
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    rv.number.text = rv_num
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def ihh_c56_replace(provider, product, blueprint, name, number):
-    if 'IHH' in provider.text:
-        if 'Class_56' in product.text:
+def ihh_c56_replace(swapper, rv):
+    if 'IHH' in rv.provider.text:
+        if 'Class_56' in rv.product.text:
             for i in range(0, len(vehicle_db['IHH_Class56'])):
                 this_vehicle = vehicle_db['IHH_Class56'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = number.text[-5:]
-                    rv_list.append(number.text)
-                    rv_pairs.append([number.text, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    rv.number.text = rv.number.text[-5:]
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv.number.text, rv.number.text])
                     return True
     return False
 
 
-def hst_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['HST_set'])):
-        this_vehicle = vehicle_db['HST_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    rv_orig = number.text
-                    # Now extract the vehicle number
-                    if 'Class43' in this_vehicle[5]:
-                        nm = re.search('(.?43[0-9]{3}.*)', number.text)
-                        if nm:
-                            rv_num = dcsv_gethstloco(
-                                Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                     this_vehicle[7].replace('\\', '/')), number.text)
-                            number.text = str(rv_num)
-                            rv_list.append(number.text)
-                            rv_pairs.append([rv_orig, number.text])
-                    return True
+def hst_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'HST_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        rv_orig = rv.number.text
+        # Now extract the vehicle number
+        if 'Class43' in this_vehicle[5]:
+            nm = re.search('(.?43[0-9]{3}.*)', rv.number.text)
+            if nm:
+                rv_num = dcsv_gethstloco(
+                    swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                         this_vehicle[7].replace('\\', '/')), rv.number.text)
+                rv.number.text = str(rv_num)
+                swapper.rv_list.append(rv.number.text)
+                swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c31_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['Class31'])):
-        this_vehicle = vehicle_db['Class31'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    if 'W2' in this_vehicle[5]:
-                        (w_blueprint, w_name) = set_weathering(2, this_vehicle)
-                    else:
-                        (w_blueprint, w_name) = set_weathering(3, this_vehicle)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = w_blueprint
-                    name.text = w_name
-                    rv_orig = number.text
-                    nm = re.search('[^3]*(31[0-9]{3}).*', number.text)
-                    if nm:
-                        rv_found = nm.group(1)
-                        rv_num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                 this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
-                        # Set number
-                        number.text = str(rv_num)
-                        rv_list.append(number.text)
-                        rv_pairs.append([rv_orig, number.text])
-                    return True
+def c31_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'Class31', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        if 'W2' in this_vehicle[5]:
+            (w_blueprint, w_name) = set_weathering(2, this_vehicle)
+        else:
+            (w_blueprint, w_name) = set_weathering(3, this_vehicle)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = w_blueprint
+        rv.name.text = w_name
+        rv_orig = rv.number.text
+        nm = re.search('[^3]*(31[0-9]{3}).*', rv.number.text)
+        if nm:
+            rv_found = nm.group(1)
+            rv_num = dcsv_get_num(
+                swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                     this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
+            # Set number
+            rv.number.text = str(rv_num)
+            swapper.rv_list.append(rv.number.text)
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c37_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['Class37'])):
-        this_vehicle = vehicle_db['Class37'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    (w_blueprint, w_name) = set_weathering(3, this_vehicle)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = w_blueprint
-                    name.text = w_name
-                    rv_num = rv_tops = rv_orig = number.text
-                    # Check if the loco has a pre-tops number
-                    pretops = re.search('D([0-9]{4})([0-9][a-zA-Z][0-9]{2})', number.text)
-                    if pretops:
-                        rv_dnum = pretops.group(1)
-                        if not 6700 <= int(rv_dnum) <= 6999:
-                            if not 6600 <= int(rv_dnum) <= 6608:
-                                # If the pre-tops number in the scenario is not valid invent a new one
-                                # find the remainder of the non-valid number divided by 300 and add 6700 - the result
-                                # is guaranteed to be in valid range 6700 - 6999
-                                rv_dnum = str(6700 + int(rv_dnum) % 300)
-                        headcode = pretops.group(2)
-                        rv_num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                 this_vehicle[7].replace('\\', '/')), rv_dnum, '([0-9]{5})(.*)')
-                        rv_num = rv_num.replace('____', headcode)
-                    # Check if the loco has a tops number
-                    tops = re.search('(37[0-9]{3})(.*)', number.text)
-                    if tops:
-                        rv_tops = tops.group(1)
-                        rv_num = this_vehicle[7]
-                        if 'dcsv' in rv_num:
-                            rv_num = dcsv_get_num(
-                                Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                     this_vehicle[7].replace('\\', '/')), rv_tops, '([0-9]{5})(.*)')
-                    if '_wp' in this_vehicle[2]:
-                        rv_num = add_ploughs(rv_num)
-                    if this_vehicle[1] == 'WHL' or this_vehicle[1] == 'FortWilliamMallaig':
-                        if 'Large' in this_vehicle[2]:
-                            # Look for a loco with the 'Westie' logo for the WHL LL replacements
-                            rv_num = dcsv_get_num(
-                                Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                     this_vehicle[7].replace('\\', '/')), rv_tops, '(37[0-9]{3})(.*L=1.*)')
-                        # Add ploughs and RETB to West Highland locos
-                        rv_num = add_retb(rv_num)
-                        rv_num = add_ploughs(rv_num)
-                        if 'Default' in this_vehicle[2]:
-                            # Black headcode box
-                            rv_num = rv_num + ';no1front=bch;no2front=bch'
-                    # Set AP Class 37 number
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c37_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'Class37', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        (w_blueprint, w_name) = set_weathering(3, this_vehicle)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = w_blueprint
+        rv.name.text = w_name
+        rv_num = rv_tops = rv_orig = rv.number.text
+        # Check if the loco has a pre-tops number
+        pretops = re.search('D([0-9]{4})([0-9][a-zA-Z][0-9]{2})', rv.number.text)
+        if pretops:
+            rv_dnum = pretops.group(1)
+            if not 6700 <= int(rv_dnum) <= 6999:
+                if not 6600 <= int(rv_dnum) <= 6608:
+                    # If the pre-tops number in the scenario is not valid invent a new one
+                    # find the remainder of the non-valid number divided by 300 and add 6700 - the result
+                    # is guaranteed to be in valid range 6700 - 6999
+                    rv_dnum = str(6700 + int(rv_dnum) % 300)
+            headcode = pretops.group(2)
+            rv_num = dcsv_get_num(
+                swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                     this_vehicle[7].replace('\\', '/')), rv_dnum, '([0-9]{5})(.*)')
+            rv_num = rv_num.replace('____', headcode)
+        # Check if the loco has a tops number
+        tops = re.search('(37[0-9]{3})(.*)', rv.number.text)
+        if tops:
+            rv_tops = tops.group(1)
+            rv_num = this_vehicle[7]
+            if 'dcsv' in rv_num:
+                rv_num = dcsv_get_num(
+                    swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                         this_vehicle[7].replace('\\', '/')), rv_tops, '([0-9]{5})(.*)')
+        if '_wp' in this_vehicle[2].pattern:
+            rv_num = add_ploughs(rv_num)
+        if this_vehicle[1] == 'WHL' or this_vehicle[1] == 'FortWilliamMallaig':
+            if 'Large' in this_vehicle[2].pattern:
+                # Look for a loco with the 'Westie' logo for the WHL LL replacements
+                rv_num = dcsv_get_num(
+                    swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                         this_vehicle[7].replace('\\', '/')), rv_tops, '(37[0-9]{3})(.*L=1.*)')
+            # Add ploughs and RETB to West Highland locos
+            rv_num = add_retb(rv_num)
+            rv_num = add_ploughs(rv_num)
+            if 'Default' in this_vehicle[2].pattern:
+                # Black headcode box
+                rv_num = rv_num + ';no1front=bch;no2front=bch'
+        # Set AP Class 37 number
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c40_replace(provider, product, blueprint, name, number):
+def c40_replace(swapper, rv):
     # Replace DT Class 40
-    if 'DT' in provider.text:
-        if 'DT_class40' in product.text:
+    if 'DT' in rv.provider.text:
+        if 'DT_class40' in rv.product.text:
             for i in range(0, len(vehicle_db['Class40'])):
                 this_vehicle = vehicle_db['Class40'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    rv_num = number.text
-                    rv_orig = number.text
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    rv_num = rv.number.text
+                    rv_orig = rv.number.text
                     # Check if the loco has a pre-tops number
-                    pretops_disc = re.search('^([0-9])([0-9]{3})$', number.text)
+                    pretops_disc = re.search('^([0-9])([0-9]{3})$', rv.number.text)
                     if pretops_disc:
                         rv_dnum = '0' + pretops_disc.group(2)
                         headcode = ap40headcodes_62_69[pretops_disc.group(1)]
                         ap_num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                            swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
                                  this_vehicle[7].replace('\\', '/')), rv_dnum, '([0-9]{4})(.*)')
-                        hy = re.search('halfyellow', blueprint.text, flags=re.IGNORECASE)
+                        hy = re.search('halfyellow', rv.blueprint.text, flags=re.IGNORECASE)
                         if hy:
                             # Number the loco as a Half Yellow front class 40
                             rv_num = '1' + ap_num[1:4] + headcode
                         else:
                             # Number the loco as a Full Green front class 40
                             rv_num = '0' + ap_num[1:4] + headcode
-                    pretops_headcode = re.search('^([0-9][a-z][0-9]{2})([0-9]{3})$', number.text)
+                    pretops_headcode = re.search('^([0-9][a-z][0-9]{2})([0-9]{3})$', rv.number.text)
                     if pretops_headcode:
                         rv_dnum = '0' + pretops_headcode.group(2)
                         headcode = pretops_headcode.group(1).upper()
                         ap_num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                            swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
                                  this_vehicle[7].replace('\\', '/')), rv_dnum, '([0-9]{4})(.*)')
-                        hy = re.search('halfyellow', blueprint.text, flags=re.IGNORECASE)
+                        hy = re.search('halfyellow', rv.blueprint.text, flags=re.IGNORECASE)
                         if hy:
                             # Number the loco as a Half Yellow front class 40
                             rv_num = '1' + ap_num[1:4] + headcode
@@ -1799,101 +1815,97 @@ def c40_replace(provider, product, blueprint, name, number):
                             # Number the loco as a Full Green front class 40
                             rv_num = '0' + ap_num[1:4] + headcode
                     # Check if the loco has a tops number
-                    tops_domino = re.search('^(40[0-9]{3})$', number.text)
+                    tops_domino = re.search('^(40[0-9]{3})$', rv.number.text)
                     if tops_domino:
                         rv_tops = '11111' + tops_domino.group(1)
                         rv_num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                            swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
                                  this_vehicle[7].replace('\\', '/')), rv_tops, '([0-9]{10})(.*)')
-                    tops_disc = re.search('^([0-9])(40[0-9]{3})$', number.text)
+                    tops_disc = re.search('^([0-9])(40[0-9]{3})$', rv.number.text)
                     if tops_disc:
                         rv_tops = '1111' + tops_disc.group(2)
                         headcode = ap40headcodes_69_77[tops_disc.group(1)]
                         ap_num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                            swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
                                  this_vehicle[7].replace('\\', '/')), rv_tops, '([0-9]{9})(.*)')
                         rv_num = ap_num[0:9] + headcode
                     # Set AP Class 40 number
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.number.text = str(rv_num)
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def c47_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['Class47BRBlue'])):
-        this_vehicle = vehicle_db['Class47BRBlue'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = number.text
-                    nm = re.search('^(47[0-9]{3})', number.text)
-                    if nm:
-                        loco = csv_get_blue47num(this_vehicle[3], nm.group(1))
-                        provider.text = 'Kuju'
-                        product.text = 'RailSimulator'
-                        blueprint.text = loco[4]
-                        name.text = loco[3]
-                        number.text = loco[0]
-                        rv_list.append(number.text)
-                        rv_pairs.append([rv_orig, number.text])
-                        return True
-                    else:
-                        return False
+def c47_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'Class47BRBlue', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv.number.text
+        nm = re.search('^(47[0-9]{3})', rv.number.text)
+        if nm:
+            loco = csv_get_blue47num(swapper, this_vehicle[3], nm.group(1))
+            rv.provider.text = 'Kuju'
+            rv.product.text = 'RailSimulator'
+            rv.blueprint.text = loco[4]
+            rv.name.text = loco[3]
+            rv.number.text = loco[0]
+            swapper.rv_list.append(rv.number.text)
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
+            return True
+        else:
+            return False
     return False
 
 
-def c50_replace(provider, product, blueprint, name, number):
+def c50_replace(swapper, rv):
     # Replace MT Class 50
-    if 'MichaelWhiteley' in provider.text:
-        if 'Class 50' in product.text:
+    if 'MichaelWhiteley' in rv.provider.text:
+        if 'Class 50' in rv.product.text:
             for i in range(0, len(vehicle_db['Class50'])):
                 this_vehicle = vehicle_db['Class50'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                pretops = re.match('([0-9]{3})([0-9][a-zA-Z][0-9]{2})', number.text)
+                bp = this_vehicle[2].search(rv.blueprint.text)
+                pretops = re.match('([0-9]{3})([0-9][a-zA-Z][0-9]{2})', rv.number.text)
                 if bp:
                     (w_blueprint, w_name) = set_weathering(3, this_vehicle)
-                    rv_orig = number.text
+                    rv_orig = rv.number.text
                     if i == 0:
                         # This is the GWR loco, 50007 - note that it only has two weathered variants, W1 and W2
                         (w_blueprint, w_name) = set_weathering(2, this_vehicle)
                         rv_num = '50007'
-                        rv_list.append(rv_num)
-                    elif len(number.text) == 1:
+                        swapper.rv_list.append(rv_num)
+                    elif len(rv.number.text) == 1:
                         # This is one of the BR/NSE TOPS liveries with single character vehicle number to translate
                         rv_num = cl50char_to_num(rv_orig)
-                        rv_list.append(rv_num)
-                        rv_pairs.append([rv_orig, rv_num])
+                        swapper.rv_list.append(rv_num)
+                        swapper.rv_pairs.append([rv_orig, rv_num])
                     elif len(pretops.group(0)) == 6:
                         # This is one of the headcode box variants - pre-TOPS BR Green or Blue
                         rv_num = 'D' + pretops.group(1) + ';L=1;HC1=' + pretops.group(2) + ';HC2=' + pretops.group(2)
-                        rv_list.append(rv_num)
-                        rv_pairs.append([rv_orig, rv_num])
+                        swapper.rv_list.append(rv_num)
+                        swapper.rv_pairs.append([rv_orig, rv_num])
                     else:
                         rv_num = rv_orig
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = w_blueprint
-                    name.text = w_name
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = w_blueprint
+                    rv.name.text = w_name
+                    rv.number.text = str(rv_num)
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def c56_replace(provider, product, blueprint, name, number):
+def c56_replace(swapper, rv):
     # Replace Class 56 with AP Enhanced version
     for i in range(0, len(vehicle_db['Class56'])):
         this_vehicle = vehicle_db['Class56'][i]
-        bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+        bp = this_vehicle[2].search(rv.blueprint.text)
         if bp:
-            rv_orig = number.text
-            rv_num = number.text
-            if 'RSC' in provider.text and 'Class56Pack01' in product.text:
-                rv_num = cl56rsc_to_apsecdep_or_blanksecdep(number.text)
+            rv_orig = rv.number.text
+            rv_num = rv.number.text
+            if 'RSC' in rv.provider.text and 'Class56Pack01' in rv.product.text:
+                rv_num = cl56rsc_to_apsecdep_or_blanksecdep(rv.number.text)
                 if config.get('defaults', 'c56_rf') == c56_opts[1]:
                     # Skip swapping in AP loco unless it has both the sectors logo and depot plaque
                     # of the loco it is to replace
@@ -1901,1066 +1913,1170 @@ def c56_replace(provider, product, blueprint, name, number):
                         return False
                     if rv_num[1:2] == '*':
                         return False
-            provider.text = this_vehicle[3]
-            product.text = this_vehicle[4]
-            blueprint.text = this_vehicle[5]
-            name.text = this_vehicle[6]
-            number.text = str(rv_num)
-            rv_list.append(number.text)
-            rv_pairs.append([rv_orig, number.text])
+            rv.provider.text = this_vehicle[3]
+            rv.product.text = this_vehicle[4]
+            rv.blueprint.text = this_vehicle[5]
+            rv.name.text = this_vehicle[6]
+            rv.number.text = str(rv_num)
+            swapper.rv_list.append(rv.number.text)
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
             return True
     return False
 
 
-def c66_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['Class66'])):
-        this_vehicle = vehicle_db['Class66'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    (w_blueprint, w_name) = set_weathering(3, this_vehicle)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = w_blueprint
-                    name.text = w_name
-                    rv_orig = rv_num = number.text
-                    nm = re.search('(66[0-9]{3})', number.text)
-                    if nm:
-                        rv_found = nm.group(1)
-                        rv_num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                 this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
-                    # Set number
-                    if len(rv_num) < 6:
-                        rv_num = rv_num + 'x'
-                    number.text = rv_num
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c66_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'Class66', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        (w_blueprint, w_name) = set_weathering(3, this_vehicle)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = w_blueprint
+        rv.name.text = w_name
+        rv_orig = rv_num = rv.number.text
+        nm = re.search('(66[0-9]{3})', rv.number.text)
+        if nm:
+            rv_found = nm.group(1)
+            rv_num = dcsv_get_num(
+                swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                     this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
+        # Set number
+        if len(rv_num) < 6:
+            rv_num = rv_num + 'x'
+        rv.number.text = rv_num
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c67_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['Class67'])):
-        this_vehicle = vehicle_db['Class67'][i]
-        if this_vehicle[0] in provider.text and this_vehicle[1] in product.text:
-            bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-            if bp:
-                (w_blueprint, w_name) = set_weathering(3, this_vehicle)
-                provider.text = this_vehicle[3]
-                product.text = this_vehicle[4]
-                blueprint.text = w_blueprint
-                name.text = w_name
-                rv_orig = number.text
-                nm = re.search('(67[0-9]{3}).*', number.text)
-                if nm:
-                    rv_found = number.text
-                    rv_num = this_vehicle[7]
-                    if 'dcsv' in rv_num:
-                        rv_num = dcsv_get_num(
-                            Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                 this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
-                    # Set number
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                return True
+def c67_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'Class67', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        (w_blueprint, w_name) = set_weathering(3, this_vehicle)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = w_blueprint
+        rv.name.text = w_name
+        rv_orig = rv.number.text
+        nm = re.search('(67[0-9]{3}).*', rv.number.text)
+        if nm:
+            rv_found = rv.number.text
+            rv_num = this_vehicle[7]
+            if 'dcsv' in rv_num:
+                rv_num = dcsv_get_num(
+                    swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                         this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
+            # Set number
+            rv.number.text = str(rv_num)
+            swapper.rv_list.append(rv.number.text)
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c68_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['Class68'])):
-        this_vehicle = vehicle_db['Class68'][i]
-        if this_vehicle[0] in provider.text and this_vehicle[1] in product.text:
-            bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-            if bp:
-                provider.text = this_vehicle[3]
-                product.text = this_vehicle[4]
-                blueprint.text = this_vehicle[5]
-                name.text = this_vehicle[6]
-                rv_orig = number.text
-                nm = re.search('(68[0-9]{3}).*', number.text)
-                if nm:
-                    rv_found = nm.group(1)
-                    rv_num = dcsv_get_num(
-                        Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                             this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
-                    # Set number
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                return True
+def c68_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'Class68', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        rv_orig = rv.number.text
+        nm = re.search('(68[0-9]{3}).*', rv.number.text)
+        if nm:
+            rv_found = nm.group(1)
+            rv_num = dcsv_get_num(
+                swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                     this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
+            # Set number
+            rv.number.text = str(rv_num)
+            swapper.rv_list.append(rv.number.text)
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c86_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['Class86'])):
-        this_vehicle = vehicle_db['Class86'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    (w_blueprint, w_name) = set_weathering(3, this_vehicle)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    # name.text = w_name
-                    rv_orig = number.text
-                    nm = re.match('(86[0-9]{3}).*', number.text)
-                    if nm:
-                        # Loco to be replaced is TOPS numbered class 86 with no headcode box
-                        rv_found = nm.group(1)
-                        rv_num = this_vehicle[7]
-                        if 'dcsv' in rv_num:
-                            rv_num = dcsv_get_num(
-                                Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                     this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
-                        # Set number
-                        number.text = str(rv_num)
-                        name.text = w_name
-                        blueprint.text = w_blueprint
-                        rv_list.append(number.text)
-                        rv_pairs.append([rv_orig, number.text])
-                        return True
-                    nm = re.search('(....)(86[0-9]{3})', number.text)
-                    if nm:
-                        # This has the number of a RSC Class 86 BR Blue with TOPS number and headcode box
-                        # Replace with Vulcan Productions headcode loco if the user asked for it - otherwise
-                        # do nothing or swap for the standard AP BR Blue 1 with no headcode
-                        if config.get('defaults', 'c86_hc') == c86_opts[2]:
-                            # User doesn't want this loco replaced
-                            return True
-                        elif config.get('defaults', 'c86_hc') == c86_opts[0]:
-                            # User wants this local replaced with the Vulcan Productions Class 86 Early Liveries &
-                            # Headcode Blinds loco from https://www.vulcanproductions.co.uk/electric.html Note there
-                            # is no dead / low panto version
-                            blueprint.text = vehicle_db['Class86'][0][5]
-                            name.text = vehicle_db['Class86'][0][6]
-                            if nm.group(2) in c86_TOPS_HC:
-                                # Look up the TOPS number in the dictionary of VP vehicle numbers and configurations
-                                # and use the matching value as the VP railvehicle number
-                                rv_num = c86_TOPS_HC[nm.group(2)]
-                            else:
-                                # TOPS number not found in dictionary so assign the VP railvehicle number below
-                                rv_num = nm.group(2) + 'E31830O00;B=E5;P=old;HL=0'
-                            # Set the headcode into the VP number
-                            rv_num = rv_num.replace('0O00', nm.group(1))
-                            # Fix the dot and blank @ and ~ headcode characters where VP use ? and # instead
-                            rv_num = rv_num.replace('@', '?')
-                            rv_num = rv_num.replace('~', '#')
-                            # Set number
-                            number.text = str(rv_num)
-                            rv_list.append(number.text)
-                            rv_pairs.append([rv_orig, number.text])
-                            return True
-                        elif config.get('defaults', 'c86_hc') == c86_opts[1]:
-                            # User wants this loco replaced with the AP BR Blue 1 loco (no headcode blinds)
-                            if 'panto_low' in this_vehicle[2]:
-                                (w_blueprint, w_name) = set_weathering(3, vehicle_db['Class86'][4])
-                            else:
-                                (w_blueprint, w_name) = set_weathering(3, vehicle_db['Class86'][6])
-                            blueprint.text = w_blueprint
-                            name.text = w_name
-                            rv_num = dcsv_get_num(
-                                Path(railworks_path, 'Assets', vehicle_db['Class86'][4][3], vehicle_db['Class86'][4][4],
-                                     vehicle_db['Class86'][4][7].replace('\\', '/')), nm.group(2), '([0-9]{5})(.*)')
-                            # Set number
-                            number.text = str(rv_num)
-                            rv_list.append(number.text)
-                            rv_pairs.append([rv_orig, number.text])
-                            return True
-                    return False
+def c86_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'Class86', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        (w_blueprint, w_name) = set_weathering(3, this_vehicle)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        # name.text = w_name
+        rv_orig = rv.number.text
+        nm = re.match('(86[0-9]{3}).*', rv.number.text)
+        if nm:
+            # Loco to be replaced is TOPS numbered class 86 with no headcode box
+            rv_found = nm.group(1)
+            rv_num = this_vehicle[7]
+            if 'dcsv' in rv_num:
+                rv_num = dcsv_get_num(
+                    swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                         this_vehicle[7].replace('\\', '/')), rv_found, '([0-9]{5})(.*)')
+            # Set number
+            rv.number.text = str(rv_num)
+            rv.name.text = w_name
+            rv.blueprint.text = w_blueprint
+            swapper.rv_list.append(rv.number.text)
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
+            return True
+        nm = re.search('(....)(86[0-9]{3})', rv.number.text)
+        if nm:
+            # This has the number of a RSC Class 86 BR Blue with TOPS number and headcode box
+            # Replace with Vulcan Productions headcode loco if the user asked for it - otherwise
+            # do nothing or swap for the standard AP BR Blue 1 with no headcode
+            if config.get('defaults', 'c86_hc') == c86_opts[2]:
+                # User doesn't want this loco replaced
+                return True
+            elif config.get('defaults', 'c86_hc') == c86_opts[0]:
+                # User wants this local replaced with the Vulcan Productions Class 86 Early Liveries &
+                # Headcode Blinds loco from https://www.vulcanproductions.co.uk/electric.html Note there
+                # is no dead / low panto version
+                rv.blueprint.text = vehicle_db['Class86'][0][5]
+                rv.name.text = vehicle_db['Class86'][0][6]
+                if nm.group(2) in c86_TOPS_HC:
+                    # Look up the TOPS number in the dictionary of VP vehicle numbers and configurations
+                    # and use the matching value as the VP railvehicle number
+                    rv_num = c86_TOPS_HC[nm.group(2)]
+                else:
+                    # TOPS number not found in dictionary so assign the VP railvehicle number below
+                    rv_num = nm.group(2) + 'E31830O00;B=E5;P=old;HL=0'
+                # Set the headcode into the VP number
+                rv_num = rv_num.replace('0O00', nm.group(1))
+                # Fix the dot and blank @ and ~ headcode characters where VP use ? and # instead
+                rv_num = rv_num.replace('@', '?')
+                rv_num = rv_num.replace('~', '#')
+                # Set number
+                rv.number.text = str(rv_num)
+                swapper.rv_list.append(rv.number.text)
+                swapper.rv_pairs.append([rv_orig, rv.number.text])
+                return True
+            elif config.get('defaults', 'c86_hc') == c86_opts[1]:
+                # User wants this loco replaced with the AP BR Blue 1 loco (no headcode blinds)
+                if 'panto_low' in this_vehicle[2].pattern:
+                    (w_blueprint, w_name) = set_weathering(3, vehicle_db['Class86'][4])
+                else:
+                    (w_blueprint, w_name) = set_weathering(3, vehicle_db['Class86'][6])
+                rv.blueprint.text = w_blueprint
+                rv.name.text = w_name
+                rv_num = dcsv_get_num(
+                    swapper, Path(railworks_path, 'Assets', vehicle_db['Class86'][4][3], vehicle_db['Class86'][4][4],
+                         vehicle_db['Class86'][4][7].replace('\\', '/')), nm.group(2), '([0-9]{5})(.*)')
+                # Set number
+                rv.number.text = str(rv_num)
+                swapper.rv_list.append(rv.number.text)
+                swapper.rv_pairs.append([rv_orig, rv.number.text])
+                return True
+        return False
     return False
 
 
-def c87_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['Class87'])):
-        this_vehicle = vehicle_db['Class87'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    (w_blueprint, w_name) = set_weathering(3, this_vehicle)
-                    rv_orig = number.text
-                    nm = re.match('.?(87[0-9]{3}).*', number.text)
-                    if nm:
-                        rv_found = nm.group(1)
-                        rv_num = rv_found + this_vehicle[7]
-                        provider.text = this_vehicle[3]
-                        product.text = this_vehicle[4]
-                        number.text = str(rv_num)
-                        name.text = w_name
-                        blueprint.text = w_blueprint
-                        rv_list.append(number.text)
-                        rv_pairs.append([rv_orig, number.text])
-                        return True
-                    return False
+def c87_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'Class87', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        (w_blueprint, w_name) = set_weathering(3, this_vehicle)
+        rv_orig = rv.number.text
+        nm = re.match('.?(87[0-9]{3}).*', rv.number.text)
+        if nm:
+            rv_found = nm.group(1)
+            rv_num = rv_found + this_vehicle[7]
+            rv.provider.text = this_vehicle[3]
+            rv.product.text = this_vehicle[4]
+            rv.number.text = str(rv_num)
+            rv.name.text = w_name
+            rv.blueprint.text = w_blueprint
+            swapper.rv_list.append(rv.number.text)
+            swapper.rv_pairs.append([rv_orig, rv.number.text])
+            return True
+        return False
     return False
 
 
-def c91_replace(provider, product, blueprint, name):
-    for i in range(0, len(vehicle_db['Class91_set'])):
-        this_vehicle = vehicle_db['Class91_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    return True
+def c91_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'Class91_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        return True
     return False
 
 
-def c101_replace(provider, product, blueprint, name):
-    for i in range(0, len(vehicle_db['DMU101_set'])):
-        this_vehicle = vehicle_db['DMU101_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    return True
+def c101_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'DMU101_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        return True
     return False
 
 
-def c150_replace(provider, product, blueprint, name, number):
-    if 'Thomson_Oovee' in provider.text:
-        if 'Class150Pack01' in product.text:
+def c150_replace(swapper, rv):
+    if 'Thomson_Oovee' in rv.provider.text:
+        if 'Class150Pack01' in rv.product.text:
             for i in range(0, len(vehicle_db['DMU150_set'])):
                 this_vehicle = vehicle_db['DMU150_set'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
-                    rv_orig = number.text
-                    nm = re.search('5[2,7]([0-9]{3})[0-9]*', number.text)
+                    rv_orig = rv.number.text
+                    nm = re.search('5[2,7]([0-9]{3})[0-9]*', rv.number.text)
                     if nm:
-                        number.text = '150' + nm.group(1) + 'a'
+                        rv.number.text = '150' + nm.group(1) + 'a'
                     else:
                         # Unit number of the Oovee 150 is not in standard format - can't replace the vehicle
                         return False
                     # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def c156_replace(provider, product, blueprint, name, number):
-    if 'Oovee' in provider.text:
-        if 'BRClass156Pack01' in product.text:
+def c156_replace(swapper, rv):
+    if 'Oovee' in rv.provider.text:
+        if 'BRClass156Pack01' in rv.product.text:
             for i in range(0, len(vehicle_db['DMU156_set'])):
                 this_vehicle = vehicle_db['DMU156_set'][i]
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(rv.blueprint.text)
                 if bp:
-                    rv_orig = number.text
-                    nm = re.search('(156[0-9]{3})', number.text)
+                    rv_orig = rv.number.text
+                    nm = re.search('(156[0-9]{3})', rv.number.text)
                     if nm:
-                        number.text = nm.group(1) + 'a' + this_vehicle[7]
+                        rv.number.text = nm.group(1) + 'a' + this_vehicle[7]
                     else:
                         # Unit number of the Oovee 156 is not in standard 156xxx format - can't replace the vehicle
                         return False
                     # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
+                    rv.provider.text = this_vehicle[3]
+                    rv.product.text = this_vehicle[4]
+                    rv.blueprint.text = this_vehicle[5]
+                    rv.name.text = this_vehicle[6]
+                    swapper.rv_list.append(rv.number.text)
+                    swapper.rv_pairs.append([rv_orig, rv.number.text])
                     return True
     return False
 
 
-def c158_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['DMU158_set'])):
-        this_vehicle = vehicle_db['DMU158_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = rv_num = number.text
-                    destination = 'a'
-                    if provider.text == 'S9Bl':
-                        nm = re.search('(....).....([0-9]{6})', number.text)
-                        if nm:
-                            if bool(re.search('Default', blueprint.text, flags=re.IGNORECASE)):
-                                destination = get_destination(c158_s9bl_rr, nm.group(1), 'a')
-                            elif bool(re.search('FGW', blueprint.text, flags=re.IGNORECASE)):
-                                destination = get_destination(c158_s9bl_fgw, nm.group(1), 'a')
-                            elif bool(re.search('NR', blueprint.text, flags=re.IGNORECASE)):
-                                destination = get_destination(c158_s9bl_nr, nm.group(1), 'a')
-                            elif bool(re.search('NTPE', blueprint.text, flags=re.IGNORECASE)):
-                                destination = get_destination(c158_s9bl_tpe, nm.group(1), 'a')
-                            elif bool(re.search('South|SWT', blueprint.text, flags=re.IGNORECASE)):
-                                destination = get_destination(c158_s9bl_swt, nm.group(1), 'a')
-                            rv_num = nm.group(2) + destination
-                    else:
-                        nm = re.search('(.)([0-9]{4}).*', number.text)
-                        if nm:
-                            if (provider.text == 'DTG' and product.text == 'Class158Pack01' and bool(
-                                    re.search('Default', blueprint.text, flags=re.IGNORECASE))) or (
-                                    provider.text == 'DTG' and product.text == 'NorthWalesCoast' and bool(
-                                re.search('Default', blueprint.text, flags=re.IGNORECASE))):
-                                # Arriva Trains Wales liveried stock
-                                destination = get_destination(c158_nwc, nm.group(1), 'a')
-                            elif provider.text == 'DTG' and product.text == 'FifeCircle' and bool(
-                                    re.search('Default', blueprint.text, flags=re.IGNORECASE)):
-                                # ScotRail saltire liveried stock
-                                destination = get_destination(c158_dtg_fc, nm.group(1), 'a')
-                            elif provider.text == 'RSC' and product.text == 'LiverpoolManchester' and bool(
-                                    re.search('Default', blueprint.text, flags=re.IGNORECASE)):
-                                # Regional Railways liveried stock
-                                destination = get_destination(c158_livman_rr, nm.group(1), 'a')
-                            rv_num = '15' + nm.group(2) + destination
-                        if provider.text == 'RSC' and product.text == 'SettleCarlisle':
-                            # Destination blank - Settle-Carlisle units don't support destination displays
-                            rv_num = '158' + rv_orig[2:5] + 'a'
-                    # It's assumed the scenario being converted will have one DMSLA and one DMSLB blueprint in each set
-                    # in the consist. If 2 sets or more sets are joined the driving vehicles will alternate DMSLA /
-                    # DMSLB.
-                    this_bp = this_vehicle[5]
-                    this_name = this_vehicle[6]
-                    v_type = re.search(r'\\Class158C?_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
-                    if v_type:
-                        this_bp = alternate_mu_driving_vehicles(this_bp, v_type.group(1), 'DMSLA', 'DMSLB')
-                        this_name = get_ap_name_from_bp(vehicle_db['DMU158_set'], this_bp)
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_bp
-                    name.text = this_name
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c158_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'DMU158_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv_num = rv.number.text
+        destination = 'a'
+        if rv.provider.text == 'S9Bl':
+            nm = re.search('(....).....([0-9]{6})', rv.number.text)
+            if nm:
+                if bool(re.search('Default', rv.blueprint.text, flags=re.IGNORECASE)):
+                    destination = get_destination(c158_s9bl_rr, nm.group(1), 'a')
+                elif bool(re.search('FGW', rv.blueprint.text, flags=re.IGNORECASE)):
+                    destination = get_destination(c158_s9bl_fgw, nm.group(1), 'a')
+                elif bool(re.search('NR', rv.blueprint.text, flags=re.IGNORECASE)):
+                    destination = get_destination(c158_s9bl_nr, nm.group(1), 'a')
+                elif bool(re.search('NTPE', rv.blueprint.text, flags=re.IGNORECASE)):
+                    destination = get_destination(c158_s9bl_tpe, nm.group(1), 'a')
+                elif bool(re.search('South|SWT', rv.blueprint.text, flags=re.IGNORECASE)):
+                    destination = get_destination(c158_s9bl_swt, nm.group(1), 'a')
+                rv_num = nm.group(2) + destination
+        else:
+            nm = re.search('(.)([0-9]{4}).*', rv.number.text)
+            if nm:
+                if (rv.provider.text == 'DTG' and rv.product.text == 'Class158Pack01' and bool(
+                              re.search('Default', rv.blueprint.text, flags=re.IGNORECASE))) or (
+                                 rv.provider.text == 'DTG' and rv.product.text == 'NorthWalesCoast' and bool(
+                                   re.search('Default', rv.blueprint.text, flags=re.IGNORECASE))):
+                    # Arriva Trains Wales liveried stock
+                    destination = get_destination(c158_nwc, nm.group(1), 'a')
+                elif rv.provider.text == 'DTG' and rv.product.text == 'FifeCircle' and bool(
+                              re.search('Default', rv.blueprint.text, flags=re.IGNORECASE)):
+                    # ScotRail saltire liveried stock
+                    destination = get_destination(c158_dtg_fc, nm.group(1), 'a')
+                elif rv.provider.text == 'RSC' and rv.product.text == 'LiverpoolManchester' and bool(
+                              re.search('Default', rv.blueprint.text, flags=re.IGNORECASE)):
+                    # Regional Railways liveried stock
+                    destination = get_destination(c158_livman_rr, nm.group(1), 'a')
+                rv_num = '15' + nm.group(2) + destination
+            if rv.provider.text == 'RSC' and rv.product.text == 'SettleCarlisle':
+                # Destination blank - Settle-Carlisle units don't support destination displays
+                rv_num = '158' + rv_orig[2:5] + 'a'
+        # It's assumed the scenario being converted will have one DMSLA and one DMSLB blueprint in each set
+        # in the consist. If 2 sets or more sets are joined the driving vehicles will alternate DMSLA /
+        # DMSLB.
+        this_bp = this_vehicle[5]
+        this_name = this_vehicle[6]
+        v_type = re.search(r'\\Class158C?_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
+        if v_type:
+            this_bp = alternate_mu_driving_vehicles(swapper, this_bp, v_type.group(1), 'DMSLA', 'DMSLB')
+            this_name = get_ap_name_from_bp(vehicle_db['DMU158_set'], this_bp)
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_bp
+        rv.name.text = this_name
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c170_replace(provider, product, blueprint, name, number):
-    global mu_last
-    for i in range(0, len(vehicle_db['DMU170_set'])):
-        this_vehicle = vehicle_db['DMU170_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = rv_num = number.text
-                    destination = 'a'
-                    nm = re.search('([a-zA-Z]).....([0-9]{6})', number.text)
-                    if nm:
-                        if bool(re.search(r'\\AR[2-3]\\|\\NXEAWhite\\|\\OR[2-3]\\', blueprint.text,
-                                          flags=re.IGNORECASE)):
-                            destination = get_destination(c170_ar23, nm.group(1), 'a')
-                        elif bool(re.search(r'\\CH\\', blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c168_chiltern, nm.group(1), 'a')
-                        elif bool(re.search(r'\\CT\\|\\CTMML\\|\\XC\\', blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c170_ct_xc, nm.group(1), 'a')
-                        elif bool(re.search(r'\\LM\\', blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c170_lm, nm.group(1), 'a')
-                        elif bool(re.search('Ex-Anglia_Rev_AP|Ex-ONE_AP|Ex-ONE_Dark_AP', blueprint.text,
-                                            flags=re.IGNORECASE)):
-                            destination = get_destination(c170_ex_ar_aga_ap, nm.group(1), 'a')
-                        elif bool(re.search(r'Scotrail|\\FS\\|\\FSRS|\\FSRT|\\SP\\|\\SPSnow\\|',
-                                            blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c170_scotrail, nm.group(1), 'a')
-                        elif bool(re.search(r'\\GA\\|\\HT\\|\\NXEA\s[2-3]C\\', blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c170_ga_hull, nm.group(1), 'a')
-                        elif bool(re.search(r'\\FTPE\\', blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c170_ftpe, nm.group(1), 'a')
-                        elif bool(re.search(r'\\MML\\', blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c170_mml, nm.group(1), 'a')
-                        elif bool(re.search(r'\\S171\\', blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c171_southern, nm.group(1), 'a')
-                        rv_num = nm.group(2) + destination
-                    # It's assumed the scenario being converted will have one DMCL and one DMSL blueprintin each set in
-                    # the consist. If 2 sets or more sets are joined the driving vehicles will alternate DMCL / DMSL.
-                    this_bp = this_vehicle[5]
-                    this_name = this_vehicle[6]
-                    v_type = re.search(r'\\Class170_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
-                    if v_type:
-                        # The SR Saltire Class 170 with DMSL is unlike the others so need a workaround
-                        if v_type.group(1).upper() == 'DMCLA':
-                            this_bp = alternate_mu_driving_vehicles(this_bp, v_type.group(1), 'DMCLA', 'DMSLB')
-                        # The Southern Class 170 also needs a workaround
-                        elif re.search(r'\\Southern_AP', this_vehicle[5], flags=re.IGNORECASE):
-                            this_bp = alternate_mu_driving_vehicles(this_bp, v_type.group(1), 'DMCL', 'DMSLB')
-                        else:
-                            this_bp = alternate_mu_driving_vehicles(this_bp, v_type.group(1), 'DMCL', 'DMSL')
-                        this_name = c170_bp_name_lookup[this_bp]
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_bp
-                    name.text = this_name
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c170_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'DMU170_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv_num = rv.number.text
+        destination = 'a'
+        nm = re.search('([a-zA-Z]).....([0-9]{6})', rv.number.text)
+        if nm:
+            if bool(re.search(r'\\AR[2-3]\\|\\NXEAWhite\\|\\OR[2-3]\\', rv.blueprint.text,
+                              flags=re.IGNORECASE)):
+                destination = get_destination(c170_ar23, nm.group(1), 'a')
+            elif bool(re.search(r'\\CH\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c168_chiltern, nm.group(1), 'a')
+            elif bool(re.search(r'\\CT\\|\\CTMML\\|\\XC\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c170_ct_xc, nm.group(1), 'a')
+            elif bool(re.search(r'\\LM\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c170_lm, nm.group(1), 'a')
+            elif bool(re.search('Ex-Anglia_Rev_AP|Ex-ONE_AP|Ex-ONE_Dark_AP', rv.blueprint.text,
+                                flags=re.IGNORECASE)):
+                destination = get_destination(c170_ex_ar_aga_ap, nm.group(1), 'a')
+            elif bool(re.search(r'Scotrail|\\FS\\|\\FSRS|\\FSRT|\\SP\\|\\SPSnow\\|',
+                                rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c170_scotrail, nm.group(1), 'a')
+            elif bool(re.search(r'\\GA\\|\\HT\\|\\NXEA\s[2-3]C\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c170_ga_hull, nm.group(1), 'a')
+            elif bool(re.search(r'\\FTPE\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c170_ftpe, nm.group(1), 'a')
+            elif bool(re.search(r'\\MML\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c170_mml, nm.group(1), 'a')
+            elif bool(re.search(r'\\S171\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c171_southern, nm.group(1), 'a')
+            rv_num = nm.group(2) + destination
+        # It's assumed the scenario being converted will have one DMCL and one DMSL blueprintin each set in
+        # the consist. If 2 sets or more sets are joined the driving vehicles will alternate DMCL / DMSL.
+        this_bp = this_vehicle[5]
+        this_name = this_vehicle[6]
+        v_type = re.search(r'\\Class170_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
+        if v_type:
+            # The SR Saltire Class 170 with DMSL is unlike the others so need a workaround
+            if v_type.group(1).upper() == 'DMCLA':
+                this_bp = alternate_mu_driving_vehicles(swapper, this_bp, v_type.group(1), 'DMCLA', 'DMSLB')
+            # The Southern Class 170 also needs a workaround
+            elif re.search(r'\\Southern_AP', this_vehicle[5], flags=re.IGNORECASE):
+                this_bp = alternate_mu_driving_vehicles(swapper, this_bp, v_type.group(1), 'DMCL', 'DMSLB')
+            else:
+                this_bp = alternate_mu_driving_vehicles(swapper, this_bp, v_type.group(1), 'DMCL', 'DMSL')
+            this_name = c170_bp_name_lookup[this_bp]
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_bp
+        rv.name.text = this_name
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c175_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['DMU175_set'])):
-        this_vehicle = vehicle_db['DMU175_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = rv_num = number.text
-                    nm = re.search('([0-9]{6})([a-zA-Z])', number.text)
-                    if nm:
-                        # Check if destination is 'v' - Empty to Depot. If so, change to uppercase 'V' used by AP.
-                        # Otherwise, destination is consistent with AP scheme and doesn't need changed.
-                        if nm.group(2) == 'v':
-                            destination = 'V'
-                        else:
-                            destination = nm.group(2)
-                        rv_num = nm.group(1) + destination
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c175_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'DMU175_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv_num = rv.number.text
+        nm = re.search('([0-9]{6})([a-zA-Z])', rv.number.text)
+        if nm:
+            # Check if destination is 'v' - Empty to Depot. If so, change to uppercase 'V' used by AP.
+            # Otherwise, destination is consistent with AP scheme and doesn't need changed.
+            if nm.group(2) == 'v':
+                destination = 'V'
+            else:
+                destination = nm.group(2)
+            rv_num = nm.group(1) + destination
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c221_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['DMU220-1_set'])):
-        this_vehicle = vehicle_db['DMU220-1_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = rv_num = number.text
-                    nm_driven = re.search('^..([0-9]{6})([0-9]{5})$', number.text)
-                    nm_coach = re.search('^..([0-9]{5})$', number.text)
-                    if nm_driven:
-                        # Driving vehicle found.
-                        rv_num = nm_driven.group(1) + nm_driven.group(2)
-                    elif nm_coach:
-                        # Coach found
-                        rv_num = '221012' + nm_coach.group(1)
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c221_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'DMU220-1_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv_num = rv.number.text
+        nm_driven = re.search('^..([0-9]{6})([0-9]{5})$', rv.number.text)
+        nm_coach = re.search('^..([0-9]{5})$', rv.number.text)
+        if nm_driven:
+            # Driving vehicle found.
+            rv_num = nm_driven.group(1) + nm_driven.group(2)
+        elif nm_coach:
+            # Coach found
+            rv_num = '221012' + nm_coach.group(1)
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c319_replace(provider, product, blueprint, name, number):
-    global mu_last, mso_num
-    for i in range(0, len(vehicle_db['EMU319_set'])):
-        this_vehicle = vehicle_db['EMU319_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    this_bp = this_vehicle[5]
-                    this_name = this_vehicle[6]
-                    rv_orig = number.text
-                    rv_num = rv_orig
-                    set_nm = re.search('(319[0-9]{3}).....([a-zA-Z]?)', number.text)
-                    if set_nm:
-                        if set_nm.group(2) == '':
-                            dest = '#'
-                        else:
-                            dest = set_nm.group(2)
-                        mso_num = set_nm.group(1) + dest
-                    v_type = re.search(r'\\Class_319_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
-                    if v_type:
-                        if v_type.group(1).upper() == 'MSO':
-                            rv_num = dcsv_get_num(
-                                Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
-                                     this_vehicle[7].replace('\\', '/')), mso_num[0:6], 'Z([0-9]{6})(.*)')
-                            rv_num = c319_dest[mso_num[6:]] + rv_num
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_bp
-                    name.text = this_name
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c319_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'EMU319_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        this_bp = this_vehicle[5]
+        this_name = this_vehicle[6]
+        rv_orig = rv.number.text
+        rv_num = rv_orig
+        set_nm = re.search('(319[0-9]{3}).....([a-zA-Z]?)', rv.number.text)
+        if set_nm:
+            if set_nm.group(2) == '':
+                dest = '#'
+            else:
+                dest = set_nm.group(2)
+            swapper.mso_num = set_nm.group(1) + dest
+        v_type = re.search(r'\\Class_319_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
+        if v_type:
+            if v_type.group(1).upper() == 'MSO':
+                rv_num = dcsv_get_num(
+                    swapper, Path(railworks_path, 'Assets', this_vehicle[3], this_vehicle[4],
+                         this_vehicle[7].replace('\\', '/')), swapper.mso_num[0:6], 'Z([0-9]{6})(.*)')
+                rv_num = c319_dest[swapper.mso_num[6:]] + rv_num
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_bp
+        rv.name.text = this_name
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c325_replace(provider, product, blueprint, name, number):
-    global mu_last
-    for i in range(0, len(vehicle_db['EMU325_set'])):
-        this_vehicle = vehicle_db['EMU325_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    # It's assumed the scenario being converted will have one DTVA and one DTVB blueprint in each
-                    # set in the consist. If 2 sets or more sets are joined the driving vehicles will alternate
-                    # DTVA / DTVB.
-                    this_bp = this_vehicle[5]
-                    this_name = this_vehicle[6]
-                    v_type = re.search(r'\\Class325_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
-                    if v_type:
-                        this_bp = alternate_mu_driving_vehicles(this_bp, v_type.group(1), 'DTVA', 'DTVB')
-                        this_name = get_ap_name_from_bp(vehicle_db['EMU325_set'], this_bp)
-                    # Check if we're on DC power
-                    dc = re.search('_DC', this_vehicle[5], flags=re.IGNORECASE)
-                    if dc:
-                        this_dcsv = 'PMV_DC.dcsv'
-                    else:
-                        this_dcsv = 'PMV.dcsv'
-                    rv_orig = number.text
-                    nm = re.search('[0-9]{5}(325[0-9]{3})', number.text)
-                    if nm:
-                        rv_num = nm.group(1)
-                    else:
-                        rv_num = number.text[0:5]
-                        if 68340 <= int(rv_num) <= 68355:
-                            rv_num = str(int(rv_num) + 256661)
-                            rv_num = dcsv_get_num(
-                                Path(railworks_path, 'Assets', 'RSC', 'Class325Pack01', 'RailVehicles', 'Class325',
-                                     'RM1_W1_AP', this_dcsv), rv_num, '([0-9]{6})(.*)')
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_bp
-                    name.text = this_name
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c325_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'EMU325_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        # It's assumed the scenario being converted will have one DTVA and one DTVB blueprint in each
+        # set in the consist. If 2 sets or more sets are joined the driving vehicles will alternate
+        # DTVA / DTVB.
+        this_bp = this_vehicle[5]
+        this_name = this_vehicle[6]
+        v_type = re.search(r'\\Class325_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
+        if v_type:
+            this_bp = alternate_mu_driving_vehicles(swapper, this_bp, v_type.group(1), 'DTVA', 'DTVB')
+            this_name = get_ap_name_from_bp(vehicle_db['EMU325_set'], this_bp)
+        # Check if we're on DC power
+        dc = re.search('_DC', this_vehicle[5], flags=re.IGNORECASE)
+        if dc:
+            this_dcsv = 'PMV_DC.dcsv'
+        else:
+            this_dcsv = 'PMV.dcsv'
+        rv_orig = rv.number.text
+        nm = re.search('[0-9]{5}(325[0-9]{3})', rv.number.text)
+        if nm:
+            rv_num = nm.group(1)
+        else:
+            rv_num = rv.number.text[0:5]
+            if 68340 <= int(rv_num) <= 68355:
+                rv_num = str(int(rv_num) + 256661)
+                rv_num = dcsv_get_num(
+                    swapper, Path(railworks_path, 'Assets', 'RSC', 'Class325Pack01', 'RailVehicles', 'Class325',
+                         'RM1_W1_AP', this_dcsv), rv_num, '([0-9]{6})(.*)')
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_bp
+        rv.name.text = this_name
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c350_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['EMU350_set'])):
-        this_vehicle = vehicle_db['EMU350_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = number.text  # 3503696014219
+def c350_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'EMU350_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv.number.text  # 3503696014219
+        destination = ''
+        nm = re.search('([0-9]{6}).....(.*)', rv.number.text)
+        if nm:
+            if bool(re.search(r'\\FTPE\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c350_lb_ftpe, nm.group(2), '0')
+                if destination == '0':
                     destination = ''
-                    nm = re.search('([0-9]{6}).....(.*)', number.text)
-                    if nm:
-                        if bool(re.search(r'\\FTPE\\', blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c350_lb_ftpe, nm.group(2), '0')
-                            if destination == '0':
-                                destination = ''
-                            else:
-                                destination = ';D=' + destination
-                        if product.text == 'CrossCity' and \
-                                bool(re.search(r'RailVehicles\\Electric\\Class350\\Default\\Engine\\Class350_',
-                                               blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c350_lm_cc, nm.group(2), '0')
-                            if destination == '0':
-                                destination = ''
-                            else:
-                                destination = ';D=' + destination
-                        if product.text == 'WCML-South' and \
-                                bool(re.search(r'RailVehicles\\Electric\\Class350\\Default\\Engine\\Class350_',
-                                               blueprint.text, flags=re.IGNORECASE)):
-                            destination = get_destination(c350_lm_wcmls, nm.group(2), '0')
-                            if destination == '0':
-                                destination = ''
-                            else:
-                                destination = ';D=' + destination
-                        rv_num = nm.group(1) + destination
-                    else:
-                        rv_num = number.text[0:6]
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+                else:
+                    destination = ';D=' + destination
+            if rv.product.text == 'CrossCity' and \
+                    bool(re.search(r'RailVehicles\\Electric\\Class350\\Default\\Engine\\Class350_',
+                                   rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c350_lm_cc, nm.group(2), '0')
+                if destination == '0':
+                    destination = ''
+                else:
+                    destination = ';D=' + destination
+            if rv.product.text == 'WCML-South' and \
+                    bool(re.search(r'RailVehicles\\Electric\\Class350\\Default\\Engine\\Class350_',
+                                   rv.blueprint.text, flags=re.IGNORECASE)):
+                destination = get_destination(c350_lm_wcmls, nm.group(2), '0')
+                if destination == '0':
+                    destination = ''
+                else:
+                    destination = ';D=' + destination
+            rv_num = nm.group(1) + destination
+        else:
+            rv_num = rv.number.text[0:6]
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c365_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['EMU365_set'])):
-        this_vehicle = vehicle_db['EMU365_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = rv_num = number.text
-                    destination = 'a'
-                    nm = re.search('([0-9]{6})......([a-zA-Z]?)', number.text)
-                    # Check if this is an RSC ECMLS 365 format number
-                    if nm:
-                        if bool(re.search(r'\\Default\\', blueprint.text, flags=re.IGNORECASE)):
-                            # This is for the ECMLS 365 NSE livery
-                            destination = get_destination(c365_ecmls_nse, nm.group(2), 'a')
-                        rv_num = number.text[0:6] + destination
-                    nm = re.search('([a-zA-Z]?)........([0-9]{3})', number.text)
-                    # Check if this is an RSC Class365Pack02 format number
-                    if nm:
-                        if bool(re.search(r'\\CXSE_AP\\', blueprint.text, flags=re.IGNORECASE)):
-                            # This is for the ECMLS 365 NSE livery
-                            destination = get_destination(c365_apcxse, nm.group(1), 'a')
-                        rv_num = '365' + nm.group(2) + destination
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c365_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'EMU365_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv_num = rv.number.text
+        destination = 'a'
+        nm = re.search('([0-9]{6})......([a-zA-Z]?)', rv.number.text)
+        # Check if this is an RSC ECMLS 365 format number
+        if nm:
+            if bool(re.search(r'\\Default\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                # This is for the ECMLS 365 NSE livery
+                destination = get_destination(c365_ecmls_nse, nm.group(2), 'a')
+            rv_num = rv.number.text[0:6] + destination
+        nm = re.search('([a-zA-Z]?)........([0-9]{3})', rv.number.text)
+        # Check if this is an RSC Class365Pack02 format number
+        if nm:
+            if bool(re.search(r'\\CXSE_AP\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                # This is for the ECMLS 365 NSE livery
+                destination = get_destination(c365_apcxse, nm.group(1), 'a')
+            rv_num = '365' + nm.group(2) + destination
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c375_replace(provider, product, blueprint, name, number):
-    global mu_last
-    for i in range(0, len(vehicle_db['EMU375-7_set'])):
-        this_vehicle = vehicle_db['EMU375-7_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = rv_num = number.text
-                    destination = 'a'
-                    nm = re.search('([a-zA-Z]).....([0-9]{6})', number.text)
-                    if nm:
-                        destination = get_destination(c375_dtg_pack, nm.group(1), 'a')
-                        if product.text.upper() == 'LondonGillingham':
-                            if bool(re.search(r'\\SN\\', blueprint.text, flags=re.IGNORECASE)):
-                                # This is for the London-Gillingham Southern livery
-                                destination = get_destination(c377_lg_sn, nm.group(1), 'a')
-                        if product.text == 'PortsmouthDirect':
-                            if bool(re.search(r'\\SN\\', blueprint.text, flags=re.IGNORECASE)):
-                                # This is for the Portsmouth Direct Southern livery
-                                destination = get_destination(c377_lg_sn, nm.group(1), 'a')
-                        if product.text == 'BrightonMainLine':
-                            if bool(re.search(r'\\FCC', blueprint.text, flags=re.IGNORECASE)):
-                                # This is for the Brighton Main Line FCC livery
-                                destination = get_destination(c377_fcc, nm.group(1), 'a')
-                            if bool(re.search(r'\\Southern', blueprint.text, flags=re.IGNORECASE)):
-                                # This is for the Brighton Main Line Southern livery
-                                destination = get_destination(c377_lg_sn, nm.group(1), 'a')
-                            if bool(re.search(r'\\SE-White', blueprint.text, flags=re.IGNORECASE)):
-                                # This is for the Brighton Main Line SE White livery
-                                destination = get_destination(c377_lb_se, nm.group(1), 'a')
-                        if product.text == 'WCML-South':
-                            if bool(re.search(r'\\Class377\\Engine\\Class377_[A-Z_]*\.xml', blueprint.text,
-                                              flags=re.IGNORECASE)):
-                                # This is for the DTG WCML South Southern livery
-                                destination = get_destination(c375_southern_wcmls, nm.group(1), 'a')
-                    # Check whether DMOSA, DMOSB, MOSL, PTOSL, or TOSL and change number accordingly
-                    # It's assumed the scenario being converted will have only one DMOSA vehicle at the front and that
-                    # all other DMOS vehicles in the consist will be DMOSB. If that's left as it is then the AP ones
-                    # will have headlights and taillights on at the same time and generally go to pot.
-                    this_bp = this_vehicle[5]
-                    this_name = this_vehicle[6]
-                    v_type = re.search('375_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
-                    if v_type:
-                        rv_num = number.text[6:12] + destination
-                        if v_type.group(1).upper() == 'DMOSA':
-                            # Test if last Driving vehicle was a DxxA - if so, swap this one for a DxxB
-                            if mu_last == 'DMOSA':
-                                # Swap for a DxxB
-                                this_bp = c375_dmos_lookup[this_bp]
-                                # Remember that the last driven vehicle in this consist was a DxxB.
-                                mu_last = 'DMOSB'
-                            else:
-                                # Leave the DxxA as it is. Remember that the last driving vehicle processed in this
-                                # consist was a DxxA.
-                                mu_last = 'DMOSA'
-                        elif v_type.group(1).upper() == 'DMOSB':
-                            # Test if last Driving vehicle was a DxxB - if so, swap this one for a DxxA
-                            if mu_last == 'DMOSB':
-                                # Swap for a DxxA
-                                this_bp = c375_dmos_lookup[this_bp]
-                                # Remember that the last cab vehicle in this consist was a DxxA.
-                                mu_last = 'DMOSA'
-                            else:
-                                # Leave the DxxB as it is. Remember that the last driving vehicle processed in this
-                                # consist was a DxxB.
-                                mu_last = 'DMOSB'
-                        this_name = get_ap_name_from_bp(vehicle_db['EMU375-7_set'], this_bp)
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_bp
-                    name.text = this_name
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c375_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'EMU375-7_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv_num = rv.number.text
+        destination = 'a'
+        nm = re.search('([a-zA-Z]).....([0-9]{6})', rv.number.text)
+        if nm:
+            destination = get_destination(c375_dtg_pack, nm.group(1), 'a')
+            if rv.product.text.upper() == 'LondonGillingham':
+                if bool(re.search(r'\\SN\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                    # This is for the London-Gillingham Southern livery
+                    destination = get_destination(c377_lg_sn, nm.group(1), 'a')
+            if rv.product.text == 'PortsmouthDirect':
+                if bool(re.search(r'\\SN\\', rv.blueprint.text, flags=re.IGNORECASE)):
+                    # This is for the Portsmouth Direct Southern livery
+                    destination = get_destination(c377_lg_sn, nm.group(1), 'a')
+            if rv.product.text == 'BrightonMainLine':
+                if bool(re.search(r'\\FCC', rv.blueprint.text, flags=re.IGNORECASE)):
+                    # This is for the Brighton Main Line FCC livery
+                    destination = get_destination(c377_fcc, nm.group(1), 'a')
+                if bool(re.search(r'\\Southern', rv.blueprint.text, flags=re.IGNORECASE)):
+                    # This is for the Brighton Main Line Southern livery
+                    destination = get_destination(c377_lg_sn, nm.group(1), 'a')
+                if bool(re.search(r'\\SE-White', rv.blueprint.text, flags=re.IGNORECASE)):
+                    # This is for the Brighton Main Line SE White livery
+                    destination = get_destination(c377_lb_se, nm.group(1), 'a')
+            if rv.product.text == 'WCML-South':
+                if bool(re.search(r'\\Class377\\Engine\\Class377_[A-Z_]*\.xml', rv.blueprint.text,
+                                  flags=re.IGNORECASE)):
+                    # This is for the DTG WCML South Southern livery
+                    destination = get_destination(c375_southern_wcmls, nm.group(1), 'a')
+        # Check whether DMOSA, DMOSB, MOSL, PTOSL, or TOSL and change number accordingly
+        # It's assumed the scenario being converted will have only one DMOSA vehicle at the front and that
+        # all other DMOS vehicles in the consist will be DMOSB. If that's left as it is then the AP ones
+        # will have headlights and taillights on at the same time and generally go to pot.
+        this_bp = this_vehicle[5]
+        this_name = this_vehicle[6]
+        v_type = re.search('375_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
+        if v_type:
+            rv_num = rv.number.text[6:12] + destination
+            if v_type.group(1).upper() == 'DMOSA':
+                # Test if last Driving vehicle was a DxxA - if so, swap this one for a DxxB
+                if swapper.mu_last == 'DMOSA':
+                    # Swap for a DxxB
+                    this_bp = c375_dmos_lookup[this_bp]
+                    # Remember that the last driven vehicle in this consist was a DxxB.
+                    swapper.mu_last = 'DMOSB'
+                else:
+                    # Leave the DxxA as it is. Remember that the last driving vehicle processed in this
+                    # consist was a DxxA.
+                    swapper.mu_last = 'DMOSA'
+            elif v_type.group(1).upper() == 'DMOSB':
+                # Test if last Driving vehicle was a DxxB - if so, swap this one for a DxxA
+                if swapper.mu_last == 'DMOSB':
+                    # Swap for a DxxA
+                    this_bp = c375_dmos_lookup[this_bp]
+                    # Remember that the last cab vehicle in this consist was a DxxA.
+                    swapper.mu_last = 'DMOSA'
+                else:
+                    # Leave the DxxB as it is. Remember that the last driving vehicle processed in this
+                    # consist was a DxxB.
+                    swapper.mu_last = 'DMOSB'
+            this_name = get_ap_name_from_bp(vehicle_db['EMU375-7_set'], this_bp)
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_bp
+        rv.name.text = this_name
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c450_replace(provider, product, blueprint, name, number):
-    global mu_last
-    for i in range(0, len(vehicle_db['EMU450_set'])):
-        this_vehicle = vehicle_db['EMU450_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = number.text
-                    rv_num = number.text[0:6]
-                    if provider.text == 'DTG' and product.text == 'PortsmouthDirect':
-                        # AP Class 450 uses same destination codes as PortsmouthDirect C450s
-                        nm = re.search('([0-9]{6}).....([0-9]{0,2})', number.text)
-                        if nm:
-                            if len(nm.group(2)) > 0:
-                                destination = ';D=' + str(int(nm.group(2)))
-                                rv_num = nm.group(1) + destination
+def c450_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'EMU450_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv.number.text
+        rv_num = rv.number.text[0:6]
+        if rv.provider.text == 'DTG' and rv.product.text == 'PortsmouthDirect':
+            # AP Class 450 uses same destination codes as PortsmouthDirect C450s
+            nm = re.search('([0-9]{6}).....([0-9]{0,2})', rv.number.text)
+            if nm:
+                if len(nm.group(2)) > 0:
+                    destination = ';D=' + str(int(nm.group(2)))
+                    rv_num = nm.group(1) + destination
+        else:
+            nm = re.search('([0-9]{6}).....([A-Z]{0,1})', rv.number.text)
+            if nm:
+                if len(nm.group(2)) > 0:
+                    # London-Brighton and Guildford C450s destinations need translation via dictionary
+                    destination = get_destination(c450_gu_swt, nm.group(2), '0')
+                    if destination == '0':
+                        destination = ''
                     else:
-                        nm = re.search('([0-9]{6}).....([A-Z]{0,1})', number.text)
-                        if nm:
-                            if len(nm.group(2)) > 0:
-                                # London-Brighton and Guildford C450s destinations need translation via dictionary
-                                destination = get_destination(c450_gu_swt, nm.group(2), '0')
-                                if destination == '0':
-                                    destination = ''
-                                else:
-                                    destination = ';D=' + destination
-                                rv_num = nm.group(1) + destination
-                    # It's assumed the scenario being converted will have one DMC1 and one DMC2 in each set in the
-                    # consist. If 2 sets or more sets are joined the driving vehicles will alternate DMC1 / DMC2.
-                    this_bp = this_vehicle[5]
-                    this_name = this_vehicle[6]
-                    v_type = re.search(r'\\(444|450)_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
-                    if v_type:
-                        this_bp = alternate_mu_driving_vehicles(this_bp, v_type.group(2), 'DMOS', 'DMOSB')
-                        this_name = get_ap_name_from_bp(vehicle_db['EMU450_set'], this_bp)
-                    if not bool(re.search('DMC1', this_name, flags=re.IGNORECASE)):
-                        # Any vehicle other than a DMOS/DMC1 gets a placeholder number
-                        rv_num = v_type.group(2) + number.text[0:6]
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_bp
-                    name.text = this_name
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+                        destination = ';D=' + destination
+                    rv_num = nm.group(1) + destination
+        # It's assumed the scenario being converted will have one DMC1 and one DMC2 in each set in the
+        # consist. If 2 sets or more sets are joined the driving vehicles will alternate DMC1 / DMC2.
+        this_bp = this_vehicle[5]
+        this_name = this_vehicle[6]
+        v_type = re.search(r'\\(444|450)_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
+        if v_type:
+            this_bp = alternate_mu_driving_vehicles(swapper, this_bp, v_type.group(2), 'DMOS', 'DMOSB')
+            this_name = get_ap_name_from_bp(vehicle_db['EMU450_set'], this_bp)
+        if not bool(re.search('DMC1', this_name, flags=re.IGNORECASE)):
+            # Any vehicle other than a DMOS/DMC1 gets a placeholder number
+            rv_num = v_type.group(2) + rv.number.text[0:6]
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_bp
+        rv.name.text = this_name
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c456_replace(provider, product, blueprint, name, number):
-    global mu_last
-    for i in range(0, len(vehicle_db['EMU456_set'])):
-        this_vehicle = vehicle_db['EMU456_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = number.text
-                    rv_num = number.text[0:11]
-                    rv_dest = number.text[11]
-                    if bool(re.search(r'\\NetworkSE\\', blueprint.text, flags=re.IGNORECASE)):
-                        rv_num = c456_nse[rv_dest] + rv_num
-                    elif bool(re.search(r'\\Default\\', blueprint.text, flags=re.IGNORECASE)):
-                        rv_num = c456_southern[rv_dest] + rv_num
-                    else:
-                        # At the moment only the Default (Southern) 456 and the NSE 456 are configured
-                        return False
-                    # It's assumed the scenario being converted will have one DMC1 and one DMC2 in each set in the
-                    # consist. If 2 sets or more sets are joined the driving vehicles will alternate DMC1 / DMC2.
-                    this_bp = this_vehicle[5]
-                    this_name = this_vehicle[6]
-                    v_type = re.search(r'\\Class_456_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
-                    if v_type:
-                        this_bp = alternate_mu_driving_vehicles(this_bp, v_type.group(1), 'DMSO', 'DTSO')
-                        this_name = get_ap_name_from_bp(vehicle_db['EMU456_set'], this_bp)
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_bp
-                    name.text = this_name
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c456_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'EMU456_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv.number.text
+        rv_num = rv.number.text[0:11]
+        rv_dest = rv.number.text[11]
+        if bool(re.search(r'\\NetworkSE\\', rv.blueprint.text, flags=re.IGNORECASE)):
+            rv_num = c456_nse[rv_dest] + rv_num
+        elif bool(re.search(r'\\Default\\', rv.blueprint.text, flags=re.IGNORECASE)):
+            rv_num = c456_southern[rv_dest] + rv_num
+        else:
+            # At the moment only the Default (Southern) 456 and the NSE 456 are configured
+            return False
+        # It's assumed the scenario being converted will have one DMC1 and one DMC2 in each set in the
+        # consist. If 2 sets or more sets are joined the driving vehicles will alternate DMC1 / DMC2.
+        this_bp = this_vehicle[5]
+        this_name = this_vehicle[6]
+        v_type = re.search(r'\\Class_456_([A-Z]*)', this_vehicle[5], flags=re.IGNORECASE)
+        if v_type:
+            this_bp = alternate_mu_driving_vehicles(swapper, this_bp, v_type.group(1), 'DMSO', 'DTSO')
+            this_name = get_ap_name_from_bp(vehicle_db['EMU456_set'], this_bp)
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_bp
+        rv.name.text = this_name
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def c465_replace(provider, product, blueprint, name, number):
-    for i in range(0, len(vehicle_db['EMU465_set'])):
-        this_vehicle = vehicle_db['EMU465_set'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    rv_orig = rv_num = number.text
-                    destination = 'a'
-                    nm = re.search('([a-zA-Z]?)........([0-9]{3})', number.text)
-                    if nm:
-                        destination = get_destination(c465_se, nm.group(1), 'a')
-                        rv_num = '465' + nm.group(2) + destination
-                    # Swap vehicle and set number / destination (where possible)
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    number.text = str(rv_num)
-                    rv_list.append(number.text)
-                    rv_pairs.append([rv_orig, number.text])
-                    return True
+def c465_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'EMU465_set', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv_orig = rv_num = rv.number.text
+        destination = 'a'
+        nm = re.search('([a-zA-Z]?)........([0-9]{3})', rv.number.text)
+        if nm:
+            destination = get_destination(c465_se, nm.group(1), 'a')
+            rv_num = '465' + nm.group(2) + destination
+        # Swap vehicle and set number / destination (where possible)
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        rv.number.text = str(rv_num)
+        swapper.rv_list.append(rv.number.text)
+        swapper.rv_pairs.append([rv_orig, rv.number.text])
+        return True
     return False
 
 
-def user_replace(provider, product, blueprint, name):
-    for i in range(0, len(user_db['User'])):
-        this_vehicle = user_db['User'][i]
-        if this_vehicle[0] in provider.text:
-            if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
-                if bp:
-                    provider.text = this_vehicle[3]
-                    product.text = this_vehicle[4]
-                    blueprint.text = this_vehicle[5]
-                    name.text = this_vehicle[6]
-                    return True
+def user_replace(swapper, rv):
+    this_vehicle = find_vehicle_rule(swapper, 'User', rv.provider.text, rv.product.text, rv.blueprint.text)
+    if this_vehicle:
+        rv.provider.text = this_vehicle[3]
+        rv.product.text = this_vehicle[4]
+        rv.blueprint.text = this_vehicle[5]
+        rv.name.text = this_vehicle[6]
+        return True
     return False
 
 
-def parse_xml(xml_file):
-    # Check we can open the file, parse it and find some rail vehicle consists in it before proceeding
-    global mu_last
+def update_renumbering(swapper):
+    # Index the vehicle number changes made since the last call by their old number. Each old number gives the
+    # positions in rv_pairs of the changes from it.
+    for i in range(swapper.renumbering_size, len(swapper.rv_pairs)):
+        swapper.renumbering.setdefault(swapper.rv_pairs[i][0], []).append(i)
+    swapper.renumbering_size = len(swapper.rv_pairs)
+
+
+def renumber(swapper, this_rv):
+    # Return the number a vehicle numbered this_rv has after the vehicle number changes indexed so far, as if each of
+    # them were applied to it in turn - so if it was renumbered, any later change from its new number is applied too
+    position = -1
+    while this_rv in swapper.renumbering:
+        positions = swapper.renumbering[this_rv]
+        i = bisect.bisect_right(positions, position)
+        if i == len(positions):
+            break
+        position = positions[i]
+        this_rv = swapper.rv_pairs[position][1]
+    return this_rv
+
+
+class RailVehicle:
+    # The parts of a rail vehicle (a cOwnedEntity of a consist) which the substitutions look at or change, found in one
+    # walk over its child elements rather than a search of them for each part. Each is the first element found where a
+    # search of the vehicle for it would find it, or None if it has none. tailmarker is 0 if the vehicle is first in a
+    # driven consist, 2 if it is last and 1 otherwise.
+    __slots__ = ('provider', 'product', 'blueprint', 'name', 'number', 'loaded', 'flipped', 'followers', 'tailmarker')
+
+    def __init__(self, coentity, tailmarker):
+        self.provider = self.product = self.blueprint = self.name = None
+        self.number = self.loaded = self.flipped = self.followers = None
+        self.tailmarker = tailmarker
+        for child in coentity:
+            if child.tag == 'Component':
+                # Component/*/UniqueNumber, Component/*/Flipped, Component/*/Followers and
+                # Component/cCargoComponent/IsPreLoaded
+                for component in child:
+                    for part in component:
+                        if part.tag == 'UniqueNumber':
+                            if self.number is None:
+                                self.number = part
+                        elif part.tag == 'Flipped':
+                            if self.flipped is None:
+                                self.flipped = part
+                        elif part.tag == 'Followers':
+                            if self.followers is None:
+                                self.followers = part
+                        elif part.tag == 'IsPreLoaded' and component.tag == 'cCargoComponent':
+                            if self.loaded is None:
+                                self.loaded = part
+            elif child.tag == 'BlueprintID':
+                # BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintID, and the Provider and Product of its
+                # BlueprintSetID/iBlueprintLibrary-cBlueprintSetID
+                for blueprint_id in child:
+                    if blueprint_id.tag != 'iBlueprintLibrary-cAbsoluteBlueprintID':
+                        continue
+                    for part in blueprint_id:
+                        if part.tag == 'BlueprintID':
+                            if self.blueprint is None:
+                                self.blueprint = part
+                        elif part.tag == 'BlueprintSetID':
+                            for set_id in part:
+                                if set_id.tag != 'iBlueprintLibrary-cBlueprintSetID':
+                                    continue
+                                for set_part in set_id:
+                                    if set_part.tag == 'Provider':
+                                        if self.provider is None:
+                                            self.provider = set_part
+                                    elif set_part.tag == 'Product':
+                                        if self.product is None:
+                                            self.product = set_part
+            elif child.tag == 'Name':
+                if self.name is None:
+                    self.name = child
+
+
+# The service name and whether the player drives it, looked up once for each consist
+find_service = compile_path('Driver/cDriver/ServiceName/Localisation-cUserLocalisedString/English')
+find_player_driver = compile_path('Driver/cDriver/PlayerDriver')
+
+
+def swap_consist(swapper, citem):
+    # Offer each rail vehicle in a consist to the enabled substitutions, then update the changed vehicle numbers in the
+    # consist's list of initial rail vehicles
+    service = find_service(citem)
+    if service is None:
+        service = 'Loose consist'
+        driven = False
+    else:
+        service = service.text
+        driven = True
+    # Find if this consist is driven by the player
+    playerdriver = find_player_driver(citem)
+    if playerdriver is None:
+        playerdriven = False
+    elif playerdriver.text == '1':
+        playerdriven = True
+    else:
+        playerdriven = False
+    # Iterate through RailVehicles list of the consist
+    for rvehicles in citem.findall('RailVehicles'):
+        # Iterate through each RailVehicle in the consist
+        coentities = rvehicles.findall('cOwnedEntity')
+        consist_item_nr = 0
+        for coentity in coentities:
+            consist_item_nr = consist_item_nr + 1
+            # Set tailmarker - 0 if vehicle is first in consist, 2 if last, 1 if somewhere in between
+            # We need this if the vehicles with tail lights come in a separate blueprint (e.g. AP HAA).
+            # A vehicle will not get a tail light added if it is in a loose consist.
+            tailmarker = 1
+            if driven == True:
+                if consist_item_nr == 1:
+                    tailmarker = 0
+                elif consist_item_nr == len(coentities):
+                    tailmarker = 2
+            rv = RailVehicle(coentity, tailmarker)
+            swapper.input_vehicle_list.append(
+                [str(swapper.consist_nr), rv.provider.text, rv.product.text, rv.blueprint.text, rv.name.text,
+                 rv.number.text, rv.loaded.text, service, playerdriven])
+            vehicle_replacer(swapper, rv)
+            swapper.output_vehicle_list.append(
+                [str(swapper.consist_nr), rv.provider.text, rv.product.text, rv.blueprint.text, rv.name.text,
+                 rv.number.text, rv.loaded.text, service, playerdriven])
+        swapper.mu_last = 'none'
+        swapper.consist_nr += 1
+    if len(swapper.rv_pairs) > 0:
+        update_renumbering(swapper)
+        for drv in citem.findall('Driver/cDriver/InitialRV/e'):
+            drv.text = renumber(swapper, drv.text)
+
+
+# The vehicle numbers in the targets of a consist's driver instructions, e.g. for coupling or uncoupling
+instruction_rv_path = 'Driver/cDriver/DriverInstructionContainer/cDriverInstructionContainer/DriverInstruction/*/' \
+                      'DeltaTarget/cDriverInstructionTarget/RailVehicleNumber/e'
+
+
+def renumber_instructions(swapper, citem):
+    # Update the changed vehicle numbers in a consist's driver instructions
+    for crv in citem.findall(instruction_rv_path):
+        crv.text = renumber(swapper, crv.text)
+
+
+def open_progress_window(label):
+    # Pop up a progress bar window, if running with the window, and return it with its progress bar
+    if sg is None:
+        return None, None
+    progress_layout = [
+        [sg.Text(label)],
+        [sg.ProgressBar(1, orientation='h', key='progress', size=(25, 15))]
+    ]
+    progress_win = sg.Window('Processing...', progress_layout, disable_close=True).Finalize()
+    progress_win.bring_to_front()
+    progress_win.force_focus()
+    return progress_win, progress_win.find_element('progress')
+
+
+def scenario_error(xml_file, problem):
+    show_message('The file you requested (' + str(Path(xml_file)) + ') ' + problem +
+                 ' Is it definitely a scenario file?',
+                 'Please try again with another Scenario.bin or Scenario.xml file.', title='Error')
+
+
+def parse_xml(swapper, xml_file, parser_tree=None):
+    # Check we can open the file, parse it and find some rail vehicle consists in it before proceeding. The tree may
+    # be given instead, if the file has already been read from its .bin form.
     try:
-        parser_tree = ET.parse(xml_file)
+        if parser_tree is None:
+            parser_tree = parse_file(xml_file)
     except FileNotFoundError:
-        sg.popup('Scenario file ' + str(Path(xml_file)) + ' not found.', 'Please try again.', title='Error')
+        show_message('Scenario file ' + str(Path(xml_file)) + ' not found.', 'Please try again.', title='Error')
         return False
     except ET.ParseError:
-        sg.popup('The file you requested (' + str(Path(xml_file)) + ') could not be processed due to an XML parse '
-                                                                    'error. Is it definitely a scenario file?',
-                 'Please try again with another Scenario.bin or Scenario.xml '
-                 'file.', title='Error')
+        scenario_error(xml_file, 'could not be processed due to an XML parse error.')
         return False
     ET.register_namespace("d", "http://www.kuju.com/TnT/2003/Delta")
     root = parser_tree.getroot()
     consists = root.findall('./Record/cConsist')
     if len(consists) == 0:
-        sg.popup('The file you requested (' + str(Path(xml_file)) + ') does not appear to contain any rail vehicle '
-                                                                    'consists. Is it definitely a scenario file?',
-                 'Please try again with another Scenario.bin or Scenario.xml '
-                 'file.', title='Error')
+        scenario_error(xml_file, 'does not appear to contain any rail vehicle consists.')
         return False
-    # Iterate through the consists - pop up a progress bar window
-    progress_layout = [
-        [sg.Text('Processing consists')],
-        [sg.ProgressBar(1, orientation='h', key='progress', size=(25, 15))]
-    ]
-    progress_win = sg.Window('Processing...', progress_layout, disable_close=True).Finalize()
-    progress_win.bring_to_front()
-    progress_win.force_focus()
-    progress_bar = progress_win.find_element('progress')
-    consist_nr = 0
-    for citem in consists:
-        service = citem.find('Driver/cDriver/ServiceName/Localisation-cUserLocalisedString/English')
-        if service is None:
-            service = 'Loose consist'
-            driven = False
-        else:
-            service = service.text
-            driven = True
-        # Find if this consist is driven by the player
-        playerdriver = citem.find('Driver/cDriver/PlayerDriver')
-        if playerdriver is None:
-            playerdriven = False
-        elif playerdriver.text == '1':
-            playerdriven = True
-        else:
-            playerdriven = False
-        # Iterate through RailVehicles list of the consist
-        for rvehicles in citem.findall('RailVehicles'):
-            # Iterate through each RailVehicle in the consist
-            consist_item_nr = 0
-            for coentity in rvehicles.findall('cOwnedEntity'):
-                consist_item_nr = consist_item_nr + 1
-                consist_items_total = len(rvehicles.findall('cOwnedEntity'))
-                provider = coentity.find(
-                    'BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintSetID/iBlueprintLibrary'
-                    '-cBlueprintSetID/Provider')
-                product = coentity.find(
-                    'BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintSetID/iBlueprintLibrary'
-                    '-cBlueprintSetID/Product')
-                blueprint = coentity.find('BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintID')
-                name = coentity.find('Name')
-                number = coentity.find('Component/*/UniqueNumber')
-                loaded = coentity.find('Component/cCargoComponent/IsPreLoaded')
-                flipped = coentity.find('Component/*/Flipped')
-                followers = coentity.find('Component/*/Followers')
-                # Set tailmarker - 0 if vehicle is first in consist, 2 if last, 1 if somewhere in between
-                # We need this if the vehicles with tail lights come in a separate blueprint (e.g. AP HAA).
-                # A vehicle will not get a tail light added if it is in a loose consist.
-                tailmarker = 1
-                if driven == True:
-                    if consist_item_nr == 1:
-                        tailmarker = 0
-                    elif consist_item_nr == consist_items_total:
-                        tailmarker = 2
-                input_vehicle_list.append(
-                    [str(consist_nr), provider.text, product.text, blueprint.text, name.text, number.text, loaded.text,
-                     service, playerdriven])
-                vehicle_replacer(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker)
-                output_vehicle_list.append(
-                    [str(consist_nr), provider.text, product.text, blueprint.text, name.text, number.text, loaded.text,
-                     service, playerdriven])
-            mu_last = 'none'
-            mso_num = ''
-            consist_nr += 1
-            progress_bar.UpdateBar(consist_nr, len(consists))
-        for driver_inrvs in citem.findall('Driver/cDriver/InitialRV'):
-            # Iterate through driver instructions and update changed vehicle numbers in the consist
-            for drv in driver_inrvs.findall('e'):
-                for rvp in rv_pairs:
-                    if drv.text == rvp[0]:
-                        drv.text = rvp[1]
-    for citem in root.findall('./Record/cConsist'):
-        # Now that the consist rail vehicles are all processed, update the corresponding numbers in any consist
-        # operation instructions i.e. for coupling or uncoupling
-        for cons_rvs in citem.findall(
-                'Driver/cDriver/DriverInstructionContainer/cDriverInstructionContainer/DriverInstruction/'
-                'cConsistOperations/DeltaTarget/cDriverInstructionTarget/RailVehicleNumber'):
-            # Iterate through driver consist instructions and update changed vehicle numbers in the consist
-            for crv in cons_rvs.findall('e'):
-                for rvp in rv_pairs:
-                    if crv.text == rvp[0]:
-                        crv.text = rvp[1]
+    # Iterate through the consists
+    (progress_win, progress_bar) = open_progress_window('Processing consists')
+    for i in range(0, len(consists)):
+        swap_consist(swapper, consists[i])
+        if progress_win is not None:
+            progress_bar.UpdateBar(i + 1, len(consists))
+    if len(swapper.rv_pairs) > 0:
+        # Now that the consist rail vehicles are all processed, update the changed vehicle numbers in any instructions
+        # which refer to vehicles
+        for citem in consists:
+            renumber_instructions(swapper, citem)
     # All necessary elements processed, now close progress bar window and return the new xml tree object
-    progress_win.close()
+    if progress_win is not None:
+        progress_win.close()
     return parser_tree
 
 
-def vehicle_replacer(provider, product, blueprint, name, number, loaded, flipped, followers, tailmarker):
-    # Check the rail vehicle found by the XML parser against each of the enabled substitutions.
-    # A soon as a replacement is made, return to the XML parser and search for the next vehicle.
-    if values['Replace_Mk1']:
-        mk1_replace(provider, product, blueprint, name, number)
-    if values['Replace_Mk2ac'] and mk2ac_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_Mk2df'] and mk2df_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_Mk3ab'] and mk3ab_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_FSA'] and fsafta_replace(provider, product, blueprint, name, number, loaded, flipped, followers,
-                                                tailmarker):
-        return True
-    if values['Replace_HAA'] and haa_replace(provider, product, blueprint, name, number, loaded, flipped, followers,
-                                             tailmarker):
-        return True
-    if values['Replace_HHA'] and hha_replace(provider, product, blueprint, name, number, loaded):
-        return True
-    if values['Replace_HTO'] and coal21_t_hto_replace(provider, product, blueprint, name, number, loaded):
-        return True
-    if values['Replace_HTV'] and coal21_t_htv_replace(provider, product, blueprint, name, number, loaded):
-        return True
-    if values['Replace_TTA'] and tta_replace(provider, product, blueprint, name, number, loaded):
-        return True
-    if values['Replace_VDA'] and vda_replace(provider, product, blueprint, name, number, loaded, flipped, followers,
-                                             tailmarker):
-        return True
-    if values['Replace_IHH'] and ihh_replace(provider, product, blueprint, name, number, loaded, flipped, followers,
-                                             tailmarker):
-        return True
-    if values['Replace_User'] and user_replace(provider, product, blueprint, name):
-        return True
-    if values['Replace_HST'] and hst_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C91'] and c91_replace(provider, product, blueprint, name):
-        return True
-    if values['Replace_C101'] and c101_replace(provider, product, blueprint, name):
-        return True
-    if values['Replace_C150'] and c150_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C156'] and c156_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C158'] and c158_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C170'] and c170_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C175'] and c175_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C221'] and c221_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C319'] and c319_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C325'] and c325_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C350'] and c350_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C365'] and c365_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C375'] and c375_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C450'] and c450_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C456'] and c456_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C465'] and c465_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C31'] and c31_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C37'] and c37_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C40'] and c40_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C47'] and c47_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C50'] and c50_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C56'] and c56_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C66'] and c66_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C67'] and c67_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C68'] and c68_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C86'] and c86_replace(provider, product, blueprint, name, number):
-        return True
-    if values['Replace_C87'] and c87_replace(provider, product, blueprint, name, number):
-        return True
+def rewrite_consists(swapper, xml_file, out_file, consist_handler, progress_bar):
+    # Copy a scenario .xml file to out_file, passing each consist to consist_handler(swapper, consist) on the way. The
+    # file is read a consist at a time, and each consist is written as soon as it is done with and then forgotten. The
+    # elements above the consists (the root and its Record) are written a tag at a time - their text, and each
+    # element's tail, is only known once the parser has gone past it. Return the number of consists found.
+    # ET.ParseError is raised if the file can't be parsed.
+    consists = 0
+    root = None
+    prefixes = root_prefixes()
+    open_elements = []
+    unwritten = []
+    last_written = None
+    xml_size = os.path.getsize(xml_file)
+    with open(xml_file, 'rb') as xml_in, open(out_file, 'w', encoding='utf-8') as xml_out:
+        write = xml_out.write
+        write("<?xml version='1.0' encoding='utf-8'?>\n")
+        for (event, elem) in iterparse_file(xml_in, ('start', 'end')):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                open_elements.append(elem)
+                if len(open_elements) > 3:
+                    continue
+                if last_written is not None and last_written.tail:
+                    write(escape_text(last_written.tail))
+                last_written = None
+                for parent in unwritten:
+                    write_ts_start_tag(write, parent, prefixes, parent is root)
+                    write('>' + escape_text(parent.text or ''))
+                unwritten = []
+                if len(open_elements) < 3:
+                    unwritten.append(elem)
+                continue
+            open_elements.pop()
+            if len(open_elements) > 2:
+                continue
+            if last_written is not None and last_written.tail:
+                write(escape_text(last_written.tail))
+            if len(open_elements) == 2 or elem in unwritten:
+                if elem.tag == 'cConsist' and len(open_elements) == 2 and open_elements[1].tag == 'Record':
+                    consist_handler(swapper, elem)
+                    consists = consists + 1
+                    if progress_bar is not None:
+                        progress_bar.UpdateBar(xml_in.tell(), xml_size)
+                for parent in unwritten[:-1]:
+                    write_ts_start_tag(write, parent, prefixes, parent is root)
+                    write('>' + escape_text(parent.text or ''))
+                unwritten = []
+                # The element is written whole, with its tail if the parser has already got that far. Clearing it
+                # forgets the tail too, so that a tail parsed later is written with the next tag instead.
+                write_ts_element(write, elem, prefixes, elem is root)
+                elem.clear()
+                if len(open_elements) > 0:
+                    # Forget the elements written before it. The element itself is left in place until the next one
+                    # is done with, as lxml may still be adding its tail.
+                    parent = open_elements[-1]
+                    for i in range(0, len(parent)):
+                        if parent[i] is elem:
+                            del parent[:i]
+                            break
+            else:
+                write('</' + ts_name(elem.tag, prefixes, []) + '>')
+            last_written = elem
+        if last_written is not None and last_written.tail:
+            write(escape_text(last_written.tail))
+    return consists
+
+
+def swap_streamed_consist(swapper, citem):
+    # Swap the vehicles in a consist of a scenario being streamed, noting which vehicle numbers its driver
+    # instructions refer to, as those may yet be changed when later consists are swapped
+    swap_consist(swapper, citem)
+    for crv in citem.findall(instruction_rv_path):
+        swapper.instruction_rvs.add(crv.text)
+
+
+def stream_xml(swapper, xml_file, out_file):
+    # Make the substitutions in a scenario .xml file a consist at a time as it is read, writing each consist to
+    # out_file as soon as it has been swapped, so that only one consist at a time is held in memory. Then, if any
+    # driver instructions refer to vehicles whose numbers were changed, go through the file a second time to update
+    # them. The result is the same as with parse_xml. Return True, or False if the scenario could not be processed.
+    ET.register_namespace("d", "http://www.kuju.com/TnT/2003/Delta")
+    swapped_file = Path(str(out_file) + '.swapped')
+    (progress_win, progress_bar) = open_progress_window('Processing consists')
+    try:
+        consists = rewrite_consists(swapper, xml_file, swapped_file, swap_streamed_consist, progress_bar)
+        if consists > 0:
+            for this_rv in swapper.instruction_rvs:
+                if this_rv in swapper.renumbering:
+                    if progress_win is not None:
+                        progress_bar.UpdateBar(0, 1)
+                    rewrite_consists(swapper, swapped_file, out_file, renumber_instructions, progress_bar)
+                    swapped_file.unlink()
+                    break
+            else:
+                os.replace(swapped_file, out_file)
+    except ET.ParseError:
+        consists = -1
+    if progress_win is not None:
+        progress_win.close()
+    if consists <= 0:
+        swapped_file.unlink(missing_ok=True)
+        if consists < 0:
+            scenario_error(xml_file, 'could not be processed due to an XML parse error.')
+        else:
+            scenario_error(xml_file, 'does not appear to contain any rail vehicle consists.')
+        return False
     return True
 
 
-def fix_short_tags(xml_string):
-    # This clumsy fix is necessary because sometimes TS requires short xml empty tags and sometimes long ones.
-    # The following substitutions should take care of the important exceptions to the long tag default.
-    xml_string = re.sub(r'(<cEngineSimContainer[^>]*)></cEngineSimContainer>', r'\1/>', xml_string,
-                        flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<RailVehicleNumber)></RailVehicleNumber>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<Other)></Other>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<DeltaTarget)></DeltaTarget>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<d:nil)></d:nil>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<DriverInstruction)></DriverInstruction>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<InitialLevel)></InitialLevel>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<StaticChildrenMatrix)></StaticChildrenMatrix>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<RailVehicles)></RailVehicles>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    return xml_string
+# The enabled substitutions are tried in this order of priority. Each entry gives the checkbox which enables it, the
+# function which makes it (given the swapper and the RailVehicle) and the categories of the vehicle database it swaps
+# from. A vehicle is offered only to those substitutions with a row in their categories which matches it - or which
+# match its blueprint, for the categories in blueprint_only_categories whose replacers check Provider and Product
+# themselves. The VDA replacer has no table, so it is offered everything.
+swap_handlers = [
+    ('Replace_Mk1', mk1_replace, ['Mk1']),
+    ('Replace_Mk2ac', mk2ac_replace, ['Mk2ac']),
+    ('Replace_Mk2df', mk2df_replace, ['Mk2df']),
+    ('Replace_Mk3ab', mk3ab_replace, ['Mk3ab']),
+    ('Replace_FSA', fsafta_replace, ['FSA', 'FTA']),
+    ('Replace_HAA', haa_replace, ['HAA']),
+    ('Replace_HHA', hha_replace, ['HHA']),
+    ('Replace_HTO', coal21_t_hto_replace, ['HTO']),
+    ('Replace_HTV', coal21_t_htv_replace, ['HTV']),
+    ('Replace_TTA', tta_replace, ['TTA']),
+    ('Replace_VDA', vda_replace, []),
+    ('Replace_IHH', ihh_replace, ['IHH_Bonus', 'IHH_Class17', 'IHH_Class20', 'IHH_Class25', 'IHH_Class27',
+                                  'IHH_Class40', 'IHH_Class45', 'IHH_Class56']),
+    ('Replace_User', user_replace, ['User']),
+    ('Replace_HST', hst_replace, ['HST_set']),
+    ('Replace_C91', c91_replace, ['Class91_set']),
+    ('Replace_C101', c101_replace, ['DMU101_set']),
+    ('Replace_C150', c150_replace, ['DMU150_set']),
+    ('Replace_C156', c156_replace, ['DMU156_set']),
+    ('Replace_C158', c158_replace, ['DMU158_set']),
+    ('Replace_C170', c170_replace, ['DMU170_set']),
+    ('Replace_C175', c175_replace, ['DMU175_set']),
+    ('Replace_C221', c221_replace, ['DMU220-1_set']),
+    ('Replace_C319', c319_replace, ['EMU319_set']),
+    ('Replace_C325', c325_replace, ['EMU325_set']),
+    ('Replace_C350', c350_replace, ['EMU350_set']),
+    ('Replace_C365', c365_replace, ['EMU365_set']),
+    ('Replace_C375', c375_replace, ['EMU375-7_set']),
+    ('Replace_C450', c450_replace, ['EMU450_set']),
+    ('Replace_C456', c456_replace, ['EMU456_set']),
+    ('Replace_C465', c465_replace, ['EMU465_set']),
+    ('Replace_C31', c31_replace, ['Class31']),
+    ('Replace_C37', c37_replace, ['Class37']),
+    ('Replace_C40', c40_replace, ['Class40']),
+    ('Replace_C47', c47_replace, ['Class47BRBlue']),
+    ('Replace_C50', c50_replace, ['Class50']),
+    ('Replace_C56', c56_replace, ['Class56']),
+    ('Replace_C66', c66_replace, ['Class66']),
+    ('Replace_C67', c67_replace, ['Class67']),
+    ('Replace_C68', c68_replace, ['Class68']),
+    ('Replace_C86', c86_replace, ['Class86']),
+    ('Replace_C87', c87_replace, ['Class87']),
+]
+blueprint_only_categories = ['IHH_Class17', 'IHH_Class20', 'IHH_Class25', 'IHH_Class27', 'IHH_Class40', 'IHH_Class45',
+                             'IHH_Class56', 'DMU150_set', 'DMU156_set', 'Class40', 'Class50', 'Class56']
+# The substitutions with no table of their own find their rail vehicles by these Provider and Product strings, which
+# prefilter_scenario looks for in place of the rows of a table
+untabled_prefilter_rules = {vda_replace: [('JL', 'WHL')]}
+
+
+def could_claim(swapper, categories, this_provider, this_product, this_blueprint):
+    # Can a substitution drawing on these categories of the vehicle database claim this rail vehicle?
+    if not categories:
+        return True
+    for category in categories:
+        if category in blueprint_only_categories:
+            for this_vehicle in vehicle_db[category]:
+                if this_vehicle[2].search(this_blueprint):
+                    return True
+        elif find_vehicle_rule(swapper, category, this_provider, this_product, this_blueprint):
+            return True
+    return False
+
+
+def get_swap_handlers(swapper, this_provider, this_product, this_blueprint):
+    # Return the positions in swap_handlers of the enabled substitutions which could claim this rail vehicle. This is
+    # worked out once for each distinct vehicle in the scenario.
+    key = (this_provider, this_product, this_blueprint)
+    if key not in swapper.swap_dispatch:
+        swapper.swap_dispatch[key] = [i for i in swapper.enabled_swap_handlers
+                                      if could_claim(swapper, swap_handlers[i][2], *key)]
+    return swapper.swap_dispatch[key]
+
+
+def vehicle_replacer(swapper, rv):
+    # Offer the rail vehicle found by the XML parser to each of the enabled substitutions which could claim it, in order
+    # of priority. A soon as a replacement is made, return to the XML parser and search for the next vehicle.
+    position = -1
+    while True:
+        # Find the next substitution to try. mk1_replace never claims a vehicle, it carries on with the swapped vehicle,
+        # and a few others may change the vehicle without claiming it, so look up the vehicle as it stands now.
+        for i in get_swap_handlers(swapper, rv.provider.text, rv.product.text, rv.blueprint.text):
+            if i > position:
+                break
+        else:
+            return True
+        position = i
+        (checkbox, handler, categories) = swap_handlers[i]
+        if handler(swapper, rv) and handler is not mk1_replace:
+            return True
 
 
 def route_parser(file):
     try:
-        route_tree = ET.parse(file)
+        route_tree = parse_file(file)
     except FileNotFoundError:
         return False
     except ET.ParseError:
@@ -2970,7 +3086,7 @@ def route_parser(file):
 
 def scenario_props_parser(file):
     try:
-        parser_tree = ET.parse(file)
+        parser_tree = parse_file(file)
     except FileNotFoundError:
         return False
     except ET.ParseError:
@@ -3000,7 +3116,9 @@ def parse_properties_xml(dir):
     return False
 
 
-def convert_vlist_to_html_table(html_file_path, scenarioProps):
+def convert_vlist_to_html_table(swapper, html_file_path, scenarioProps):
+    # Look for the vehicles' blueprints afresh, in case anything has been installed since the last report
+    new_asset_run()
     htmhead = '''<html lang="en">
 <head>
 <meta http-equiv=Content-Type content="text/html; charset=utf-8">
@@ -3052,52 +3170,14 @@ h3,thead {
                 "      <th>New Provider</th>\n      <th>New Product</th>\n      <th>New Blueprint</th>\n" \
                 "      <th>New Name</th>\n      <th>New Number</th>\n      <th>Loaded</th>\n    </tr>\n  </thead>\n" \
                 "  <tbody>\n"
-    unique_assets = []
-    last_cons = -1
-    row_no = 0
-    for row in output_vehicle_list:
-        if row[1:3] not in unique_assets:
-            unique_assets.append(row[1:3])
-        if int(row[0]) > last_cons:
-            # start of a new consist - count how many vehicles are in this consist
-            rowspan = (list(zip(*output_vehicle_list))[0]).count(row[0])
-        else:
-            rowspan = 0
-        col_htm = ''
-        row[3] = row[3].replace('.xml', '.bin')
-        if Path(railworks_path, 'Assets', row[1], row[2], row[3].replace('\\', '/')).is_file():
-            tdstyle = ''
-        else:
-            tdstyle = ' class="missing"'
-        cname = '<i>' + str(row[7]) + '</i>'
-        if row[8] is True:
-            # Consist is driven by the player - make the name bold and append (Player driven)
-            cname = '<b>' + cname + '</b> (Player driven)'
-        if rowspan > 0:
-            col_htm = col_htm + '      <td rowspan=' + str(rowspan) + '>' + cname + '</td>\n'
-        if config.get('defaults', 'save_report') == report_opts[2]:
-            # User wants a full report so add columns with details of original vehicles to right hand side of table
-            in_row = input_vehicle_list[row_no]
-            in_row[3] = in_row[3].replace('.xml', '.bin')
-            for col in in_row[1:7]:
-                col_htm = col_htm + '      <td class="input">' + col + '</td>\n'
-        for col in row[1:7]:
-            col_htm = col_htm + '      <td' + tdstyle + '>' + col + '</td>\n'
-        if (int(row[0]) % 2) == 0:
-            htmrv = htmrv + '    <tr>\n' + col_htm + '    </tr>\n'
-        else:
-            htmrv = htmrv + '    <tr class=\"shaded_row\">\n' + col_htm + '    </tr>\n'
-        last_cons = int(row[0])
-        row_no = row_no + 1
-    htmrv = htmrv + '  </tbody>\n</table>\n<h3>' + str(
-        len(output_vehicle_list)) + ' vehicles in total in this scenario.</h3>'
+    # Count the vehicles in each consist and find the assets used in one pass over the list, so that the report can
+    # then be written out a row at a time
+    consist_sizes = Counter(row[0] for row in swapper.output_vehicle_list)
+    unique_assets = sorted(set((row[1], row[2]) for row in swapper.output_vehicle_list))
+    full_report = config.get('defaults', 'save_report') == report_opts[2]
     htmas = '\n<h1>List of rail vehicle assets used</h1>\n<table border=\"1\" class=\"dataframe\">\n  <thead>\n' \
             '    <tr style=\"text-align: right;\">\n      <th>Provider</th>\n      <th>Product</th>\n    </tr>\n' \
             '  </thead>\n  <tbody>\n'
-    unique_assets.sort(key=lambda x: (x[0], x[1]))
-    for asset in unique_assets:
-        htmas = htmas + '    <tr>\n      <td>' + asset[0] + '</td>\n      <td>' + asset[1] + '</td>\n    </tr>\n'
-    htmas = htmas + '  </tbody>\n</table>\n'
     htp = ''
     if scenarioProps:
         htp = '\n<h1>Scenario properties</h1>\n<table border=\"1\" class=\"dataframe\" style=\"text-align: left;\">\n' \
@@ -3111,14 +3191,539 @@ h3,thead {
                                 '    <tr>\n      <th>Route</th>\n      <td>' + str(
             scenarioProps[4]) + '</td>\n    </tr>\n' \
                                 '  </table>\n'
-    htm = htmhead + htp + htmas + htmrv + '</body>\n</html>\n'
-    html_file_path.touch()
-    html_file_path.write_text(htm)
+    # Written under a name of its own first, so that a report which can't be finished doesn't replace the last one
+    part_file = Path(str(html_file_path) + '.part')
+    try:
+        with open(part_file, 'w') as html_out:
+            html_out.write(htmhead + htp + htmas)
+            for asset in unique_assets:
+                html_out.write('    <tr>\n      <td>' + asset[0] + '</td>\n      <td>' + asset[1] +
+                               '</td>\n    </tr>\n')
+            html_out.write('  </tbody>\n</table>\n')
+            html_out.write(htmrv)
+            last_cons = -1
+            for (row_no, row) in enumerate(swapper.output_vehicle_list):
+                if int(row[0]) > last_cons:
+                    # start of a new consist - its name spans the rows of all the vehicles in it
+                    rowspan = consist_sizes[row[0]]
+                else:
+                    rowspan = 0
+                row[3] = row[3].replace('.xml', '.bin')
+                if asset_exists(railworks_path, row[1], row[2], row[3]):
+                    tdstyle = ''
+                else:
+                    tdstyle = ' class="missing"'
+                cname = '<i>' + str(row[7]) + '</i>'
+                if row[8] is True:
+                    # Consist is driven by the player - make the name bold and append (Player driven)
+                    cname = '<b>' + cname + '</b> (Player driven)'
+                if (int(row[0]) % 2) == 0:
+                    row_htm = ['    <tr>\n']
+                else:
+                    row_htm = ['    <tr class=\"shaded_row\">\n']
+                if rowspan > 0:
+                    row_htm.append('      <td rowspan=' + str(rowspan) + '>' + cname + '</td>\n')
+                if full_report:
+                    # User wants a full report so add columns with details of original vehicles to right hand side
+                    in_row = swapper.input_vehicle_list[row_no]
+                    in_row[3] = in_row[3].replace('.xml', '.bin')
+                    for col in in_row[1:7]:
+                        row_htm.append('      <td class="input">' + col + '</td>\n')
+                for col in row[1:7]:
+                    row_htm.append('      <td' + tdstyle + '>' + col + '</td>\n')
+                row_htm.append('    </tr>\n')
+                html_out.write(''.join(row_htm))
+                last_cons = int(row[0])
+            html_out.write('  </tbody>\n</table>\n<h3>' + str(len(swapper.output_vehicle_list)) +
+                           ' vehicles in total in this scenario.</h3></body>\n</html>\n')
+        os.replace(part_file, html_file_path)
+    finally:
+        part_file.unlink(missing_ok=True)
     return True
 
 
+def vehicle_report_fields(full_report):
+    # Return the names of the columns of a CSV report, which are also the keys of each vehicle in a JSON Lines report
+    fields = ['consist', 'service', 'player_driven']
+    if full_report:
+        fields = fields + ['original_' + column for column in report_columns]
+    return fields + ['new_' + column for column in report_columns]
+
+
+def vehicle_report_records(swapper, full_report):
+    # Yield the details of each vehicle in the processed scenario, in the order of vehicle_report_fields, for the CSV
+    # and JSON Lines reports. Blueprints are given as .bin files, as in the HTML report.
+    for (row_no, row) in enumerate(swapper.output_vehicle_list):
+        record = [int(row[0]), row[7], row[8]]
+        if full_report:
+            vehicles = [swapper.input_vehicle_list[row_no], row]
+        else:
+            vehicles = [row]
+        for vehicle in vehicles:
+            record.extend(vehicle[1:3])
+            record.append(vehicle[3].replace('.xml', '.bin'))
+            record.extend(vehicle[4:7])
+        yield record
+
+
+def convert_vlist_to_csv(swapper, csv_file_path):
+    # Save a report of the vehicles in the scenario as a CSV file, with a row of column names and then a row for each
+    # vehicle, written out as it is made
+    full_report = config.get('defaults', 'save_report') == report_opts[2]
+    part_file = Path(str(csv_file_path) + '.part')
+    try:
+        with open(part_file, 'w', newline='', encoding='utf-8') as csv_out:
+            csv_writer = csv.writer(csv_out)
+            csv_writer.writerow(vehicle_report_fields(full_report))
+            csv_writer.writerows(vehicle_report_records(swapper, full_report))
+        os.replace(part_file, csv_file_path)
+    finally:
+        part_file.unlink(missing_ok=True)
+    return True
+
+
+def convert_vlist_to_jsonl(swapper, jsonl_file_path):
+    # Save a report of the vehicles in the scenario as a JSON Lines file, with an object on each line for each vehicle,
+    # keyed on the CSV report's column names
+    full_report = config.get('defaults', 'save_report') == report_opts[2]
+    fields = vehicle_report_fields(full_report)
+    part_file = Path(str(jsonl_file_path) + '.part')
+    try:
+        with open(part_file, 'w', encoding='utf-8') as jsonl_out:
+            for record in vehicle_report_records(swapper, full_report):
+                jsonl_out.write(json.dumps(dict(zip(fields, record)), ensure_ascii=False) + '\n')
+        os.replace(part_file, jsonl_file_path)
+    finally:
+        part_file.unlink(missing_ok=True)
+    return True
+
+
+def require_serz(cmd):
+    # Exit if serz.exe, needed for a .bin file which can't be read or written without it, is missing
+    if not cmd.is_file():
+        show_message('serz.exe could not be found in ' + str(railworks_path) + '. Is this definitely your '
+                                                                               'RailWorks folder?',
+                     'This application will now exit.')
+        sys.exit()
+
+
+def convert_by_serz(swapper, cmd, in_file, out_switch, out_file):
+    # Run serz.exe to convert in_file to out_file, as run_serz does, for up to serz_timeout seconds (default 300) - in a
+    # batch run, once one of the conversion slots is free - adding the time taken to the swapper's. Return True if
+    # out_file was written.
+    if serz_slots is not None:
+        serz_slots.acquire()
+    start = time.perf_counter()
+    try:
+        return run_serz(cmd, in_file, out_switch, out_file, wine_executable,
+                        config.getint('defaults', 'serz_timeout', fallback=300))
+    finally:
+        swapper.serz_seconds = swapper.serz_seconds + time.perf_counter() - start
+        if serz_slots is not None:
+            serz_slots.release()
+
+
+def make_prefilter(enabled_swap_handlers):
+    # Work out what prefilter_scenario looks for (see get_prefilter)
+    pairs = set()
+    blueprints = {}
+    for i in enabled_swap_handlers:
+        (checkbox, handler, categories) = swap_handlers[i]
+        if not categories:
+            if handler not in untabled_prefilter_rules:
+                return None
+            for (this_provider, this_product) in untabled_prefilter_rules[handler]:
+                pairs.add((this_provider.encode('utf-8'), this_product.encode('utf-8')))
+        for category in categories:
+            for this_vehicle in vehicle_db[category]:
+                if category in blueprint_only_categories:
+                    this_blueprint = re.sub(r'\\(.)', r'\1', this_vehicle[2].pattern, flags=re.DOTALL)
+                    if not this_blueprint.isascii():
+                        return None
+                    this_blueprint = this_blueprint.lower().encode('ascii')
+                    # Blueprints are grouped by their first few folders, so that a whole group is passed over when
+                    # the folders aren't there
+                    this_folder = b'\\'.join(this_blueprint.split(b'\\')[:3])
+                    blueprints.setdefault(this_folder, set()).add(this_blueprint)
+                else:
+                    pairs.add((this_vehicle[0].encode('utf-8'), this_vehicle[1].encode('utf-8')))
+    return sorted(pairs), [(this_folder, sorted(blueprints[this_folder])) for this_folder in sorted(blueprints)]
+
+
+def get_prefilter(swapper):
+    # Return what prefilter_scenario looks for to tell whether the enabled substitutions could claim any of the rail
+    # vehicles in a scenario: the (Provider, Product) pairs, one of which a vehicle must contain to be claimed, and the
+    # blueprints in lower case, one of which a vehicle claimed from a blueprint only category must contain, listed as
+    # (folders, blueprints in those folders). Return None if a substitution could claim vehicles without either, so
+    # every scenario has to be read properly.
+    key = tuple(swapper.enabled_swap_handlers)
+    if key not in prefilter_memo:
+        prefilter_memo[key] = make_prefilter(swapper.enabled_swap_handlers)
+    return prefilter_memo[key]
+
+
+def find_any_blueprint(scenario_bytes, blueprints):
+    # Is any of these lower case blueprints, listed by folder as get_prefilter lists them, in the bytes regardless of
+    # case? The bytes are looked at in chunks, in lower case, each chunk running on into the next far enough for none
+    # of the blueprints to be missed across the join.
+    if len(blueprints) == 0:
+        return False
+    chunk_size = 16 * 1024 * 1024
+    overlap = max(len(this_blueprint) for (this_folder, these_blueprints) in blueprints
+                  for this_blueprint in these_blueprints) - 1
+    for start in range(0, len(scenario_bytes), chunk_size):
+        chunk = scenario_bytes[start:start + chunk_size + overlap].lower()
+        for (this_folder, these_blueprints) in blueprints:
+            if chunk.find(this_folder) < 0:
+                continue
+            for this_blueprint in these_blueprints:
+                if chunk.find(this_blueprint) >= 0:
+                    return True
+    return False
+
+
+def prefilter_scenario(swapper, scenario_file):
+    # Could the enabled substitutions claim any of the rail vehicles in a scenario .bin or .xml file? This is a quick
+    # look through the file's bytes, without reading it properly. The Provider, Product and blueprint of each vehicle
+    # are in the file as plain text (serz.exe writes strings into a .bin file as UTF-8 too), so if none of the strings
+    # the substitutions look for is anywhere in it, there is nothing for them to swap. A file which doesn't even
+    # contain the name of the consists' tag is not what this expects, and is left to be read properly.
+    prefilter = get_prefilter(swapper)
+    if prefilter is None:
+        return True
+    (pairs, blueprints) = prefilter
+    try:
+        with open(scenario_file, 'rb') as scenario_in:
+            with mmap.mmap(scenario_in.fileno(), 0, access=mmap.ACCESS_READ) as scenario_bytes:
+                if scenario_bytes.find(b'cConsist') < 0:
+                    return True
+                found = {}
+                for (this_provider, this_product) in pairs:
+                    if this_provider not in found:
+                        found[this_provider] = scenario_bytes.find(this_provider) >= 0
+                    if not found[this_provider]:
+                        continue
+                    if this_product not in found:
+                        found[this_product] = scenario_bytes.find(this_product) >= 0
+                    if found[this_product]:
+                        return True
+                return find_any_blueprint(scenario_bytes, blueprints)
+    except (OSError, ValueError):
+        # e.g. the file is missing or empty - reading it properly will say what is wrong
+        return True
+
+
+# What process_scenario says about a scenario the prefilter finds nothing to swap in
+nothing_to_do_message = 'Nothing to do - none of the rail vehicles in this scenario is one the chosen substitutions ' \
+                        'swap.\nThe scenario has not been changed, and no backup or report has been made.\n'
+
+
+def process_scenario(scenario_file, these_values, swapper=None):
+    # Make the substitutions chosen in these_values in a scenario .bin or .xml file, backing up the original alongside
+    # it, and save a report of the vehicles in it if the settings ask for one. Return a message describing what was
+    # done with the path to the report (or None if there is no report), or False if the scenario could not be processed.
+    # The swaps are made by a new Swapper, or by the one given, from which the caller can see e.g. the time spent in
+    # serz.exe. Every file is named by its absolute path, leaving the working directory alone.
+    if swapper is None:
+        swapper = Swapper(these_values)
+    scenarioPath = Path(os.path.abspath(scenario_file))
+    outPathStem = scenarioPath.parent / Path(str(scenarioPath.stem) + '-' + time.strftime('%Y%m%d-%H%M%S'))
+    inFile = scenarioPath
+    cmd = railworks_path / Path('serz.exe')
+    report_file = None
+    if config.getboolean('defaults', 'prefilter', fallback=True) and not prefilter_scenario(swapper, scenarioPath):
+        return nothing_to_do_message, None
+    stream_size = config.getint('defaults', 'stream_xml_mb', fallback=64) * 1024 * 1024
+    python_serz = config.getboolean('defaults', 'python_serz', fallback=False)
+    bin_tree = None
+    use_serz_exe = False
+    if str(scenarioPath.suffix) == '.bin':
+        # This is a bin file. serz.exe converts it to .xml and back, unless the python_serz setting is on, in which
+        # case serz.py does wherever it can. If it has been converted to .xml before - by serz.exe, or by this tool or
+        # the report tool with serz.py if python_serz is on - the .xml is read from the cache. Otherwise serz.py reads
+        # it straight into a tree if it is small enough to be swapped in memory (its .xml would be several times the
+        # size), or else it is converted to a readable .xml intermediate file, which is cached.
+        cache_key = scenario_cache_key(scenarioPath)
+        (inFile, use_serz_exe) = get_cached_scenario(cache_key, serz_exe_only=not python_serz)
+        if inFile is None:
+            inFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '.xml')
+            use_serz_exe = not python_serz
+            if python_serz:
+                try:
+                    if scenarioPath.stat().st_size * 8 > stream_size:
+                        serz_to_xml(scenarioPath, inFile)
+                    else:
+                        bin_tree = read_serz(scenarioPath)
+                except SerzError:
+                    # Leave it to serz.exe, both ways
+                    use_serz_exe = True
+            if use_serz_exe:
+                require_serz(cmd)
+                if not convert_by_serz(swapper, cmd, scenarioPath, '/xml:', inFile):
+                    scenario_error(scenarioPath, 'could not be converted to .xml by serz.exe.')
+                    return False
+            if bin_tree is None:
+                put_cached_scenario(cache_key, inFile, use_serz_exe)
+        inFile = Path(inFile)
+    xmlFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '.xml')
+    if bin_tree is None and inFile.is_file() and inFile.stat().st_size > stream_size:
+        # A big scenario is swapped a consist at a time into a temporary file, rather than read into memory whole
+        streamedFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '-streamed.xml')
+        if not stream_xml(swapper, inFile, streamedFile):
+            return False
+        scenarioPath.rename(Path(str(outPathStem) + str(scenarioPath.suffix)))
+        os.replace(streamedFile, xmlFile)
+    else:
+        tree = parse_xml(swapper, inFile, bin_tree)
+        if tree is False:
+            return False
+        # Back up the original scenario file, and write the final xml out to another temporary file, in the form TS
+        # expects, so that serz.exe can convert it back to a .bin file in place of the original - unless it is to be
+        # written straight back to the .bin file.
+        scenarioPath.rename(Path(str(outPathStem) + str(scenarioPath.suffix)))
+        if bin_tree is None:
+            write_ts_xml(tree.getroot(), xmlFile)
+    swapped = 0
+    for (input_vehicle, output_vehicle) in zip(swapper.input_vehicle_list, swapper.output_vehicle_list):
+        if input_vehicle != output_vehicle:
+            swapped = swapped + 1
+    output_message = 'Scenario converted.\n' + str(swapped) + ' of ' + str(len(swapper.input_vehicle_list)) + \
+                     ' rail vehicles swapped.\n' + 'Swap rule lookups: ' + \
+                     str(swapper.vehicle_rule_memo_stats['hits']) + ' remembered, ' + \
+                     str(swapper.vehicle_rule_memo_stats['misses']) + ' searched.\n'
+    if str(scenarioPath.suffix) == '.bin':
+        # Generate the output scenario .bin file
+        binFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '.bin')
+        if not use_serz_exe:
+            try:
+                if bin_tree is not None:
+                    write_serz(bin_tree.getroot(), binFile)
+                else:
+                    xml_to_serz(xmlFile, binFile)
+            except SerzError:
+                use_serz_exe = True
+                if bin_tree is not None:
+                    write_ts_xml(bin_tree.getroot(), xmlFile)
+        if use_serz_exe:
+            # Run the serz.exe command again
+            require_serz(cmd)
+            if not convert_by_serz(swapper, cmd, xmlFile, '/bin:', binFile):
+                # Put the original back, and leave the swapped scenario as it is in the .xml file
+                os.replace(Path(str(outPathStem) + str(scenarioPath.suffix)), scenarioPath)
+                show_message('serz.exe could not convert the processed scenario ' + str(xmlFile) + ' to .bin.',
+                             'The original scenario has been left in place.', title='Error')
+                return False
+        xmlFile.unlink(missing_ok=True)
+    output_message = output_message + \
+                     '\nOriginal scenario backup located in ' + str(outPathStem) + str(scenarioPath.suffix)
+    if not config.get('defaults', 'save_report') == report_opts[0]:
+        # The user wants a report to be generated, in the format they have chosen
+        report_format = config.get('defaults', 'report_format', fallback=report_formats[0])
+        report_stem = str(scenarioPath.stem) + '-railvehicle_report'
+        if report_format == report_formats[1]:
+            report_file = scenarioPath.parent / Path(report_stem + '.csv')
+            convert_vlist_to_csv(swapper, report_file)
+        elif report_format == report_formats[2]:
+            report_file = scenarioPath.parent / Path(report_stem + '.jsonl')
+            convert_vlist_to_jsonl(swapper, report_file)
+        else:
+            scenario_properties = parse_properties_xml(scenarioPath.parent)
+            report_file = scenarioPath.parent / Path(report_stem + '.html')
+            convert_vlist_to_html_table(swapper, report_file, scenario_properties)
+    return output_message, report_file
+
+
+def find_scenarios(paths):
+    # Return the scenario files to process from a list of files and folders. A folder - a single scenario's, a route's
+    # or the whole Content/Routes folder - is searched for the Scenario.bin file of each scenario in it, or its
+    # Scenario.xml if it has no Scenario.bin.
+    scenario_files = []
+    for this_path in paths:
+        this_path = Path(os.path.abspath(this_path))
+        if not this_path.is_dir():
+            scenario_files.append(this_path)
+            continue
+        for (dir_path, dir_names, file_names) in os.walk(this_path):
+            dir_names.sort()
+            found = {}
+            for file_name in file_names:
+                if file_name.lower() in ['scenario.bin', 'scenario.xml']:
+                    found[file_name.lower()] = file_name
+            if 'scenario.bin' in found:
+                scenario_files.append(Path(dir_path, found['scenario.bin']))
+            elif 'scenario.xml' in found:
+                scenario_files.append(Path(dir_path, found['scenario.xml']))
+    return scenario_files
+
+
+def start_batch_worker(defaults, this_railworks_path, these_serz_slots):
+    # Set up a worker process of a batch run with the settings of the process which started it (a worker which has
+    # started afresh, rather than as a copy of that process, would only have those saved in config.ini). Each worker
+    # makes its own random choices of vehicle variants, rather than all repeating those of the first.
+    global railworks_path, serz_slots
+    for (key, value) in defaults.items():
+        config.set('defaults', key, value)
+    railworks_path = Path(this_railworks_path)
+    serz_slots = these_serz_slots
+    set_scenario_cache(script_path / 'scenario_cache', config.getint('defaults', 'scenario_cache_mb', fallback=512))
+    random.seed()
+
+
+def process_scenario_job(scenario_file, these_values):
+    # Process a scenario file of a batch run, returning its path, what became of it, the time taken in seconds and how
+    # much of it was spent waiting for serz.exe, and the message describing what was done and path to the report if it
+    # was processed
+    start = time.perf_counter()
+    if not scenario_file.is_file():
+        return str(scenario_file), 'not found', 0.0, 0.0, '', None
+    swapper = Swapper(these_values)
+    output_message = ''
+    report_file = None
+    try:
+        result = process_scenario(scenario_file, these_values, swapper)
+    except SystemExit as stopped:
+        # A file the swaps depend on is missing, and the message saying which has been printed
+        (status, output_message) = ('stopped', str(stopped.code or ''))
+    else:
+        if result is False:
+            status = 'not processed'
+        elif result[0] is nothing_to_do_message:
+            status = 'nothing to do'
+        else:
+            status = 'processed'
+            (output_message, report_file) = result
+            if report_file is not None:
+                report_file = str(report_file)
+    return str(scenario_file), status, time.perf_counter() - start, swapper.serz_seconds, output_message, \
+        report_file
+
+
+def run_from_command_line(args):
+    # Process the scenario files given on the command line without the window. The substitutions and other settings
+    # are those saved in config.ini, overridden by any given in the [defaults] section of an options file, which takes
+    # the same form as config.ini. Nothing is written back to config.ini. When there are several scenarios, they are
+    # shared out between worker processes - one for each processor core unless told otherwise - each of which runs
+    # serz.exe for its own scenarios, when it is needed, with no more than --serz-jobs conversions running at once.
+    global railworks_path
+    cli = argparse.ArgumentParser(description='Swap rolling stock in Train Simulator scenarios without the window.')
+    cli.add_argument('scenarios', nargs='*', metavar='scenario',
+                     help='Scenario.bin or Scenario.xml file to process, or a folder (e.g. a route\'s) to process '
+                          'all the scenarios in')
+    cli.add_argument('-a', '--all', action='store_true',
+                     help='process all the scenarios of all the routes in the RailWorks folder')
+    cli.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, metavar='n',
+                     help='number of scenarios to process at once (default: the number of processor cores)')
+    cli.add_argument('-o', '--options', metavar='file',
+                     help='options file with a [defaults] section, as in config.ini, choosing the substitutions to '
+                          'make and the other settings')
+    cli.add_argument('-r', '--report', choices=['none', 'processed', 'both'],
+                     help='save no report, a report of the processed scenario, or of the original and processed '
+                          'scenarios (default: the save_report setting)')
+    cli.add_argument('--report-format', choices=['html', 'csv', 'jsonl'],
+                     help='save the report as a web page, a CSV file or a JSON Lines file (default: the report_format '
+                          'setting, or html)')
+    cli.add_argument('--railworks', metavar='folder', help='path to the RailWorks folder (default: as in config.ini)')
+    cli.add_argument('--stream', action='store_true',
+                     help='swap every scenario a consist at a time, as is done for those over stream_xml_mb megabytes '
+                          '(default 64), to keep memory use down')
+    cli.add_argument('--serz-jobs', type=int, metavar='n',
+                     help='number of serz.exe conversions, when they are needed, to run at once (default: as -j)')
+    cli.add_argument('--serz-timeout', type=int, metavar='seconds',
+                     help='give up on a serz.exe conversion which takes longer than this (default: the serz_timeout '
+                          'setting, or 300)')
+    cli.add_argument('--python-serz', action='store_true',
+                     help='read and write Scenario.bin files with serz.py rather than serz.exe wherever it can '
+                          '(default: the python_serz setting, or off)')
+    cli.add_argument('--no-prefilter', action='store_true',
+                     help='read every scenario in full, even those whose rail vehicles a quick look finds nothing to '
+                          'swap in')
+    options = cli.parse_args(args)
+    if options.options is not None:
+        options_config = configparser.ConfigParser()
+        if not options_config.read(options.options):
+            cli.error('options file ' + options.options + ' could not be read')
+        if options_config.has_section('defaults'):
+            for (key, value) in options_config.items('defaults'):
+                config.set('defaults', key, value)
+    if options.report is not None:
+        config.set('defaults', 'save_report', report_opts[['none', 'processed', 'both'].index(options.report)])
+    if options.report_format is not None:
+        config.set('defaults', 'report_format', report_formats[['html', 'csv', 'jsonl'].index(options.report_format)])
+    if options.stream:
+        config.set('defaults', 'stream_xml_mb', '0')
+    if options.no_prefilter:
+        config.set('defaults', 'prefilter', 'False')
+    if options.python_serz:
+        config.set('defaults', 'python_serz', 'True')
+    if options.serz_timeout is not None:
+        config.set('defaults', 'serz_timeout', str(options.serz_timeout))
+    set_scenario_cache(script_path / 'scenario_cache', config.getint('defaults', 'scenario_cache_mb', fallback=512))
+    if options.railworks is not None:
+        railworks_path = options.railworks
+    railworks_path = Path(railworks_path)
+    if options.all:
+        options.scenarios.append(railworks_path / 'Content' / 'Routes')
+    if len(options.scenarios) == 0:
+        cli.error('give the scenarios or folders to process, or --all')
+    swap_values = {}
+    for swap_handler in swap_handlers:
+        swap_values[swap_handler[0]] = config.getboolean('defaults', swap_handler[0].lower(), fallback=False)
+    # Find all the scenarios first, before any is processed and backed up alongside itself
+    scenario_files = find_scenarios(options.scenarios)
+    results = {}
+    start = time.perf_counter()
+    if options.jobs < 2 or len(scenario_files) < 2:
+        for scenario_file in scenario_files:
+            results[scenario_file] = process_scenario_job(scenario_file, swap_values)
+            print(results[scenario_file][0] + ': ' + results[scenario_file][1], flush=True)
+    else:
+        these_serz_slots = multiprocessing.BoundedSemaphore(options.serz_jobs or options.jobs)
+        with ProcessPoolExecutor(max_workers=options.jobs, initializer=start_batch_worker,
+                                 initargs=(dict(config.items('defaults')), str(railworks_path),
+                                           these_serz_slots)) as pool:
+            jobs = {}
+            for scenario_file in scenario_files:
+                jobs[pool.submit(process_scenario_job, scenario_file, swap_values)] = scenario_file
+            for job in as_completed(jobs):
+                results[jobs[job]] = job.result()
+                print(results[jobs[job]][0] + ': ' + results[jobs[job]][1], flush=True)
+    elapsed = time.perf_counter() - start
+    # Summarise what became of each scenario, in the order they were found
+    failed = 0
+    unchanged = 0
+    total_time = 0.0
+    total_serz_time = 0.0
+    print('')
+    for scenario_file in scenario_files:
+        (scenario_name, status, scenario_time, serz_time, output_message, report_file) = results[scenario_file]
+        total_time = total_time + scenario_time
+        total_serz_time = total_serz_time + serz_time
+        if serz_time > 0:
+            print(scenario_name + ': ' + status + ' (' + '%.2f' % scenario_time + 's, of which serz.exe ' +
+                  '%.2f' % serz_time + 's)')
+        else:
+            print(scenario_name + ': ' + status + ' (' + '%.2f' % scenario_time + 's)')
+        if status == 'nothing to do':
+            unchanged = unchanged + 1
+        elif status != 'processed':
+            failed = failed + 1
+        if len(output_message) > 0:
+            print('  ' + output_message.strip().replace('\n\n', '\n').replace('\n', '\n  '))
+        if report_file is not None:
+            print('  Report listing all rail vehicles located in ' + report_file)
+    print(str(len(scenario_files) - failed - unchanged) + ' of ' + str(len(scenario_files)) + ' scenarios processed, ' +
+          str(unchanged) + ' with nothing to do, in ' + '%.2f' % elapsed + 's')
+    if total_serz_time > 0:
+        print('Time spent on the scenarios: ' + '%.2f' % (total_time - total_serz_time) + 's in Python, ' +
+              '%.2f' % total_serz_time + 's in serz.exe')
+    return 1 if failed else 0
+
+
 if __name__ == "__main__":
-    window = sg.Window('RSSwapTool - Rolling stock swap tool', layout)
+    if sg is None:
+        # Scenarios have been given on the command line, so process them without the window
+        sys.exit(run_from_command_line(sys.argv[1:]))
+    window = sg.Window('RSSwapTool - Rolling stock swap tool', main_window_layout())
     try:
         os.chdir(Path(railworks_path, 'Content', 'Routes'))
     except:
@@ -3206,6 +3811,7 @@ if __name__ == "__main__":
             htx_era = config.get('defaults', 'htx_era', fallback=htx_eras[1])
             tail_style = config.get('defaults', 'tail_style', fallback=tail_opts[0])
             save_report = config.get('defaults', 'save_report', fallback=report_opts[0])
+            report_format = config.get('defaults', 'report_format', fallback=report_formats[0])
             # The settings button has been pressed, so allow the user to change the RailWorks folder setting
             loclayout = [
                 [sg.Text('Settings', font='Helvetica 14')],
@@ -3266,6 +3872,11 @@ if __name__ == "__main__":
                                   ' in the scenario, in .html format, alongside the scenario output file. Optionally,'
                                   ' the report can include details of both the original vehicle and the vehicle after'
                                   ' processing by this application.')],
+                [sg.Text("Save the report as a"),
+                 sg.Combo(report_formats, auto_size_text=True, default_value=report_format, key='report_format',
+                          readonly=True,
+                          tooltip='A web page to view in your browser, or a CSV spreadsheet or JSON Lines file listing'
+                                  ' the same details, to open in a spreadsheet or with other programs.')],
                 [sg.Button('Save changes'), sg.Button('Cancel')]
             ]
             locwindow = sg.Window('RSSwapTool - Settings', loclayout)
@@ -3293,6 +3904,7 @@ if __name__ == "__main__":
                     config.set('defaults', 'htx_era', str(lvalues['htx_era']))
                     config.set('defaults', 'tail_style', str(lvalues['tail_style']))
                     config.set('defaults', 'save_report', str(lvalues['save_report']))
+                    config.set('defaults', 'report_format', str(lvalues['report_format']))
                     with open(path_to_config, 'w') as configfile:
                         config.write(configfile)
                         configfile.close()
@@ -3350,105 +3962,18 @@ if __name__ == "__main__":
             if len(values['Scenario_xml']) < 1:
                 sg.popup('No scenario selected!')
             else:
-                scenarioPath = Path(values['Scenario_xml'])
-                scenarioProperties = scenarioPath.parent / 'ScenarioProperties.xml'
-                os.chdir(scenarioPath.parent)
-                outPathStem = scenarioPath.parent / Path(str(scenarioPath.stem) + '-' + time.strftime('%Y%m%d-%H%M%S'))
-                inFile = scenarioPath
-                cmd = railworks_path / Path('serz.exe')
-                serz_output = ''
-                output_message = ''
-                vehicle_list = []
-                if str(scenarioPath.suffix) == '.bin':
-                    # This is a bin file so we need to run serz.exe command to convert it to a readable .xml
-                    # intermediate file
-                    if not cmd.is_file():
-                        sg.popup('serz.exe could not be found in ' + str(railworks_path) + '. Is this definitely your '
-                                                                                           'RailWorks folder?',
-                                 'This application will now exit.')
-                        sys.exit()
-                    inFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '.xml')
-                    inFileW = str(PureWindowsPath(inFile))
-                    scenarioPathW = str(PureWindowsPath(scenarioPath))
-                    if platform.system() == 'Windows':
-                        # Operating system is Microsoft Windows
-                        p1 = subprocess.Popen([str(cmd), scenarioPathW, '/xml:' + inFileW], stdout=subprocess.PIPE)
-                    elif platform.system() == 'Linux' and platform.release()[-5:-1] == 'WSL2':
-                        # Operating system is Windows Subsystem Linux (WSL2)
-                        # Linux-style pathnames can be converted to windows style with drive letters
-                        inFileW = inFileW[5] + ':' + inFileW[6:]
-                        scenarioPathW = scenarioPathW[5] + ':' + scenarioPathW[6:]
-                        p1 = subprocess.Popen([str(cmd), scenarioPathW, '/xml:' + inFileW], stdout=subprocess.PIPE)
-                    else:
-                        # Operating system has wine to run serz.eze
-                        try:
-                            wine_executable
-                        except NameError:
-                            wine_executable = '/usr/bin/wine'
-                        p1 = subprocess.Popen([wine_executable, str(cmd), scenarioPathW, '/xml:' +
-                                               inFileW], stdout=subprocess.PIPE)
-                    p1.wait()
-                    # Uncomment the line below to see the output of the serz.exe command
-                    # serz_output = 'serz.exe ' + p1.communicate()[0].decode('ascii')
-                    # Now the intermediate .xml has been created by serz.exe, read it in to this script and do the
-                    # processing
-                tree = parse_xml(inFile)
-                if tree is False:
+                result = process_scenario(values['Scenario_xml'], values)
+                if result is False:
                     continue
-                # Back up the original scenario file, fix some peculiarities of the train simulator .xml,
-                # write the final xml out to another temporary file so that serz.exe can convert it back to
-                # a .bin file in place of the original.
-                scenarioPath.rename(Path(str(outPathStem) + str(scenarioPath.suffix)))
-                xmlString = ET.tostring(tree.getroot(), encoding='utf-8', xml_declaration=True,
-                                        short_empty_elements=False, method='xml')
-                xmlString = fix_short_tags(xmlString.decode())
-                xmlFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '.xml')
-                xmlFile.touch()
-                xmlFile.write_text(xmlString, encoding='utf-8')
-                output_message = 'Scenario converted.\n'
-                html_report_status_text = ''
-                if str(scenarioPath.suffix) == '.bin':
-                    # Run the serz.exe command again to generate the output scenario .bin file
-                    binFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '.bin')
-                    binFileW = str(PureWindowsPath(binFile))
-                    xmlFileW = str(PureWindowsPath(xmlFile))
-                    if platform.system() == 'Windows':
-                        # Operating system is Microsoft Windows
-                        p2 = subprocess.Popen([str(cmd), xmlFileW, '/bin:' + binFileW], stdout=subprocess.PIPE)
-                    elif platform.system() == 'Linux' and platform.release()[-5:-1] == 'WSL2':
-                        # Operating system is Windows Subsystem Linux (WSL2)
-                        # Linux-style pathnames can be converted to windows style with drive letters
-                        binFileW = binFileW[5] + ':' + binFileW[6:]
-                        xmlFileW = xmlFileW[5] + ':' + xmlFileW[6:]
-                        p2 = subprocess.Popen([str(cmd), xmlFileW, '/bin:' + binFileW], stdout=subprocess.PIPE)
-                    else:
-                        # Operating system has wine to run serz.eze
-                        try:
-                            wine_executable
-                        except NameError:
-                            wine_executable = '/usr/bin/wine'
-                        p2 = subprocess.Popen([wine_executable, str(cmd), xmlFileW, '/bin:' +
-                                               binFileW], stdout=subprocess.PIPE)
-                    p2.wait()
-                    inFile.unlink()
-                    # Uncomment the following line to see the output of the serz.exe command
-                    # output_message = serz_output + '\nserz.exe ' + p2.communicate()[0].decode('ascii')
-                output_message = output_message + \
-                                 '\nOriginal scenario backup located in ' + str(outPathStem) + str(scenarioPath.suffix)
-                if not config.get('defaults', 'save_report') == report_opts[0]:
+                (output_message, report_file) = result
+                if report_file is not None and report_file.suffix == '.html':
                     # The user wants a report to be generated
-                    scenario_properties = parse_properties_xml(scenarioPath.parent)
-                    html_report_file = scenarioPath.parent / Path(str(scenarioPath.stem) + '-railvehicle_report.html')
-                    convert_vlist_to_html_table(html_report_file, scenario_properties)
-                    html_report_status_text = 'Report listing all rail vehicles located in ' + str(html_report_file)
+                    html_report_status_text = 'Report listing all rail vehicles located in ' + str(report_file)
                     browser = sg.popup_yes_no(output_message, html_report_status_text,
                                               'Do you want to open the report in your web browser now?')
                     if browser == 'Yes':
-                        webbrowser.open(html_report_file.as_uri())
+                        webbrowser.open(report_file.as_uri())
+                elif report_file is not None:
+                    sg.popup(output_message, 'Report listing all rail vehicles located in ' + str(report_file))
                 else:
                     sg.popup(output_message)
-                # re-initialise all vehicle lists
-                rv_list = []
-                rv_pairs = []
-                output_vehicle_list = []
-                input_vehicle_list = []
@@ -0,0 +1,331 @@
+#!/usr/bin/python3
+#
+#     RSSwapTool - A script to swap in up to date or enhanced rolling stock
+#     for older versions of stock in Train Simulator scenarios.
+#     Copyright (C) 2025 James McKenzie jrmknz@yahoo.co.uk
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# RSCensusTool - the census mode of RSReportTool. Rather than examining one scenario, it looks through every scenario
+# of every route in the RailWorks folder, several at once, and counts the rail vehicles of each asset (provider,
+# product and blueprint) used in them. The counts are kept in an SQLite file, along with which scenarios each asset is
+# used in and whether it is installed, so that questions such as "which scenarios use RSC Class56Pack01?" or "which
+# assets are missing?" are answered from the file straight away, here or with any other SQLite tool. Running the
+# census again only examines the scenarios which have been added or changed since the last time.
+import sys
+import os
+import time
+import sqlite3
+import tempfile
+import configparser
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from ts_xml import ET, parse_file
+from serz import SerzError, read_serz, run_serz
+from asset_index import set_asset_index, new_asset_run, asset_exists
+from scenario_cache import set_scenario_cache, scenario_cache_key, get_cached_scenario, put_cached_scenario
+
+# If you want to run this script on Linux you must configure the path to the wine executable. You need wine in order to
+# run the serz.exe utility which converts between .bin and .xml scenario files.
+# If you're not running this script on Linux this line can be ignored.
+wine_executable = '/usr/bin/wine'
+
+railworks_path = ''
+# The tables of the census file. A scenario's row is kept as long as its file is unchanged. Names are compared without
+# regard to case, as Train Simulator does.
+census_version = 1
+census_tables = [
+    'CREATE TABLE scenario (id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime INTEGER, route TEXT, '
+    'name TEXT, status TEXT)',
+    'CREATE TABLE asset (id INTEGER PRIMARY KEY, provider TEXT COLLATE NOCASE, product TEXT COLLATE NOCASE, '
+    'blueprint TEXT COLLATE NOCASE, installed INTEGER, uses INTEGER, scenarios INTEGER, '
+    'UNIQUE (provider, product, blueprint))',
+    'CREATE TABLE asset_use (asset INTEGER REFERENCES asset, scenario INTEGER REFERENCES scenario, vehicles INTEGER, '
+    'PRIMARY KEY (asset, scenario)) WITHOUT ROWID',
+    'CREATE INDEX asset_product ON asset (product)',
+    'CREATE INDEX asset_use_scenario ON asset_use (scenario)',
+    'CREATE VIEW asset_scenarios AS SELECT asset.provider, asset.product, asset.blueprint, asset.installed, '
+    'scenario.route, scenario.name, scenario.path, asset_use.vehicles FROM asset_use '
+    'JOIN asset ON asset.id = asset_use.asset JOIN scenario ON scenario.id = asset_use.scenario',
+]
+blueprint_set_path = 'BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintSetID/' \
+                     'iBlueprintLibrary-cBlueprintSetID/'
+
+# Read configuration and find location of RailWorks folder
+config = configparser.ConfigParser()
+script_path = Path(os.path.abspath(os.path.dirname(sys.argv[0])))
+path_to_config = script_path / 'config.ini'
+config.read(path_to_config)
+# Share the cache of scenarios converted from .bin to .xml, and the lists of installed assets, with the other tools
+set_scenario_cache(script_path / 'scenario_cache', config.getint('defaults', 'scenario_cache_mb', fallback=512))
+set_asset_index(script_path / 'asset_index.sqlite')
+if config.has_option('RailWorks', 'path'):
+    railworks_path = config.get('RailWorks', 'path')
+
+
+def find_scenarios(routes_path):
+    # Return the scenario files of all the routes, as main.py's find_scenarios does - the Scenario.bin file of each
+    # scenario, or its Scenario.xml if it has no Scenario.bin
+    scenario_files = []
+    for (dir_path, dir_names, file_names) in os.walk(routes_path):
+        dir_names.sort()
+        found = {}
+        for file_name in file_names:
+            if file_name.lower() in ['scenario.bin', 'scenario.xml']:
+                found[file_name.lower()] = file_name
+        if 'scenario.bin' in found:
+            scenario_files.append(Path(dir_path, found['scenario.bin']))
+        elif 'scenario.xml' in found:
+            scenario_files.append(Path(dir_path, found['scenario.xml']))
+    return scenario_files
+
+
+def display_name(xml_file):
+    # Return the English display name given in a ScenarioProperties.xml or RouteProperties.xml file, or None
+    try:
+        name = parse_file(xml_file).getroot().find('./DisplayName/Localisation-cUserLocalisedString/English')
+    except (OSError, ET.ParseError):
+        return None
+    if name is None:
+        return None
+    return name.text
+
+
+def read_scenario(scenario_file):
+    # Return the tree of a scenario .bin or .xml file, or None if it can't be read. A .bin file is read from the cache
+    # of converted scenarios if it's there, otherwise it is read here, or failing that converted by serz.exe - only
+    # those are added to the cache, as reading the others again is quicker than reading the cache and a census would
+    # otherwise push out the scenarios the other tools have cached.
+    try:
+        if scenario_file.suffix.lower() != '.bin':
+            return parse_file(scenario_file)
+        cache_key = scenario_cache_key(scenario_file)
+        (cached_file, by_serz_exe) = get_cached_scenario(cache_key)
+        if cached_file is not None:
+            return parse_file(cached_file)
+        try:
+            return read_serz(scenario_file)
+        except SerzError:
+            pass
+        with tempfile.TemporaryDirectory() as temp_dir:
+            xml_file = Path(temp_dir, 'Scenario.xml')
+            cmd = Path(railworks_path, 'serz.exe')
+            if not cmd.is_file() or not run_serz(cmd, scenario_file, '/xml:', xml_file, wine_executable,
+                                                 config.getint('defaults', 'serz_timeout', fallback=300)):
+                return None
+            put_cached_scenario(cache_key, xml_file, True)
+            return parse_file(xml_file)
+    except (OSError, ET.ParseError):
+        return None
+
+
+def start_census_worker(this_railworks_path):
+    # Set up a worker process with the RailWorks folder of the process which started it
+    global railworks_path
+    railworks_path = this_railworks_path
+
+
+def census_scenario(scenario_file):
+    # Count the rail vehicles of each asset in a scenario, in a worker process. Return the scenario's file, its route's
+    # and its own display names, what became of it, and a dict of (provider, product, blueprint) to the number of
+    # vehicles. Blueprints are given as .bin files, as in the reports.
+    route = display_name(scenario_file.parent.parent.parent / 'RouteProperties.xml')
+    name = display_name(scenario_file.parent / 'ScenarioProperties.xml')
+    tree = read_scenario(scenario_file)
+    if tree is None:
+        return scenario_file, route, name, 'could not be read', {}
+    assets = {}
+    for coentity in tree.getroot().iterfind('./Record/cConsist/RailVehicles/cOwnedEntity'):
+        provider = coentity.find(blueprint_set_path + 'Provider')
+        product = coentity.find(blueprint_set_path + 'Product')
+        blueprint = coentity.find('BlueprintID/iBlueprintLibrary-cAbsoluteBlueprintID/BlueprintID')
+        asset = tuple('' if field is None or field.text is None else field.text for field in
+                      (provider, product, blueprint))
+        asset = (asset[0], asset[1], asset[2].replace('.xml', '.bin'))
+        assets[asset] = assets.get(asset, 0) + 1
+    return scenario_file, route, name, 'examined', assets
+
+
+def open_census(census_file):
+    # Open the census file, starting it afresh if it was written by a different version of this tool
+    census = sqlite3.connect(str(census_file), timeout=10)
+    if census.execute('PRAGMA user_version').fetchone()[0] != census_version:
+        for (kind, name) in census.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'view') AND "
+                                           "name NOT LIKE 'sqlite_%'").fetchall():
+            census.execute('DROP ' + kind.upper() + ' IF EXISTS ' + name)
+        for table in census_tables:
+            census.execute(table)
+        census.execute('PRAGMA user_version = ' + str(census_version))
+        census.commit()
+    census.execute('PRAGMA foreign_keys = ON')
+    return census
+
+
+def save_scenario(census, scenario_file, stat, route, name, status, assets):
+    # Replace what the census holds for a scenario with what has just been found in it
+    row = census.execute('SELECT id FROM scenario WHERE path = ?', (str(scenario_file),)).fetchone()
+    if row is not None:
+        census.execute('DELETE FROM asset_use WHERE scenario = ?', row)
+        census.execute('DELETE FROM scenario WHERE id = ?', row)
+    scenario_id = census.execute('INSERT INTO scenario (path, size, mtime, route, name, status) VALUES '
+                                 '(?, ?, ?, ?, ?, ?)', (str(scenario_file), stat.st_size, stat.st_mtime_ns, route,
+                                                        name, status)).lastrowid
+    for ((provider, product, blueprint), vehicles) in assets.items():
+        census.execute('INSERT OR IGNORE INTO asset (provider, product, blueprint) VALUES (?, ?, ?)',
+                       (provider, product, blueprint))
+        asset_id = census.execute('SELECT id FROM asset WHERE provider = ? AND product = ? AND blueprint = ?',
+                                  (provider, product, blueprint)).fetchone()[0]
+        # The same asset may be written with different capitals in different consists of one scenario
+        census.execute('INSERT INTO asset_use VALUES (?, ?, ?) ON CONFLICT (asset, scenario) DO UPDATE SET '
+                       'vehicles = vehicles + excluded.vehicles', (asset_id, scenario_id, vehicles))
+
+
+def count_assets(census):
+    # Bring the totals of each asset up to date, forget those no longer used, and check which are installed
+    census.execute('UPDATE asset SET uses = (SELECT COALESCE(SUM(vehicles), 0) FROM asset_use WHERE asset = asset.id), '
+                   'scenarios = (SELECT COUNT(*) FROM asset_use WHERE asset = asset.id)')
+    census.execute('DELETE FROM asset WHERE scenarios = 0')
+    new_asset_run()
+    installed = [(1 if asset_exists(railworks_path, provider, product, blueprint) else 0, asset_id) for
+                 (asset_id, provider, product, blueprint) in
+                 census.execute('SELECT id, provider, product, blueprint FROM asset').fetchall()]
+    census.executemany('UPDATE asset SET installed = ? WHERE id = ?', installed)
+
+
+def take_census(census, jobs, rescan):
+    # Examine each scenario of each route which has been added or changed since the last census, or couldn't be read
+    # then (or all of them, if rescan is set), several at once, and save what is found. Return the numbers of scenarios
+    # found, examined and which couldn't be read.
+    scenario_files = find_scenarios(Path(railworks_path, 'Content', 'Routes'))
+    known = {path: (size, mtime) for (path, size, mtime) in
+             census.execute("SELECT path, size, mtime FROM scenario WHERE status = 'examined'").fetchall()}
+    stats = {}
+    to_examine = []
+    for scenario_file in scenario_files:
+        try:
+            stats[scenario_file] = os.stat(scenario_file)
+        except OSError:
+            continue
+        if rescan or known.get(str(scenario_file)) != (stats[scenario_file].st_size,
+                                                        stats[scenario_file].st_mtime_ns):
+            to_examine.append(scenario_file)
+    # Forget the scenarios which have been removed
+    for (path,) in census.execute('SELECT path FROM scenario').fetchall():
+        if Path(path) in stats:
+            continue
+        census.execute('DELETE FROM asset_use WHERE scenario IN (SELECT id FROM scenario WHERE path = ?)', (path,))
+        census.execute('DELETE FROM scenario WHERE path = ?', (path,))
+    unreadable = 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=start_census_worker,
+                             initargs=(str(railworks_path),)) as executor:
+        census_jobs = [executor.submit(census_scenario, scenario_file) for scenario_file in to_examine]
+        for (done, job) in enumerate(as_completed(census_jobs)):
+            (scenario_file, route, name, status, assets) = job.result()
+            save_scenario(census, scenario_file, stats[scenario_file], route, name, status, assets)
+            if status != 'examined':
+                unreadable = unreadable + 1
+                print(str(scenario_file) + ': ' + status, flush=True)
+            # Keep what has been found so far, should the census be stopped part way
+            if done % 100 == 99:
+                census.commit()
+    count_assets(census)
+    census.commit()
+    return len(stats), len(to_examine), unreadable
+
+
+def print_uses(census, asset_name):
+    # Print the scenarios which use the assets of a provider, a provider's product, or a blueprint in a product
+    fields = asset_name.replace('\\', '/').split('/', 2)
+    where = ' AND '.join(['provider = ?', 'product = ?', 'blueprint = ?'][0:len(fields)])
+    if len(fields) == 3:
+        # Blueprints are held as in the scenarios, separated by \
+        fields[2] = fields[2].replace('/', '\\')
+    assets = census.execute('SELECT id, provider, product, blueprint, installed, uses, scenarios FROM asset WHERE ' +
+                            where + ' ORDER BY provider, product, blueprint', fields).fetchall()
+    if len(assets) == 0:
+        print('No scenarios use ' + asset_name)
+        return
+    for (asset_id, provider, product, blueprint, installed, uses, scenarios) in assets:
+        print(provider + '/' + product + '/' + blueprint + ('' if installed else ' (missing)') + ': ' + str(uses) +
+              ' vehicles in ' + str(scenarios) + ' scenarios')
+    scenarios = census.execute('SELECT scenario.route, scenario.name, scenario.path, SUM(asset_use.vehicles) FROM '
+                               'asset_use JOIN scenario ON scenario.id = asset_use.scenario WHERE asset_use.asset IN '
+                               '(SELECT id FROM asset WHERE ' + where + ') GROUP BY scenario.id ORDER BY '
+                               'scenario.route, scenario.name', fields).fetchall()
+    print('')
+    print(str(len(scenarios)) + ' scenarios use ' + asset_name + ':')
+    for (route, name, path, vehicles) in scenarios:
+        print('  ' + (route or 'Unknown route') + ' - ' + (name or 'Unnamed scenario') + ' (' + str(vehicles) +
+              ' vehicles): ' + path)
+
+
+def print_missing(census):
+    # Print the assets used in scenarios which aren't installed, those used in the most scenarios first
+    missing = census.execute('SELECT provider, product, blueprint, uses, scenarios FROM asset WHERE installed = 0 '
+                             'ORDER BY scenarios DESC, provider, product, blueprint').fetchall()
+    for (provider, product, blueprint, uses, scenarios) in missing:
+        print(provider + '/' + product + '/' + blueprint + ': ' + str(uses) + ' vehicles in ' + str(scenarios) +
+              ' scenarios')
+    print(str(len(missing)) + ' assets used in scenarios are missing')
+
+
+def run_census_command_line(args):
+    # Take a census of the scenarios of all the routes, or answer a question from the last one. Return the exit status.
+    global railworks_path
+    cli = argparse.ArgumentParser(description='Count the rail vehicles of each asset used in all the scenarios of all '
+                                              'the routes in the RailWorks folder, and keep the counts in an SQLite '
+                                              'file.')
+    cli.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, metavar='n',
+                     help='number of scenarios to examine at once (default: the number of processor cores)')
+    cli.add_argument('--railworks', metavar='folder', help='path to the RailWorks folder (default: as in config.ini)')
+    cli.add_argument('--census', metavar='file', default=str(script_path / 'census.sqlite'),
+                     help='SQLite file to keep the census in (default: census.sqlite next to this tool)')
+    cli.add_argument('--rescan', action='store_true',
+                     help='examine every scenario again, not only those added or changed since the last census')
+    cli.add_argument('--uses', metavar='provider[/product[/blueprint]]',
+                     help='rather than taking a census, list the scenarios in the last one which use these assets')
+    cli.add_argument('--missing', action='store_true',
+                     help='rather than taking a census, list the assets in the last one which aren\'t installed')
+    options = cli.parse_args(args)
+    if options.railworks is not None:
+        railworks_path = options.railworks
+    if len(str(railworks_path)) == 0:
+        cli.error('the RailWorks folder is not set in config.ini - give it with --railworks')
+    railworks_path = Path(railworks_path)
+    census = open_census(options.census)
+    if options.uses is not None or options.missing:
+        if options.uses is not None:
+            print_uses(census, options.uses)
+        if options.missing:
+            print_missing(census)
+        census.close()
+        return 0
+    if not Path(railworks_path, 'Content', 'Routes').is_dir():
+        cli.error(str(Path(railworks_path, 'Content', 'Routes')) + ' not found')
+    start = time.perf_counter()
+    (found, examined, unreadable) = take_census(census, max(options.jobs, 1), options.rescan)
+    (assets, missing, vehicles) = census.execute('SELECT COUNT(*), COUNT(*) - COALESCE(SUM(installed), 0), '
+                                                 'COALESCE(SUM(uses), 0) FROM asset').fetchone()
+    census.close()
+    print(str(found) + ' scenarios, of which ' + str(examined) + ' examined (' + str(unreadable) + ' could not be '
+          'read) and ' + str(found - examined) + ' unchanged since the last census, in ' +
+          '%.2f' % (time.perf_counter() - start) + 's')
+    print(str(vehicles) + ' rail vehicles of ' + str(assets) + ' assets, of which ' + str(missing) + ' missing')
+    print('Census saved in ' + str(options.census))
+    return 1 if unreadable else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_census_command_line(sys.argv[1:]))
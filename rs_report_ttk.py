@@ -15,11 +15,8 @@
 #     You should have received a copy of the GNU General Public License
 #     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import xml.etree.ElementTree as ET
 import sys
 import os
-import subprocess
-import platform
 import configparser
 import webbrowser
 import tkinter as tk
@@ -27,8 +24,12 @@ from tkinter import *
 from tkinter import ttk, filedialog
 from tkinter import filedialog as fd
 from tkinter.messagebox import showinfo
+from collections import Counter
 from pathlib import Path
-from pathlib import PureWindowsPath
+from ts_xml import ET, parse_file
+from serz import SerzError, serz_to_xml, run_serz
+from asset_index import set_asset_index, new_asset_run, asset_exists
+from scenario_cache import set_scenario_cache, scenario_cache_key, get_cached_scenario, put_cached_scenario
 
 # If you want to run this script on Linux you must configure the path to the wine executable. You need wine in order to
 # run the serz.exe utility which converts between .bin and .xml scenario files.
@@ -44,6 +45,10 @@ config = configparser.ConfigParser()
 script_path = Path(os.path.abspath(os.path.dirname(sys.argv[0])))
 path_to_config = script_path / 'config.ini'
 config.read(path_to_config)
+# Share the cache of scenarios converted from .bin to .xml with the swap tools
+set_scenario_cache(script_path / 'scenario_cache', config.getint('defaults', 'scenario_cache_mb', fallback=512))
+# and the lists of installed assets, for marking the missing ones in the report
+set_asset_index(script_path / 'asset_index.sqlite')
 if config.has_option('RailWorks', 'path'):
     railworks_path = config.get('RailWorks', 'path')
 
@@ -95,33 +100,35 @@ def examine_pressed():
         scenarioPath = Path(filename)
         inFile = scenarioPath
         cmd = railworks_path / Path('serz.exe')
-        serz_output = ''
         vehicle_list = []
         if str(scenarioPath.suffix) == '.bin':
-            # This is a bin file so we need to run serz.exe command to convert it to a readable .xml
-            # intermediate file
-            if not cmd.is_file():
-                print('serz.exe could not be found in ' + str(railworks_path) + '. Is this definitely your '
-                                                                                   'RailWorks folder?',
-                         'This application will now exit.')
-                sys.exit()
+            # This is a bin file. If it has been converted to .xml before, by this tool or another, the .xml is
+            # read from the cache. Otherwise it is converted to a readable .xml intermediate file, which is
+            # cached - here if possible, otherwise we need to run serz.exe command to do it.
             inFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '-railvehicle_examination_report.xml')
-            if platform.system() == 'Windows':
-                p1 = subprocess.Popen([str(cmd), str(PureWindowsPath(scenarioPath)), '/xml:' +
-                                       str(PureWindowsPath(inFile))], stdout=subprocess.PIPE)
-            else:
+            cache_key = scenario_cache_key(scenarioPath)
+            (cachedFile, by_serz_exe) = get_cached_scenario(cache_key)
+            if cachedFile is None:
                 try:
-                    wine_executable
-                except NameError:
-                    wine_executable = '/usr/bin/wine'
-                p1 = subprocess.Popen([wine_executable, str(cmd), 'z:' + str(PureWindowsPath(scenarioPath)), '/xml:' +
-                                       'z:' + str(PureWindowsPath(inFile))], stdout=subprocess.PIPE)
-            p1.wait()
-            serz_output = 'serz.exe ' + p1.communicate()[0].decode('ascii')
-            # Now the intermediate .xml has been created by serz.exe, read it in to this script and do the
-            # processing
-            tree = parse_xml(inFile)
-            inFile.unlink()
+                    serz_to_xml(scenarioPath, inFile)
+                except SerzError:
+                    by_serz_exe = True
+                    if not cmd.is_file():
+                        print('serz.exe could not be found in ' + str(railworks_path) + '. Is this definitely your '
+                                                                                           'RailWorks folder?',
+                                 'This application will now exit.')
+                        sys.exit()
+                    if not run_serz(cmd, scenarioPath, '/xml:', inFile, wine_executable,
+                                    config.getint('defaults', 'serz_timeout', fallback=300)):
+                        print('Error: ' + str(scenarioPath) + ' could not be converted to .xml by serz.exe.')
+                        return
+                    # Now the intermediate .xml has been created by serz.exe, read it in to this script and do the
+                    # processing
+                put_cached_scenario(cache_key, inFile, by_serz_exe)
+                tree = parse_xml(inFile)
+                inFile.unlink()
+            else:
+                tree = parse_xml(cachedFile)
             #if tree is False:
             #    continue
         else:
@@ -181,10 +188,12 @@ def select_file():
 window_width = 375
 window_height = 225
 
-def parse_xml(xml_file):
-    # Check we can open the file, parse it and find some rail vehicle consists in it before proceeding
+def parse_xml(xml_file, parser_tree=None):
+    # Check we can open the file, parse it and find some rail vehicle consists in it before proceeding. The tree may
+    # be given instead, if the file has already been read from its .bin form.
     try:
-        parser_tree = ET.parse(xml_file)
+        if parser_tree is None:
+            parser_tree = parse_file(xml_file)
     except FileNotFoundError:
         print('Scenario file ' + str(Path(xml_file)) + ' not found.', 'Please try again.', title='Error')
         return False
@@ -241,7 +250,7 @@ def parse_xml(xml_file):
 
 def route_parser(file):
     try:
-        route_tree = ET.parse(file)
+        route_tree = parse_file(file)
     except FileNotFoundError:
         return False
     except ET.ParseError:
@@ -251,7 +260,7 @@ def route_parser(file):
 
 def scenario_props_parser(file):
     try:
-        parser_tree = ET.parse(file)
+        parser_tree = parse_file(file)
     except FileNotFoundError:
         return False
     except ET.ParseError:
@@ -282,6 +291,8 @@ def parse_properties_xml(dir):
 
 
 def convert_vlist_to_html_table(html_file_path, scenarioProps):
+    # Look for the vehicles' blueprints afresh, in case anything has been installed since the last report
+    new_asset_run()
     htmhead = '''<html lang="en">
 <head>
 <meta http-equiv=Content-Type content="text/html; charset=utf-8">
@@ -317,48 +328,13 @@ h3,thead {
             '    <tr style=\'text-align: right;\'>\n      <th>Consist</th>\n      <th>Provider</th>\n' \
             '      <th>Product</th>\n      <th>Blueprint</th>\n      <th>Name</th>\n      <th>Number</th>\n' \
             '      <th>Loaded</th>\n    </tr>\n  </thead>\n  <tbody>\n'
-    unique_assets = []
-    last_cons = -1
-    col_no = 0
-    for row in vehicle_list:
-        if row[1:3] not in unique_assets:
-            unique_assets.append(row[1:3])
-        if int(row[0]) > last_cons:
-            # start of a new consist - count how many vehicles are in this consist
-            rowspan = (list(zip(*vehicle_list))[0]).count(row[0])
-        else:
-            rowspan = 0
-        col_htm = ''
-        row[3] = row[3].replace('.xml', '.bin')
-        my_path = Path(railworks_path, 'Assets', row[1], row[2], row[3].replace('\\','/'))
-        if os.path.isfile(str(my_path)):
-            tdstyle = ''
-        else:
-            tdstyle = ' class="missing"'
-        cname = '<i>' + str(row[7]) + '</i>'
-        if row[8] is True:
-            # Consist is driven by the player - make the name bold and append (Player driven)
-            cname = '<b>' + cname + '</b> (Player driven)'
-        for col in row[0:7]:
-            col_no += 1
-            if rowspan > 0 and col_no == 1:
-                col_htm = col_htm + '      <td rowspan=' + str(rowspan) + '>' + cname + '</td>\n'
-            elif col_no > 1:
-                col_htm = col_htm + '      <td' + tdstyle + '>' + col + '</td>\n'
-        col_no = 0
-        if (int(row[0]) % 2) == 0:
-            htmrv = htmrv + '    <tr>\n' + col_htm + '    </tr>\n'
-        else:
-            htmrv = htmrv + '    <tr class=\'shaded_row\'>\n' + col_htm + '    </tr>\n'
-        last_cons = int(row[0])
-    htmrv = htmrv + '  </tbody>\n</table>\n<h3>' + str(len(vehicle_list)) + ' vehicles in total in this scenario.</h3>'
+    # Count the vehicles in each consist and find the assets used in one pass over the list, so that the report can
+    # then be written out a row at a time
+    consist_sizes = Counter(row[0] for row in vehicle_list)
+    unique_assets = sorted(set((row[1], row[2]) for row in vehicle_list))
     htmas = '\n<h1>List of rail vehicle assets used</h1>\n<table border=\"1\" class=\"dataframe\">\n  <thead>\n' \
             '    <tr style=\"text-align: right;\">\n      <th>Provider</th>\n      <th>Product</th>\n    </tr>\n' \
             '  </thead>\n  <tbody>\n'
-    unique_assets.sort(key=lambda x: (x[0], x[1]))
-    for asset in unique_assets:
-        htmas = htmas + '    <tr>\n      <td>' + asset[0] + '</td>\n      <td>' + asset[1] + '</td>\n    </tr>\n'
-    htmas = htmas + '  </tbody>\n</table>\n'
     htp = ''
     if scenarioProps:
         htp = '\n<h1>Scenario properties</h1>\n<table border=\"1\" class=\"dataframe\" style=\"text-align: left;\">\n' \
@@ -368,9 +344,48 @@ h3,thead {
                 '    <tr>\n      <th>Start From</th>\n      <td>' + str(scenarioProps[3]) + '</td>\n    </tr>\n' \
                 '    <tr>\n      <th>Route</th>\n      <td>' + str(scenarioProps[4]) + '</td>\n    </tr>\n' \
                 '  </table>\n'
-    htm = htmhead + htp + htmas + htmrv + '</body>\n</html>\n'
-    html_file_path.touch()
-    html_file_path.write_text(htm)
+    # Written under a name of its own first, so that a report which can't be finished doesn't replace the last one
+    part_file = Path(str(html_file_path) + '.part')
+    try:
+        with open(part_file, 'w') as html_out:
+            html_out.write(htmhead + htp + htmas)
+            for asset in unique_assets:
+                html_out.write('    <tr>\n      <td>' + asset[0] + '</td>\n      <td>' + asset[1] +
+                               '</td>\n    </tr>\n')
+            html_out.write('  </tbody>\n</table>\n')
+            html_out.write(htmrv)
+            last_cons = -1
+            for row in vehicle_list:
+                if int(row[0]) > last_cons:
+                    # start of a new consist - its name spans the rows of all the vehicles in it
+                    rowspan = consist_sizes[row[0]]
+                else:
+                    rowspan = 0
+                row[3] = row[3].replace('.xml', '.bin')
+                if asset_exists(railworks_path, row[1], row[2], row[3]):
+                    tdstyle = ''
+                else:
+                    tdstyle = ' class="missing"'
+                cname = '<i>' + str(row[7]) + '</i>'
+                if row[8] is True:
+                    # Consist is driven by the player - make the name bold and append (Player driven)
+                    cname = '<b>' + cname + '</b> (Player driven)'
+                if (int(row[0]) % 2) == 0:
+                    row_htm = ['    <tr>\n']
+                else:
+                    row_htm = ['    <tr class=\'shaded_row\'>\n']
+                if rowspan > 0:
+                    row_htm.append('      <td rowspan=' + str(rowspan) + '>' + cname + '</td>\n')
+                for col in row[1:7]:
+                    row_htm.append('      <td' + tdstyle + '>' + col + '</td>\n')
+                row_htm.append('    </tr>\n')
+                html_out.write(''.join(row_htm))
+                last_cons = int(row[0])
+            html_out.write('  </tbody>\n</table>\n<h3>' + str(len(vehicle_list)) +
+                           ' vehicles in total in this scenario.</h3></body>\n</html>\n')
+        os.replace(part_file, html_file_path)
+    finally:
+        part_file.unlink(missing_ok=True)
     return True
 
 
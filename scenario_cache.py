@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+#
+#     RSSwapTool - A script to swap in up to date or enhanced rolling stock
+#     for older versions of stock in Train Simulator scenarios.
+#     Copyright (C) 2025 James McKenzie jrmknz@yahoo.co.uk
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# A cache of scenario .bin files converted to .xml, shared by the swap and report tools, so that examining a scenario
+# and then swapping it - or examining it again - only converts it once. Each .xml file is kept under the SHA-256 hash
+# of the .bin file's contents, so an unchanged scenario is found wherever it is, and a changed one is converted afresh.
+# The name also records whether serz.exe made the .xml (rather than serz.py), in which case serz.exe must be used to
+# turn it back into a .bin file too. Once the files kept take up more than the size allowed, those used longest ago
+# are removed.
+import os
+import hashlib
+import shutil
+
+scenario_cache_version = 1
+scenario_cache_path = None
+scenario_cache_size = 0
+
+
+def set_scenario_cache(this_path, size_mb):
+    # Keep the cache in this folder, usually next to the tool's config.ini, holding up to size_mb megabytes of .xml
+    # files. A size of 0 turns the cache off.
+    global scenario_cache_path, scenario_cache_size
+    scenario_cache_path = this_path
+    scenario_cache_size = size_mb * 1024 * 1024
+
+
+def scenario_cache_key(bin_file):
+    # Return the name a .bin file's .xml is kept under, or None if the cache is off
+    if scenario_cache_path is None or scenario_cache_size <= 0:
+        return None
+    bin_hash = hashlib.sha256()
+    with open(bin_file, 'rb') as bin_in:
+        while True:
+            chunk = bin_in.read(1024 * 1024)
+            if len(chunk) == 0:
+                break
+            bin_hash.update(chunk)
+    return 'v' + str(scenario_cache_version) + '-' + bin_hash.hexdigest()
+
+
+def cached_file(cache_key, by_serz_exe):
+    return os.path.join(scenario_cache_path, cache_key + ('.serz.xml' if by_serz_exe else '.xml'))
+
+
+def get_cached_scenario(cache_key, serz_exe_only=False):
+    # Return the path of the .xml kept for a .bin file, and whether serz.exe made it, or (None, False) if there isn't
+    # one - or if serz_exe_only is set and serz.exe didn't make it. Finding it counts as using it, so it is kept in
+    # preference to others.
+    if cache_key is None:
+        return None, False
+    for by_serz_exe in ((True,) if serz_exe_only else (False, True)):
+        this_file = cached_file(cache_key, by_serz_exe)
+        try:
+            os.utime(this_file)
+            return this_file, by_serz_exe
+        except OSError:
+            pass
+    return None, False
+
+
+def put_cached_scenario(cache_key, xml_file, by_serz_exe):
+    # Keep a copy of the .xml a .bin file has been converted to, then make room for it if need be. Nothing is kept if
+    # it can't be written - the scenario will just be converted again next time.
+    if cache_key is None:
+        return
+    this_file = cached_file(cache_key, by_serz_exe)
+    try:
+        os.makedirs(scenario_cache_path, exist_ok=True)
+        # Copied under a name of its own first, so that a tool running at the same time never finds part of a file
+        shutil.copyfile(xml_file, this_file + '.' + str(os.getpid()))
+        os.replace(this_file + '.' + str(os.getpid()), this_file)
+    except OSError:
+        return
+    evict_cached_scenarios()
+
+
+def evict_cached_scenarios():
+    # Remove the files used longest ago until those left fit in the size allowed
+    kept = []
+    try:
+        with os.scandir(scenario_cache_path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.xml'):
+                    stat = entry.stat()
+                    kept.append((stat.st_mtime, stat.st_size, entry.path))
+    except OSError:
+        return
+    total = sum(size for (mtime, size, path) in kept)
+    kept.sort()
+    for (mtime, size, path) in kept:
+        if total <= scenario_cache_size:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            # Another tool has removed it already
+            pass
+        total = total - size
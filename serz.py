@@ -0,0 +1,487 @@
+#!/usr/bin/python3
+#
+#     RSSwapTool - A script to swap in up to date or enhanced rolling stock
+#     for older versions of stock in Train Simulator scenarios.
+#     Copyright (C) 2025 James McKenzie jrmknz@yahoo.co.uk
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Reading and writing TS's binary (.bin) files without serz.exe, shared by the swap tools. Running serz.exe costs a
+# process for each conversion each way - under wine on Linux - and an intermediate .xml file on disk, where this reads
+# a .bin file straight into the same element tree serz.exe's .xml file would give, and writes one back from it.
+#
+# A .bin file starts with 'SERZ' and a version, and then holds a run of records, each an element of the .xml:
+#   P  the start tag of an element holding other elements, with its d:id and the number of elements inside it
+#   p  its end tag
+#   V  an element holding a value of the type named in its d:type, e.g. <Provider d:type="cDeltaString">AP</Provider>
+#   A  an element holding d:numElements values of the type in its d:elementType, separated by spaces
+#   R  an element holding a d:type="ref" reference to another element's d:id
+#   N  the <d:nil/> element
+# A record is written out in full (0xff, its letter, its names) the first time, and kept in one of 255 slots, filled in
+# turn. A record the same as one kept is written as just the number of its slot, followed by its values. Strings are
+# written in full (0xffff, length, UTF-8) the first time, and after that as their number in order of first appearance.
+#
+# serz.exe itself is the authority on the format, and the tools fall back to it whenever SerzError is raised. So that
+# a file read here is only ever used if it is understood exactly, read_serz checks that writing the tree back out gives
+# the file it was read from, byte for byte, before handing it over. That only shows the reader and writer agree with
+# each other, though, so the swap tools leave the scenarios they rewrite to serz.exe both ways unless the python_serz
+# setting is on. The report tools, which never write a scenario, read .bin files here regardless. run_serz runs
+# serz.exe for the tools whenever they use it.
+import os
+import struct
+import platform
+import subprocess
+import threading
+from pathlib import Path
+from pathlib import PureWindowsPath
+from ts_xml import ET, delta_namespace, xml_parser, TSXMLWriter
+
+serz_header = b'SERZ\x00\x00\x01\x00'
+u8 = struct.Struct('<B')
+u16 = struct.Struct('<H')
+u32 = struct.Struct('<I')
+f32 = struct.Struct('<f')
+f64 = struct.Struct('<d')
+# How the values of each type are held, other than cDeltaString, which is held as a string
+value_structs = {'bool': u8, 'sInt8': struct.Struct('<b'), 'sUInt8': u8, 'sInt16': struct.Struct('<h'), 'sUInt16': u16,
+                 'sInt32': struct.Struct('<i'), 'sUInt32': u32, 'sInt64': struct.Struct('<q'),
+                 'sUInt64': struct.Struct('<Q'), 'sFloat32': f32, 'sFloat64': f64}
+float_types = {'sFloat32', 'sFloat64'}
+new_record = 0xff
+new_string = 0xffff
+saved_records = 255
+# The attribute names used in the .xml, in the {namespace}name form ElementTree gives them
+nil_tag = '{' + delta_namespace + '}nil'
+id_attribute = '{' + delta_namespace + '}id'
+version_attribute = '{' + delta_namespace + '}version'
+type_attribute = '{' + delta_namespace + '}type'
+alt_encoding_attribute = '{' + delta_namespace + '}alt_encoding'
+precision_attribute = '{' + delta_namespace + '}precision'
+num_elements_attribute = '{' + delta_namespace + '}numElements'
+element_type_attribute = '{' + delta_namespace + '}elementType'
+# Whether a wineserver has been started to run serz.exe under wine (see start_wineserver)
+wineserver_started = False
+wineserver_lock = threading.Lock()
+
+
+class SerzError(Exception):
+    # A .bin file, or a tree or .xml file to be written as one, which isn't in the form this module knows
+    pass
+
+
+def float_text(value, this_struct):
+    # Return the shortest decimal which reads back as the same float, held as this_struct holds it
+    if value != value:
+        return 'nan'
+    for precision in range(1, 18):
+        text = '%.*g' % (precision, value)
+        try:
+            if this_struct.unpack(this_struct.pack(float(text)))[0] == value:
+                return text
+        except OverflowError:
+            pass
+    return repr(value)
+
+
+def read_text(value_type, value):
+    # Return a value read from a .bin file as it is written in the .xml
+    if value_type in float_types:
+        return float_text(value, value_structs[value_type])
+    return str(value)
+
+
+class SerzReader:
+    # Reads a .bin file's records in order, passing each element to a parser target (as ET.TreeBuilder is) as it goes
+    def __init__(self, data, target):
+        self.data = data
+        self.pos = len(serz_header)
+        self.target = target
+        self.strings = []
+        self.records = [None] * saved_records
+        self.next_record = 0
+
+    def unpack(self, this_struct):
+        value = this_struct.unpack_from(self.data, self.pos)[0]
+        self.pos = self.pos + this_struct.size
+        return value
+
+    def read_string(self):
+        index = self.unpack(u16)
+        if index != new_string:
+            if index >= len(self.strings):
+                raise SerzError('string ' + str(index) + ' used before it is given')
+            return self.strings[index]
+        length = self.unpack(u32)
+        if self.pos + length > len(self.data):
+            raise SerzError('string runs past the end of the file')
+        text = self.data[self.pos:self.pos + length].decode('utf-8')
+        self.pos = self.pos + length
+        self.strings.append(text)
+        return text
+
+    def read_type(self):
+        value_type = self.read_string()
+        if value_type != 'cDeltaString' and value_type not in value_structs:
+            raise SerzError('unknown value type ' + value_type)
+        return value_type
+
+    def read_value(self, value_type):
+        if value_type == 'cDeltaString':
+            return self.read_string()
+        return self.unpack(value_structs[value_type])
+
+    def read_record(self):
+        # Return the next record's letter and names, which are the same each time a kept record is used again
+        slot = self.unpack(u8)
+        if slot != new_record:
+            if self.records[slot] is None:
+                raise SerzError('record ' + str(slot) + ' used before it is given')
+            return self.records[slot]
+        kind = chr(self.unpack(u8))
+        if kind in 'Pp':
+            record = (kind, self.read_string())
+        elif kind in 'VA':
+            record = (kind, self.read_string(), self.read_type())
+        elif kind == 'R':
+            record = (kind, self.read_string())
+        elif kind == 'N':
+            record = (kind,)
+        else:
+            raise SerzError('unknown record ' + repr(kind))
+        self.records[self.next_record] = record
+        self.next_record = (self.next_record + 1) % saved_records
+        return record
+
+    def read(self):
+        # Read the whole file, returning what the target returns on closing. Each open element is listed with the
+        # number of elements its record says are inside it, and the number found so far.
+        if self.data[:len(serz_header)] != serz_header:
+            raise SerzError('not a serz .bin file')
+        open_elements = []
+        try:
+            while True:
+                record = self.read_record()
+                kind = record[0]
+                if len(open_elements) > 0:
+                    open_elements[-1][2] = open_elements[-1][2] + 1
+                elif kind != 'P':
+                    raise SerzError('the file does not start with an element')
+                if kind == 'P':
+                    attrib = {}
+                    if len(open_elements) == 0:
+                        attrib[version_attribute] = '1.0'
+                    element_id = self.unpack(u32)
+                    if element_id != 0:
+                        attrib[id_attribute] = str(element_id)
+                    self.target.start(record[1], attrib)
+                    open_elements.append([record[1], self.unpack(u32), 0])
+                    continue
+                if kind == 'p':
+                    (tag, children, found) = open_elements.pop()
+                    if tag != record[1] or children != found - 1:
+                        raise SerzError('element ' + tag + ' is not ended as it was started')
+                    self.target.end(tag)
+                    if len(open_elements) == 0:
+                        break
+                    continue
+                if kind == 'V':
+                    attrib = {type_attribute: record[2]}
+                    value = self.read_value(record[2])
+                    if record[2] in float_types:
+                        attrib[alt_encoding_attribute] = f64.pack(value).hex().upper()
+                        attrib[precision_attribute] = 'string'
+                    text = read_text(record[2], value)
+                elif kind == 'A':
+                    count = self.unpack(u8)
+                    attrib = {num_elements_attribute: str(count), element_type_attribute: record[2]}
+                    if record[2] in float_types:
+                        attrib[precision_attribute] = 'string'
+                    text = ' '.join(read_text(record[2], self.read_value(record[2])) for i in range(0, count))
+                elif kind == 'R':
+                    attrib = {type_attribute: 'ref'}
+                    text = str(self.unpack(u32))
+                else:
+                    self.target.start(nil_tag, {})
+                    self.target.end(nil_tag)
+                    continue
+                self.target.start(record[1], attrib)
+                self.target.data(text)
+                self.target.end(record[1])
+        except (struct.error, UnicodeDecodeError, IndexError) as problem:
+            raise SerzError('the file could not be read: ' + str(problem))
+        if self.pos != len(self.data):
+            raise SerzError('there is more in the file after its last element')
+        return self.target.close()
+
+
+class SerzWriter:
+    # A parser target which turns the elements it is given into a .bin file, returned by close()
+    def __init__(self):
+        self.chunks = [serz_header]
+        self.strings = {}
+        self.records = [None] * saved_records
+        self.record_slots = {}
+        self.next_record = 0
+        # Each open element holding other elements is listed with the chunk its count goes in, and the count so far.
+        # An element holding a value is kept, with its text, until it ends.
+        self.open_elements = []
+        self.value_element = None
+        self.value_text = []
+
+    def string(self, text):
+        if text in self.strings:
+            return u16.pack(self.strings[text])
+        if len(self.strings) >= new_string:
+            raise SerzError('too many strings')
+        self.strings[text] = len(self.strings)
+        encoded = text.encode('utf-8')
+        return u16.pack(new_string) + u32.pack(len(encoded)) + encoded
+
+    def write_record(self, record):
+        if record in self.record_slots:
+            self.chunks.append(u8.pack(self.record_slots[record]))
+            return
+        self.chunks.append(bytes((new_record, ord(record[0]))) + b''.join(self.string(name) for name in record[1:]))
+        old_record = self.records[self.next_record]
+        if old_record is not None and self.record_slots.get(old_record) == self.next_record:
+            del self.record_slots[old_record]
+        self.records[self.next_record] = record
+        self.record_slots[record] = self.next_record
+        self.next_record = (self.next_record + 1) % saved_records
+
+    def value(self, value_type, text):
+        if value_type == 'cDeltaString':
+            return self.string(text)
+        if value_type not in value_structs:
+            raise SerzError('unknown value type ' + value_type)
+        if value_type in float_types:
+            return value_structs[value_type].pack(float(text))
+        return value_structs[value_type].pack(int(text))
+
+    def start(self, tag, attrib):
+        if self.value_element is not None:
+            raise SerzError('element ' + tag + ' is inside a value')
+        if len(self.open_elements) > 0:
+            self.open_elements[-1][1] = self.open_elements[-1][1] + 1
+        elif len(self.chunks) > 1:
+            raise SerzError('there is more than one root element')
+        if tag[:1] == '{' and tag != nil_tag:
+            raise SerzError('unknown element ' + tag)
+        if tag != nil_tag and type_attribute not in attrib and num_elements_attribute not in attrib:
+            if attrib.get(version_attribute, '1.0') != '1.0':
+                raise SerzError('unknown version ' + attrib[version_attribute])
+            self.write_record(('P', tag))
+            try:
+                self.chunks.append(u32.pack(int(attrib.get(id_attribute, '0'))))
+            except (ValueError, struct.error):
+                raise SerzError('bad d:id ' + attrib[id_attribute])
+            self.chunks.append(None)
+            self.open_elements.append([len(self.chunks) - 1, 0])
+        else:
+            self.value_element = (tag, attrib)
+            self.value_text = []
+
+    def data(self, text):
+        if self.value_element is not None:
+            self.value_text.append(text)
+        elif text.strip():
+            raise SerzError('text outside a value: ' + text.strip()[:40])
+
+    def end(self, tag):
+        if self.value_element is None:
+            (count_chunk, children) = self.open_elements.pop()
+            self.chunks[count_chunk] = u32.pack(children)
+            self.write_record(('p', tag))
+            return
+        (tag, attrib) = self.value_element
+        text = ''.join(self.value_text)
+        self.value_element = None
+        try:
+            if tag == nil_tag:
+                self.write_record(('N',))
+            elif num_elements_attribute in attrib:
+                value_type = attrib.get(element_type_attribute, '')
+                values = text.split()
+                if len(values) != int(attrib[num_elements_attribute]):
+                    raise SerzError('element ' + tag + ' does not hold d:numElements values')
+                self.write_record(('A', tag, value_type))
+                self.chunks.append(u8.pack(len(values)))
+                self.chunks.extend(self.value(value_type, this_value) for this_value in values)
+            elif attrib[type_attribute] == 'ref':
+                self.write_record(('R', tag))
+                self.chunks.append(u32.pack(int(text)))
+            else:
+                value_type = attrib[type_attribute]
+                if value_type not in value_structs and value_type != 'cDeltaString':
+                    raise SerzError('unknown value type ' + value_type)
+                self.write_record(('V', tag, value_type))
+                if value_type in float_types and alt_encoding_attribute in attrib:
+                    # The exact value, where the text may have been rounded
+                    text = repr(f64.unpack(bytes.fromhex(attrib[alt_encoding_attribute]))[0])
+                self.chunks.append(self.value(value_type, text))
+        except (ValueError, OverflowError, struct.error) as problem:
+            raise SerzError('element ' + tag + ' holds a value which could not be written: ' + str(problem))
+
+    def close(self):
+        if len(self.open_elements) > 0 or None in self.chunks:
+            raise SerzError('the file ends inside an element')
+        return b''.join(self.chunks)
+
+
+class SerzCheck:
+    # A parser target which passes the elements it is given to another target and also to a SerzWriter, and on
+    # closing checks that the writer gives back the .bin file they were read from
+    def __init__(self, target, bin_data):
+        self.target = target
+        self.bin_data = bin_data
+        self.writer = SerzWriter()
+
+    def start(self, tag, attrib):
+        self.writer.start(tag, attrib)
+        return self.target.start(tag, attrib)
+
+    def data(self, text):
+        self.writer.data(text)
+        return self.target.data(text)
+
+    def end(self, tag):
+        self.writer.end(tag)
+        return self.target.end(tag)
+
+    def close(self):
+        if self.writer.close() != self.bin_data:
+            raise SerzError('the file would not be written back the same')
+        return self.target.close()
+
+
+def read_bin_file(bin_file, target):
+    # Read a .bin file into a parser target, checking it would be written back the same
+    with open(bin_file, 'rb') as bin_in:
+        data = bin_in.read()
+    return SerzReader(data, SerzCheck(target, data)).read()
+
+
+def read_serz(bin_file):
+    # Read a .bin file into an element tree, as if serz.exe had converted it to .xml and that had been parsed. Raise
+    # SerzError if this module can't read it exactly.
+    return ET.ElementTree(read_bin_file(bin_file, ET.TreeBuilder()))
+
+
+def serz_to_xml(bin_file, xml_file):
+    # Convert a .bin file to an .xml file, as serz.exe /xml: would, without reading it into a tree
+    try:
+        with open(xml_file, 'w', encoding='utf-8') as xml_out:
+            xml_out.write("<?xml version='1.0' encoding='utf-8'?>\n")
+            read_bin_file(bin_file, TSXMLWriter(xml_out.write))
+    except SerzError:
+        # Don't leave part of a file behind to be mistaken for the whole
+        os.unlink(xml_file)
+        raise
+
+
+def write_element(writer, elem):
+    writer.start(elem.tag, dict(elem.attrib))
+    if elem.text:
+        writer.data(elem.text)
+    for child in elem:
+        if isinstance(child.tag, str):
+            write_element(writer, child)
+        if child.tail:
+            writer.data(child.tail)
+    writer.end(elem.tag)
+
+
+def write_serz(root, bin_file):
+    # Write a tree, from its root element, to a .bin file. The file is only written once it has all been turned into
+    # .bin form, so SerzError leaves any existing file as it was.
+    writer = SerzWriter()
+    write_element(writer, root)
+    data = writer.close()
+    with open(bin_file, 'wb') as bin_out:
+        bin_out.write(data)
+
+
+def xml_to_serz(xml_file, bin_file):
+    # Convert an .xml file to a .bin file, as serz.exe /bin: would, without reading it into a tree
+    parser = xml_parser(SerzWriter())
+    try:
+        with open(xml_file, 'rb') as xml_in:
+            while True:
+                chunk = xml_in.read(1024 * 1024)
+                if len(chunk) == 0:
+                    break
+                parser.feed(chunk)
+        data = parser.close()
+    except ET.ParseError as problem:
+        raise SerzError('the .xml file could not be parsed: ' + str(problem))
+    with open(bin_file, 'wb') as bin_out:
+        bin_out.write(data)
+
+
+def start_wineserver(wine_executable):
+    # Start a wineserver which keeps running between serz.exe conversions, rather than wine starting one for each
+    # conversion and shutting it down afterwards. It shuts itself down once there have been no conversions for a minute.
+    global wineserver_started
+    with wineserver_lock:
+        if wineserver_started:
+            return
+        wineserver_started = True
+        try:
+            subprocess.run([str(Path(wine_executable).parent / 'wineserver'), '-p60'], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, timeout=30)
+        except (OSError, subprocess.SubprocessError):
+            # wine will start its own as usual
+            pass
+
+
+def serz_runs_under_wine():
+    # Whether serz.exe has to be run through wine, i.e. this is neither Windows nor Windows Subsystem Linux (WSL2)
+    return platform.system() != 'Windows' and not (platform.system() == 'Linux' and
+                                                   platform.release()[-5:-1] == 'WSL2')
+
+
+def serz_path(this_file):
+    # Return the path of a file as serz.exe is to be given it, on Windows or through WSL2 or wine
+    this_file_w = str(PureWindowsPath(os.path.abspath(this_file)))
+    if platform.system() == 'Windows':
+        return this_file_w
+    if not serz_runs_under_wine():
+        # Linux-style pathnames can be converted to windows style with drive letters
+        return this_file_w[5] + ':' + this_file_w[6:]
+    # wine gives the Linux file system the drive letter Z:
+    return 'z:' + this_file_w
+
+
+def run_serz(cmd, in_file, out_switch, out_file, wine_executable, timeout=300):
+    # Run the serz.exe command (cmd) to convert in_file to out_file - out_switch is '/xml:' or '/bin:' for the type of
+    # file to write - and wait for it to finish, for up to timeout seconds. Return True if out_file was written. Any
+    # out_file left from before is removed first, so that it isn't mistaken for what serz.exe has written.
+    serz_command = [str(cmd), serz_path(in_file), out_switch + serz_path(out_file)]
+    if serz_runs_under_wine():
+        start_wineserver(wine_executable)
+        serz_command.insert(0, wine_executable)
+    Path(out_file).unlink(missing_ok=True)
+    try:
+        serz_process = subprocess.Popen(serz_command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return False
+    try:
+        (serz_output, serz_errors) = serz_process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        serz_process.kill()
+        serz_process.communicate()
+        return False
+    # Uncomment the line below to see the output of the serz.exe command
+    # print('serz.exe ' + serz_output.decode('ascii'))
+    return Path(out_file).is_file()
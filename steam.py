@@ -18,17 +18,20 @@
 import re
 import random
 import csv
-import xml.etree.ElementTree as ET
+import json
 import time
 import sys
 import os
-import subprocess
-import platform
 import configparser
 import PySimpleGUI as sg
 import webbrowser
+from collections import Counter
 from pathlib import Path
-from pathlib import PureWindowsPath
+from dcsv_numbers import get_dcsv_names, set_dcsv_index, NumberAllocator
+from asset_index import set_asset_index, new_asset_run, asset_exists
+from ts_xml import ET, parse_file, write_ts_xml
+from serz import SerzError, read_serz, write_serz, xml_to_serz, run_serz
+from scenario_cache import set_scenario_cache, scenario_cache_key, get_cached_scenario, put_cached_scenario
 from data_file import hha_e_wagons, hha_l_wagons, HTO_141_numbers, HTO_143_numbers, \
     HTO_146_numbers, HTO_rebodied_numbers, HTV_146_numbers, HTV_rebodied_numbers, c158_s9bl_rr, c158_s9bl_nr, \
     c158_s9bl_fgw, c158_s9bl_tpe, c158_s9bl_swt, c158_nwc, c158_dtg_fc, c158_livman_rr, ap40headcodes_69_77, \
@@ -48,6 +51,7 @@ version_date = '8 April 2023'
 
 # Initialise the script, set the look and feel and get the configuration
 rv_list = []
+number_allocators = {}
 rv_pairs = []
 output_vehicle_list = []
 input_vehicle_list = []
@@ -62,6 +66,9 @@ railworks_path = ''
 #report_opts = ['Don\'t save a report', 'Save a report']
 report_opts = ['Don\'t save a report', 'Save details of processed scenario only',
                'Save details of original and processed scenarios']
+report_formats = ['HTML web page', 'CSV spreadsheet', 'JSON Lines']
+# The details of each vehicle given in CSV and JSON Lines reports, as they were and as they are after processing
+report_columns = ['provider', 'product', 'blueprint', 'name', 'number', 'loaded']
 sg.LOOK_AND_FEEL_TABLE['Railish'] = {'BACKGROUND': '#21301b',
                                      'TEXT': '#FFFFFF',
                                      'INPUT': '#FFFFFF',
@@ -75,6 +82,12 @@ config = configparser.ConfigParser()
 script_path = Path(os.path.abspath(os.path.dirname(sys.argv[0])))
 path_to_config = script_path / 'config_steam.ini'
 config.read(path_to_config)
+# Keep the entries read from AP vehicle number databases in an index alongside the configuration
+set_dcsv_index(script_path / 'dcsv_index.sqlite')
+# and the lists of installed assets, for marking the missing ones in reports
+set_asset_index(script_path / 'asset_index.sqlite')
+# and the scenarios converted from .bin to .xml, which the other tools share
+set_scenario_cache(script_path / 'scenario_cache', config.getint('defaults', 'scenario_cache_mb', fallback=512))
 # Read configuration and find location of RailWorks folder, or ask user to set it
 if config.has_option('RailWorks', 'path'):
     railworks_path = config.get('RailWorks', 'path')
@@ -120,6 +133,7 @@ if not config.has_section('defaults'):
     config.set('defaults', 'replace_dtmaunsell', 'True')
     config.set('defaults', 'replace_srn15', 'True')
     config.set('defaults', 'save_report', report_opts[0])
+    config.set('defaults', 'report_format', report_formats[0])
     with open(path_to_config, 'w') as iconfigfile:
         config.write(iconfigfile)
         iconfigfile.close()
@@ -155,7 +169,9 @@ def import_data_from_csv(csv_filename):
                     if c == 0:
                         key = col
                     elif c == 3:
-                        outrow.append(re.escape(col))
+                        # Compile the Blueprint pattern once here, rather than on every search when the re module's
+                        # cache of compiled patterns (far smaller than the tables) has long since dropped it
+                        outrow.append(re.compile(re.escape(col), flags=re.IGNORECASE))
                     else:
                         outrow.append(col)
                     c = c + 1
@@ -238,55 +254,30 @@ layout = [
 
 
 def dcsv_get_num(this_dcsv, this_rv, this_re):
-    # Try to retrieve the closest match for the loco number from the vehicle number database
-    try:
-        dcsv_tree = ET.parse(this_dcsv)
-    except FileNotFoundError:
-        sg.popup('Vehicle number database ' + str(Path(this_dcsv)) + ' not found.',
-                 'Check you have all the required products installed, and that you have clicked "Settings" in this '
-                 'program and set the location of your RailWorks folder correctly.',
-                 'This program will now quit.', title='Error')
-        sys.exit('Fatal Error: Vehicle number database ' + str(Path(this_dcsv)) + ' not found.')
-    except ET.ParseError:
-        sg.popup('Vehicle number database ' + str(Path(this_dcsv)) + ' was found but could not be parsed.',
-                 'This program will now quit.', title='Error')
-        sys.exit(
-            'Fatal Error: Vehicle number database ' + str(Path(this_dcsv)) + ' was found but could not be parsed.')
-    diff = 0
-    last_nm = this_rv
-    ithis_rv = int(this_rv)
-    s = set(rv_list)
-    root = dcsv_tree.getroot()
-    for vnum in root.findall("./CSVItem/cCSVItem/Name"):
-        # Iterate through the list of TOPS numbers until we find a number we haven't previously used which is an exact
-        # match or the closest match for the number we're looking for
-        nm = re.search(this_re, vnum.text)
-        if nm:
-            curr_nm = nm.group(1) + nm.group(2)
-            dcsv_nm = int(nm.group(1))
-            if curr_nm in s:
-                # This number is already in use in another swapped loco - move on and try the next one
-                continue
-            if ithis_rv > dcsv_nm:
-                # This number is still less than the number we're looking for - but remember how close it is and try the
-                # next one to see if it is a match or is even further away than this number.
-                diff = ithis_rv - dcsv_nm
-            elif ithis_rv == dcsv_nm:
-                # A matching number is available and has been found - use it.
-                return curr_nm
-            elif ithis_rv < dcsv_nm:
-                # We have overshot the number we are looking for - but if this number is even further from the number
-                # we're looking for than the last one we looked at, use the last one.
-                if dcsv_nm - ithis_rv > diff:
-                    return last_nm
-                else:
-                    # We've checked and even though we have overshot the number we are looking for, this number is
-                    # closer to the number we're looking for than the last one we looked at - so use it.
-                    return curr_nm
-            last_nm = curr_nm
-    # We didn't find a number to use. We must have reached the end of the available numbers so we will have to use the
-    # last available number we found.
-    return last_nm
+    # Try to retrieve the closest match for the loco number from the vehicle number database - a number we haven't
+    # previously used which is an exact match or the closest match for the number we're looking for
+    key = (str(this_dcsv), this_re)
+    if key not in number_allocators:
+        try:
+            dcsv_names = get_dcsv_names(this_dcsv)
+        except FileNotFoundError:
+            sg.popup('Vehicle number database ' + str(Path(this_dcsv)) + ' not found.',
+                     'Check you have all the required products installed, and that you have clicked "Settings" in '
+                     'this program and set the location of your RailWorks folder correctly.',
+                     'This program will now quit.', title='Error')
+            sys.exit('Fatal Error: Vehicle number database ' + str(Path(this_dcsv)) + ' not found.')
+        except ET.ParseError:
+            sg.popup('Vehicle number database ' + str(Path(this_dcsv)) + ' was found but could not be parsed.',
+                     'This program will now quit.', title='Error')
+            sys.exit(
+                'Fatal Error: Vehicle number database ' + str(Path(this_dcsv)) + ' was found but could not be parsed.')
+        entries = []
+        for vnum in dcsv_names:
+            nm = re.search(this_re, vnum)
+            if nm:
+                entries.append((nm.group(1) + nm.group(2), int(nm.group(1)), nm.group(1) + nm.group(2)))
+        number_allocators[key] = NumberAllocator(entries)
+    return number_allocators[key].nearest(int(this_rv), this_rv, rv_list)
 
 
 def set_weathering(this_weather_variant, this_vehicle):
@@ -311,7 +302,7 @@ def black5_replace(provider, product, blueprint, name, number):
         this_vehicle = vehicle_db['Black5'][i]
         if this_vehicle[0] in provider.text:
             if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(blueprint.text)
                 if bp:
                     provider.text = this_vehicle[3]
                     product.text = this_vehicle[4]
@@ -374,7 +365,7 @@ def lms5xp_replace(provider, product, blueprint, name, number):
         this_vehicle = vehicle_db['LMS5XP'][i]
         if this_vehicle[0] in provider.text:
             if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(blueprint.text)
                 if bp:
                     provider.text = this_vehicle[3]
                     product.text = this_vehicle[4]
@@ -405,7 +396,7 @@ def bulleidlp_replace(provider, product, blueprint, name, number):
         this_vehicle = vehicle_db['BulleidLP'][i]
         if this_vehicle[0] in provider.text:
             if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(blueprint.text)
                 if bp:
                     provider.text = this_vehicle[3]
                     product.text = this_vehicle[4]
@@ -426,7 +417,7 @@ def bulleidrlp_replace(provider, product, blueprint, name, number):
         this_vehicle = vehicle_db['BulleidRLP'][i]
         if this_vehicle[0] in provider.text:
             if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(blueprint.text)
                 if bp:
                     provider.text = this_vehicle[3]
                     product.text = this_vehicle[4]
@@ -450,7 +441,7 @@ def dtmaunsell_replace(provider, product, blueprint, name, number, flipped):
         this_vehicle = vehicle_db['MaunsellCoach'][i]
         if this_vehicle[0] in provider.text:
             if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(blueprint.text)
                 if bp:
                     provider.text = this_vehicle[3]
                     product.text = this_vehicle[4]
@@ -479,7 +470,7 @@ def srn15_replace(provider, product, blueprint, name, number):
         this_vehicle = vehicle_db['SRN15'][i]
         if this_vehicle[0] in provider.text:
             if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(blueprint.text)
                 if bp:
                     provider.text = this_vehicle[3]
                     product.text = this_vehicle[4]
@@ -498,7 +489,7 @@ def vehicle_replace(vehicle_db, provider, product, blueprint, name, number, rv_n
         this_vehicle = vehicle_db[i]
         if this_vehicle[0] in provider.text:
             if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(blueprint.text)
                 if bp:
                     provider.text = this_vehicle[3]
                     product.text = this_vehicle[4]
@@ -516,7 +507,7 @@ def user_vehicle_replace(provider, product, blueprint, name):
         this_vehicle = user_db['User'][i]
         if this_vehicle[0] in provider.text:
             if this_vehicle[1] in product.text:
-                bp = re.search(this_vehicle[2], blueprint.text, flags=re.IGNORECASE)
+                bp = this_vehicle[2].search(blueprint.text)
                 if bp:
                     provider.text = this_vehicle[3]
                     product.text = this_vehicle[4]
@@ -526,11 +517,14 @@ def user_vehicle_replace(provider, product, blueprint, name):
     return False
 
 
-def parse_xml(xml_file):
-    # Check we can open the file, parse it and find some rail vehicle consists in it before proceeding
+def parse_xml(xml_file, parser_tree=None):
+    # Check we can open the file, parse it and find some rail vehicle consists in it before proceeding. The tree may
+    # be given instead, if the file has already been read from its .bin form.
     global mu_last
+    number_allocators.clear()
     try:
-        parser_tree = ET.parse(xml_file)
+        if parser_tree is None:
+            parser_tree = parse_file(xml_file)
     except FileNotFoundError:
         sg.popup('Scenario file ' + str(Path(xml_file)) + ' not found.', 'Please try again.', title='Error')
         return False
@@ -660,25 +654,9 @@ def vehicle_replacer(provider, product, blueprint, name, number, loaded, flipped
     return True
 
 
-def fix_short_tags(xml_string):
-    # This clumsy fix is necessary because sometimes TS requires short xml empty tags and sometimes long ones.
-    # The following substitutions should take care of the important exceptions to the long tag default.
-    xml_string = re.sub(r'(<cEngineSimContainer[^>]*)></cEngineSimContainer>', r'\1/>', xml_string,
-                        flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<RailVehicleNumber)></RailVehicleNumber>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<Other)></Other>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<DeltaTarget)></DeltaTarget>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<d:nil)></d:nil>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<DriverInstruction)></DriverInstruction>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<InitialLevel)></InitialLevel>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<StaticChildrenMatrix)></StaticChildrenMatrix>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    xml_string = re.sub(r'(<RailVehicles)></RailVehicles>', r'\1/>', xml_string, flags=re.IGNORECASE)
-    return xml_string
-
-
 def route_parser(file):
     try:
-        route_tree = ET.parse(file)
+        route_tree = parse_file(file)
     except FileNotFoundError:
         return False
     except ET.ParseError:
@@ -688,7 +666,7 @@ def route_parser(file):
 
 def scenario_props_parser(file):
     try:
-        parser_tree = ET.parse(file)
+        parser_tree = parse_file(file)
     except FileNotFoundError:
         return False
     except ET.ParseError:
@@ -719,6 +697,8 @@ def parse_properties_xml(dir):
 
 
 def convert_vlist_to_html_table(html_file_path, scenarioProps):
+    # Look for the vehicles' blueprints afresh, in case anything has been installed since the last report
+    new_asset_run()
     htmhead = '''<html lang="en">
 <head>
 <meta http-equiv=Content-Type content="text/html; charset=utf-8">
@@ -770,51 +750,14 @@ h3,thead {
     #            "      <th>New Provider</th>\n      <th>New Product</th>\n      <th>New Blueprint</th>\n" \
     #            "      <th>New Name</th>\n      <th>New Number</th>\n      <th>Loaded</th>\n    </tr>\n  </thead>\n" \
     #            "  <tbody>\n"
-    unique_assets = []
-    last_cons = -1
-    row_no = 0
-    for row in output_vehicle_list:
-        if row[1:3] not in unique_assets:
-            unique_assets.append(row[1:3])
-        if int(row[0]) > last_cons:
-            # start of a new consist - count how many vehicles are in this consist
-            rowspan = (list(zip(*output_vehicle_list))[0]).count(row[0])
-        else:
-            rowspan = 0
-        col_htm = ''
-        row[3] = row[3].replace('.xml', '.bin')
-        if Path(railworks_path, 'Assets', row[1], row[2], row[3].replace('\\', '/')).is_file():
-            tdstyle = ''
-        else:
-            tdstyle = ' class="missing"'
-        cname = '<i>' + str(row[7]) + '</i>'
-        if row[8] is True:
-            # Consist is driven by the player - make the name bold and append (Player driven)
-            cname = '<b>' + cname + '</b> (Player driven)'
-        if rowspan > 0:
-            col_htm = col_htm + '      <td rowspan=' + str(rowspan) + '>' + cname + '</td>\n'
-        if config.get('defaults', 'save_report') == report_opts[2]:
-            # User wants a full report so add columns with details of original vehicles to right hand side of table
-            in_row = input_vehicle_list[row_no]
-            in_row[3] = in_row[3].replace('.xml', '.bin')
-            for col in in_row[1:7]:
-                col_htm = col_htm + '      <td class="input">' + col + '</td>\n'
-        for col in row[1:7]:
-                col_htm = col_htm + '      <td' + tdstyle + '>' + col + '</td>\n'
-        if (int(row[0]) % 2) == 0:
-            htmrv = htmrv + '    <tr>\n' + col_htm + '    </tr>\n'
-        else:
-            htmrv = htmrv + '    <tr class=\"shaded_row\">\n' + col_htm + '    </tr>\n'
-        last_cons = int(row[0])
-        row_no = row_no + 1
-    htmrv = htmrv + '  </tbody>\n</table>\n<h3>' + str(len(output_vehicle_list)) + ' vehicles in total in this scenario.</h3>'
+    # Count the vehicles in each consist and find the assets used in one pass over the list, so that the report can
+    # then be written out a row at a time
+    consist_sizes = Counter(row[0] for row in output_vehicle_list)
+    unique_assets = sorted(set((row[1], row[2]) for row in output_vehicle_list))
+    full_report = config.get('defaults', 'save_report') == report_opts[2]
     htmas = '\n<h1>List of rail vehicle assets used</h1>\n<table border=\"1\" class=\"dataframe\">\n  <thead>\n' \
             '    <tr style=\"text-align: right;\">\n      <th>Provider</th>\n      <th>Product</th>\n    </tr>\n' \
             '  </thead>\n  <tbody>\n'
-    unique_assets.sort(key=lambda x: (x[0], x[1]))
-    for asset in unique_assets:
-        htmas = htmas + '    <tr>\n      <td>' + asset[0] + '</td>\n      <td>' + asset[1] + '</td>\n    </tr>\n'
-    htmas = htmas + '  </tbody>\n</table>\n'
     htp = ''
     if scenarioProps:
         htp = '\n<h1>Scenario properties</h1>\n<table border=\"1\" class=\"dataframe\" style=\"text-align: left;\">\n' \
@@ -824,9 +767,110 @@ h3,thead {
                 '    <tr>\n      <th>Start From</th>\n      <td>' + str(scenarioProps[3]) + '</td>\n    </tr>\n' \
                 '    <tr>\n      <th>Route</th>\n      <td>' + str(scenarioProps[4]) + '</td>\n    </tr>\n' \
                 '  </table>\n'
-    htm = htmhead + htp + htmas + htmrv + '</body>\n</html>\n'
-    html_file_path.touch()
-    html_file_path.write_text(htm)
+    # Written under a name of its own first, so that a report which can't be finished doesn't replace the last one
+    part_file = Path(str(html_file_path) + '.part')
+    try:
+        with open(part_file, 'w') as html_out:
+            html_out.write(htmhead + htp + htmas)
+            for asset in unique_assets:
+                html_out.write('    <tr>\n      <td>' + asset[0] + '</td>\n      <td>' + asset[1] +
+                               '</td>\n    </tr>\n')
+            html_out.write('  </tbody>\n</table>\n')
+            html_out.write(htmrv)
+            last_cons = -1
+            for (row_no, row) in enumerate(output_vehicle_list):
+                if int(row[0]) > last_cons:
+                    # start of a new consist - its name spans the rows of all the vehicles in it
+                    rowspan = consist_sizes[row[0]]
+                else:
+                    rowspan = 0
+                row[3] = row[3].replace('.xml', '.bin')
+                if asset_exists(railworks_path, row[1], row[2], row[3]):
+                    tdstyle = ''
+                else:
+                    tdstyle = ' class="missing"'
+                cname = '<i>' + str(row[7]) + '</i>'
+                if row[8] is True:
+                    # Consist is driven by the player - make the name bold and append (Player driven)
+                    cname = '<b>' + cname + '</b> (Player driven)'
+                if (int(row[0]) % 2) == 0:
+                    row_htm = ['    <tr>\n']
+                else:
+                    row_htm = ['    <tr class=\"shaded_row\">\n']
+                if rowspan > 0:
+                    row_htm.append('      <td rowspan=' + str(rowspan) + '>' + cname + '</td>\n')
+                if full_report:
+                    # User wants a full report so add columns with details of original vehicles to right hand side
+                    in_row = input_vehicle_list[row_no]
+                    in_row[3] = in_row[3].replace('.xml', '.bin')
+                    for col in in_row[1:7]:
+                        row_htm.append('      <td class="input">' + col + '</td>\n')
+                for col in row[1:7]:
+                    row_htm.append('      <td' + tdstyle + '>' + col + '</td>\n')
+                row_htm.append('    </tr>\n')
+                html_out.write(''.join(row_htm))
+                last_cons = int(row[0])
+            html_out.write('  </tbody>\n</table>\n<h3>' + str(len(output_vehicle_list)) +
+                           ' vehicles in total in this scenario.</h3></body>\n</html>\n')
+        os.replace(part_file, html_file_path)
+    finally:
+        part_file.unlink(missing_ok=True)
+    return True
+
+
+def vehicle_report_fields(full_report):
+    # Return the names of the columns of a CSV report, which are also the keys of each vehicle in a JSON Lines report
+    fields = ['consist', 'service', 'player_driven']
+    if full_report:
+        fields = fields + ['original_' + column for column in report_columns]
+    return fields + ['new_' + column for column in report_columns]
+
+
+def vehicle_report_records(full_report):
+    # Yield the details of each vehicle in the processed scenario, in the order of vehicle_report_fields, for the CSV
+    # and JSON Lines reports. Blueprints are given as .bin files, as in the HTML report.
+    for (row_no, row) in enumerate(output_vehicle_list):
+        record = [int(row[0]), row[7], row[8]]
+        if full_report:
+            vehicles = [input_vehicle_list[row_no], row]
+        else:
+            vehicles = [row]
+        for vehicle in vehicles:
+            record.extend(vehicle[1:3])
+            record.append(vehicle[3].replace('.xml', '.bin'))
+            record.extend(vehicle[4:7])
+        yield record
+
+
+def convert_vlist_to_csv(csv_file_path):
+    # Save a report of the vehicles in the scenario as a CSV file, with a row of column names and then a row for each
+    # vehicle, written out as it is made
+    full_report = config.get('defaults', 'save_report') == report_opts[2]
+    part_file = Path(str(csv_file_path) + '.part')
+    try:
+        with open(part_file, 'w', newline='', encoding='utf-8') as csv_out:
+            csv_writer = csv.writer(csv_out)
+            csv_writer.writerow(vehicle_report_fields(full_report))
+            csv_writer.writerows(vehicle_report_records(full_report))
+        os.replace(part_file, csv_file_path)
+    finally:
+        part_file.unlink(missing_ok=True)
+    return True
+
+
+def convert_vlist_to_jsonl(jsonl_file_path):
+    # Save a report of the vehicles in the scenario as a JSON Lines file, with an object on each line for each vehicle,
+    # keyed on the CSV report's column names
+    full_report = config.get('defaults', 'save_report') == report_opts[2]
+    fields = vehicle_report_fields(full_report)
+    part_file = Path(str(jsonl_file_path) + '.part')
+    try:
+        with open(part_file, 'w', encoding='utf-8') as jsonl_out:
+            for record in vehicle_report_records(full_report):
+                jsonl_out.write(json.dumps(dict(zip(fields, record)), ensure_ascii=False) + '\n')
+        os.replace(part_file, jsonl_file_path)
+    finally:
+        part_file.unlink(missing_ok=True)
     return True
 
 
@@ -863,6 +907,7 @@ if __name__ == "__main__":
                 config.write(configfile)
                 configfile.close()
             save_report = config.get('defaults', 'save_report', fallback=report_opts[0])
+            report_format = config.get('defaults', 'report_format', fallback=report_formats[0])
             # The settings button has been pressed, so allow the user to change the RailWorks folder setting
             loclayout = [
                 [sg.Text('Settings', justification='c')],
@@ -876,6 +921,11 @@ if __name__ == "__main__":
                  sg.Combo(report_opts, auto_size_text=True, default_value=save_report, key='save_report', readonly=True,
                           tooltip='You may choose to save a report listing all the rail vehicles (and their numbers)'
                                   ' in the scenario, in .html format, alongside the scenario output file.')],
+                [sg.Text("Save the report as a"),
+                 sg.Combo(report_formats, auto_size_text=True, default_value=report_format, key='report_format',
+                          readonly=True,
+                          tooltip='A web page to view in your browser, or a CSV spreadsheet or JSON Lines file listing'
+                                  ' the same details, to open in a spreadsheet or with other programs.')],
                 [sg.Button('Save changes'), sg.Button('Cancel')]
             ]
             locwindow = sg.Window('RSSwapTool - Settings', loclayout)
@@ -891,6 +941,7 @@ if __name__ == "__main__":
                     if not config.has_section('defaults'):
                         config.add_section('defaults')
                     config.set('defaults', 'save_report', str(lvalues['save_report']))
+                    config.set('defaults', 'report_format', str(lvalues['report_format']))
                     with open(path_to_config, 'w') as configfile:
                         config.write(configfile)
                         configfile.close()
@@ -922,96 +973,105 @@ if __name__ == "__main__":
                 outPathStem = scenarioPath.parent / Path(str(scenarioPath.stem) + '-' + time.strftime('%Y%m%d-%H%M%S'))
                 inFile = scenarioPath
                 cmd = railworks_path / Path('serz.exe')
-                serz_output = ''
                 output_message = ''
                 vehicle_list = []
+                bin_tree = None
+                use_serz_exe = False
                 if str(scenarioPath.suffix) == '.bin':
-                    # This is a bin file so we need to run serz.exe command to convert it to a readable .xml
-                    # intermediate file
-                    if not cmd.is_file():
-                        sg.popup('serz.exe could not be found in ' + str(railworks_path) + '. Is this definitely your '
-                                        'RailWorks folder?', 'This application will now exit.')
-                        sys.exit()
+                    # This is a bin file. serz.exe converts it to .xml and back, unless the python_serz setting is
+                    # on, in which case serz.py does wherever it can. If it has been converted to .xml before - by
+                    # serz.exe, or by this tool or another with serz.py if python_serz is on - the .xml is read from
+                    # the cache. Otherwise it is read straight into a tree if possible, otherwise we need to run
+                    # serz.exe command to convert it to a readable .xml intermediate file, which is cached.
+                    python_serz = config.getboolean('defaults', 'python_serz', fallback=False)
                     inFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '.xml')
-                    inFileW = str(PureWindowsPath(inFile))
-                    scenarioPathW = str(PureWindowsPath(scenarioPath))
-                    if platform.system() == 'Windows':
-                        # Operating system is Microsoft Windows
-                        p1 = subprocess.Popen([str(cmd), scenarioPathW, '/xml:' + inFileW], stdout=subprocess.PIPE)
-                    elif (platform.system() == 'Linux' and platform.release()[-5:-1] == 'WSL2'):
-                        # Operating system is Windows Subsystem Linux (WSL2)
-                        # Linux-style pathnames can be converted to windows style with drive letters
-                        inFileW = inFileW[5] + ':' + inFileW[6:]
-                        scenarioPathW = scenarioPathW[5] + ':' + scenarioPathW[6:]
-                        p1 = subprocess.Popen([str(cmd), scenarioPathW, '/xml:' + inFileW], stdout=subprocess.PIPE)
-                    else:
-                        # Operating system has wine to run serz.eze
+                    cache_key = scenario_cache_key(scenarioPath)
+                    (cachedFile, use_serz_exe) = get_cached_scenario(cache_key, serz_exe_only=not python_serz)
+                    if cachedFile is not None:
+                        inFile = Path(cachedFile)
+                    elif python_serz:
                         try:
-                            wine_executable
-                        except NameError:
-                            wine_executable = '/usr/bin/wine'
-                        p1 = subprocess.Popen([wine_executable, str(cmd), scenarioPathW, '/xml:' +
-                                               inFileW], stdout=subprocess.PIPE)
-                    p1.wait()
-                    # Uncomment the line below to see the output of the serz.exe command
-                    # serz_output = 'serz.exe ' + p1.communicate()[0].decode('ascii')
-                    # Now the intermediate .xml has been created by serz.exe, read it in to this script and do the
-                    # processing
-                tree = parse_xml(inFile)
+                            bin_tree = read_serz(scenarioPath)
+                        except SerzError:
+                            use_serz_exe = True
+                    else:
+                        use_serz_exe = True
+                    if use_serz_exe and cachedFile is None:
+                        if not cmd.is_file():
+                            sg.popup('serz.exe could not be found in ' + str(railworks_path) + '. Is this definitely '
+                                     'your RailWorks folder?', 'This application will now exit.')
+                            sys.exit()
+                        if not run_serz(cmd, scenarioPath, '/xml:', inFile, wine_executable,
+                                        config.getint('defaults', 'serz_timeout', fallback=300)):
+                            sg.popup('Error: ' + str(scenarioPath) + ' could not be converted to .xml by serz.exe.')
+                            continue
+                        # Now the intermediate .xml has been created by serz.exe, read it in to this script and do the
+                        # processing
+                        put_cached_scenario(cache_key, inFile, True)
+                tree = parse_xml(inFile, bin_tree)
                 if tree is False:
                     continue
-                # Back up the original scenario file, fix some peculiarities of the train simulator .xml,
-                # write the final xml out to another temporary file so that serz.exe can convert it back to
-                # a .bin file in place of the original.
+                # Back up the original scenario file, and write the final xml out to another temporary file, in the
+                # form TS expects, so that serz.exe can convert it back to a .bin file in place of the original - unless
+                # it is to be written straight back to the .bin file.
                 scenarioPath.rename(Path(str(outPathStem) + str(scenarioPath.suffix)))
-                xmlString = ET.tostring(tree.getroot(), encoding='utf-8', xml_declaration=True,
-                                        short_empty_elements=False, method='xml')
-                xmlString = fix_short_tags(xmlString.decode())
                 xmlFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '.xml')
-                xmlFile.touch()
-                xmlFile.write_text(xmlString, encoding='utf-8')
+                if bin_tree is None:
+                    write_ts_xml(tree.getroot(), xmlFile)
                 output_message = 'Scenario converted.\n'
                 html_report_status_text = ''
                 if str(scenarioPath.suffix) == '.bin':
-                    # Run the serz.exe command again to generate the output scenario .bin file
+                    # Generate the output scenario .bin file
                     binFile = scenarioPath.parent / Path(str(scenarioPath.stem) + '.bin')
-                    binFileW = str(PureWindowsPath(binFile))
-                    xmlFileW = str(PureWindowsPath(xmlFile))
-                    if platform.system() == 'Windows':
-                        # Operating system is Microsoft Windows
-                        p2 = subprocess.Popen([str(cmd), xmlFileW, '/bin:' + binFileW], stdout=subprocess.PIPE)
-                    elif (platform.system() == 'Linux' and platform.release()[-5:-1] == 'WSL2'):
-                        # Operating system is Windows Subsystem Linux (WSL2)
-                        # Linux-style pathnames can be converted to windows style with drive letters
-                        binFileW = binFileW[5] + ':' + binFileW[6:]
-                        xmlFileW = xmlFileW[5] + ':' + xmlFileW[6:]
-                        p2 = subprocess.Popen([str(cmd), xmlFileW, '/bin:' + binFileW], stdout=subprocess.PIPE)
-                    else:
-                        # Operating system has wine to run serz.eze
+                    if not use_serz_exe:
                         try:
-                            wine_executable
-                        except NameError:
-                            wine_executable = '/usr/bin/wine'
-                        p2 = subprocess.Popen([wine_executable, str(cmd), xmlFileW, '/bin:' +
-                                               binFileW], stdout=subprocess.PIPE)
-                    p2.wait()
-                    inFile.unlink()
-                    # Uncomment the following line to see the output of the serz.exe command
-                    # output_message = serz_output + '\nserz.exe ' + p2.communicate()[0].decode('ascii')
+                            if bin_tree is not None:
+                                write_serz(bin_tree.getroot(), binFile)
+                            else:
+                                xml_to_serz(xmlFile, binFile)
+                        except SerzError:
+                            use_serz_exe = True
+                            if bin_tree is not None:
+                                write_ts_xml(bin_tree.getroot(), xmlFile)
+                    if use_serz_exe:
+                        # Run the serz.exe command again
+                        if not run_serz(cmd, xmlFile, '/bin:', binFile, wine_executable,
+                                        config.getint('defaults', 'serz_timeout', fallback=300)):
+                            # Put the original back, and leave the swapped scenario as it is in the .xml file
+                            os.replace(Path(str(outPathStem) + str(scenarioPath.suffix)), scenarioPath)
+                            sg.popup('serz.exe could not convert the processed scenario ' + str(xmlFile) + ' to .bin.',
+                                     'The original scenario has been left in place.', title='Error')
+                            rv_list = []
+                            rv_pairs = []
+                            output_vehicle_list = []
+                            input_vehicle_list = []
+                            continue
+                    xmlFile.unlink(missing_ok=True)
                 output_message = output_message + \
                                  '\nOriginal scenario backup located in ' + str(outPathStem) + str(scenarioPath.suffix)
-                if not config.get('defaults', 'save_report') == report_opts[0]:
+                report_format = config.get('defaults', 'report_format', fallback=report_formats[0])
+                report_stem = str(scenarioPath.stem) + '-railvehicle_report'
+                if config.get('defaults', 'save_report') == report_opts[0]:
+                    sg.popup(output_message)
+                elif report_format == report_formats[1] or report_format == report_formats[2]:
+                    # The user wants a report to be generated, to be read by another program
+                    if report_format == report_formats[1]:
+                        report_file = scenarioPath.parent / Path(report_stem + '.csv')
+                        convert_vlist_to_csv(report_file)
+                    else:
+                        report_file = scenarioPath.parent / Path(report_stem + '.jsonl')
+                        convert_vlist_to_jsonl(report_file)
+                    sg.popup(output_message, 'Report listing all rail vehicles located in ' + str(report_file))
+                else:
                     # The user wants a report to be generated
                     scenario_properties = parse_properties_xml(scenarioPath.parent)
-                    html_report_file = scenarioPath.parent / Path(str(scenarioPath.stem) + '-railvehicle_report.html')
+                    html_report_file = scenarioPath.parent / Path(report_stem + '.html')
                     convert_vlist_to_html_table(html_report_file, scenario_properties)
                     html_report_status_text = 'Report listing all rail vehicles located in ' + str(html_report_file)
                     browser = sg.popup_yes_no(output_message, html_report_status_text,
                                               'Do you want to open the report in your web browser now?')
                     if browser == 'Yes':
                         webbrowser.open(html_report_file.as_uri())
-                else:
-                    sg.popup(output_message)
                 # re-initialise all vehicle lists
                 rv_list = []
                 rv_pairs = []
@@ -0,0 +1,213 @@
+#!/usr/bin/python3
+#
+#     RSSwapTool - A script to swap in up to date or enhanced rolling stock
+#     for older versions of stock in Train Simulator scenarios.
+#     Copyright (C) 2025 James McKenzie jrmknz@yahoo.co.uk
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Tests of serz.py, the reader and writer of TS's .bin files. Run them from the RSSwapTool folder with
+#   python -m unittest discover tests
+# or with pytest.
+#
+# The sample below is put together byte by byte from the description of the format at the top of serz.py, rather than
+# by SerzWriter, so it checks the reader and writer against the format and not just against each other. It is not a
+# file written by serz.exe. Pairs of files which are - a Scenario.bin and the .xml serz.exe converts it to, e.g.
+# Scenario.bin and Scenario.xml - can be put in the serz_samples folder next to this file, and are checked the same way.
+import os
+import sys
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from ts_xml import ET, delta_namespace, parse_file
+from serz import SerzError, read_serz, write_serz, serz_to_xml, xml_to_serz
+
+samples_path = Path(__file__).resolve().parent / 'serz_samples'
+
+
+def new_string(text):
+    # A string written in full, the first time it is used
+    encoded = text.encode('utf-8')
+    return b'\xff\xff' + struct.pack('<I', len(encoded)) + encoded
+
+
+def old_string(number):
+    # A string used before, by its number in order of first use
+    return struct.pack('<H', number)
+
+
+# Strings: 0 cRecordSet, 1 Record, 2 cConsist, 3 Provider, 4 cDeltaString, 5 AP, 6 Flipped, 7 bool, 8 Speed,
+# 9 sFloat32, 10 Position, 11 sInt32, 12 Entity. Records are kept in slots 0 to 11 in the order they are first written.
+sample_bin = b''.join([
+    b'SERZ\x00\x00\x01\x00',
+    b'\xffP', new_string('cRecordSet'), struct.pack('<II', 12345, 1),
+    b'\xffP', new_string('Record'), struct.pack('<II', 0, 1),
+    b'\xffP', new_string('cConsist'), struct.pack('<II', 678, 7),
+    b'\xffV', new_string('Provider'), new_string('cDeltaString'), new_string('AP'),
+    b'\x03', old_string(5),
+    b'\xffV', new_string('Flipped'), new_string('bool'), b'\x01',
+    b'\xffV', new_string('Speed'), new_string('sFloat32'), struct.pack('<f', 12.5),
+    b'\xffA', new_string('Position'), new_string('sInt32'), b'\x02', struct.pack('<ii', -1, 7),
+    b'\xffR', new_string('Entity'), struct.pack('<I', 678),
+    b'\xffN',
+    b'\xffp', old_string(2),
+    b'\xffp', old_string(1),
+    b'\xffp', old_string(0),
+])
+sample_xml = '''<?xml version="1.0" encoding="utf-8"?>
+<cRecordSet xmlns:d="http://www.kuju.com/TnT/2003/Delta" d:version="1.0" d:id="12345">
+\t<Record>
+\t\t<cConsist d:id="678">
+\t\t\t<Provider d:type="cDeltaString">AP</Provider>
+\t\t\t<Provider d:type="cDeltaString">AP</Provider>
+\t\t\t<Flipped d:type="bool">1</Flipped>
+\t\t\t<Speed d:type="sFloat32" d:alt_encoding="0000000000002940" d:precision="string">12.5</Speed>
+\t\t\t<Position d:numElements="2" d:elementType="sInt32">-1 7</Position>
+\t\t\t<Entity d:type="ref">678</Entity>
+\t\t\t<d:nil/>
+\t\t</cConsist>
+\t</Record>
+</cRecordSet>
+'''.encode('utf-8')
+
+
+def element_summary(elem):
+    # An element and everything in it, leaving out the whitespace between elements
+    return (elem.tag, dict(elem.attrib), (elem.text or '').strip(),
+            [element_summary(child) for child in elem if isinstance(child.tag, str)])
+
+
+def d(name):
+    return '{' + delta_namespace + '}' + name
+
+
+class SerzTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def temp_file(self, name, data=None):
+        this_file = Path(self.temp_dir.name, name)
+        if data is not None:
+            this_file.write_bytes(data)
+        return this_file
+
+    def write_tree(self, root):
+        bin_file = self.temp_file('written.bin')
+        write_serz(root, bin_file)
+        return bin_file.read_bytes()
+
+    def check_pair(self, bin_data, xml_data):
+        # The .bin file reads as the .xml, and the .xml is written as the .bin file, byte for byte
+        bin_file = self.temp_file('pair.bin', bin_data)
+        xml_file = self.temp_file('pair.xml', xml_data)
+        expected = element_summary(parse_file(xml_file).getroot())
+        self.assertEqual(element_summary(read_serz(bin_file).getroot()), expected)
+        self.assertEqual(self.write_tree(parse_file(xml_file).getroot()), bin_data)
+        out_file = self.temp_file('converted.bin')
+        xml_to_serz(xml_file, out_file)
+        self.assertEqual(out_file.read_bytes(), bin_data)
+        converted_xml = self.temp_file('converted.xml')
+        serz_to_xml(bin_file, converted_xml)
+        self.assertEqual(element_summary(parse_file(converted_xml).getroot()), expected)
+
+    def test_sample(self):
+        self.check_pair(sample_bin, sample_xml)
+
+    def test_serz_exe_samples(self):
+        pairs = sorted(samples_path.glob('*.bin')) if samples_path.is_dir() else []
+        pairs = [(bin_file, bin_file.with_suffix('.xml')) for bin_file in pairs
+                 if bin_file.with_suffix('.xml').is_file()]
+        if len(pairs) == 0:
+            self.skipTest('no .bin files with their serz.exe .xml in ' + str(samples_path))
+        for (bin_file, xml_file) in pairs:
+            with self.subTest(sample=bin_file.name):
+                self.check_pair(bin_file.read_bytes(), xml_file.read_bytes())
+
+    def test_round_trip(self):
+        tree = read_serz(self.temp_file('sample.bin', sample_bin))
+        self.assertEqual(self.write_tree(tree.getroot()), sample_bin)
+
+    def test_modified_tree(self):
+        # A swap gives elements new strings and numbers, and may add elements not seen before in the file
+        root = read_serz(self.temp_file('sample.bin', sample_bin)).getroot()
+        consist = root.find('Record/cConsist')
+        consist[0].text = 'DTG'
+        consist[2].text = '0'
+        consist[3].text = '99.25'
+        consist[3].set(d('alt_encoding'), struct.pack('<d', 99.25).hex().upper())
+        consist[4].text = '3 -40000'
+        number = ET.SubElement(consist, 'UniqueNumber', {d('type'): 'cDeltaString'})
+        number.text = '47 123 é'
+        count = ET.SubElement(consist, 'Count', {d('type'): 'sUInt16'})
+        count.text = '65535'
+        expected = element_summary(root)
+        written = self.write_tree(root)
+        self.assertNotEqual(written, sample_bin)
+        self.assertEqual(element_summary(read_serz(self.temp_file('modified.bin', written)).getroot()), expected)
+
+    def test_float_without_alt_encoding(self):
+        # A float whose text has been changed, and its d:alt_encoding removed, is written from its text
+        root = read_serz(self.temp_file('sample.bin', sample_bin)).getroot()
+        speed = root.find('Record/cConsist/Speed')
+        speed.text = '0.1'
+        del speed.attrib[d('alt_encoding')]
+        written = read_serz(self.temp_file('float.bin', self.write_tree(root))).getroot()
+        speed = written.find('Record/cConsist/Speed')
+        self.assertEqual(speed.text, '0.1')
+        self.assertEqual(speed.get(d('alt_encoding')), struct.pack('<d', struct.unpack('<f', struct.pack('<f', 0.1))[0])
+                         .hex().upper())
+
+    def test_many_records(self):
+        # More different records than there are slots to keep them in, used again after their slots are reused
+        root = ET.Element('cRecordSet', {d('version'): '1.0'})
+        record = ET.SubElement(root, 'Record')
+        for repeat in range(0, 2):
+            for i in range(0, 300):
+                value = ET.SubElement(record, 'Value' + str(i), {d('type'): 'sInt32'})
+                value.text = str(i * repeat)
+        expected = element_summary(root)
+        written = self.write_tree(root)
+        self.assertEqual(element_summary(read_serz(self.temp_file('many.bin', written)).getroot()), expected)
+
+    def test_unwritable_trees(self):
+        root = ET.Element('cRecordSet', {d('version'): '1.0'})
+        value = ET.SubElement(root, 'Value', {d('type'): 'sComplex'})
+        value.text = '1'
+        with self.assertRaises(SerzError):
+            self.write_tree(root)
+        value.set(d('type'), 'sUInt8')
+        value.text = '256'
+        with self.assertRaises(SerzError):
+            self.write_tree(root)
+        root = ET.Element('cRecordSet', {d('version'): '1.0'})
+        root.text = 'loose text'
+        with self.assertRaises(SerzError):
+            self.write_tree(root)
+        self.assertFalse(self.temp_file('written.bin').exists())
+
+    def test_unreadable_files(self):
+        for (name, data) in [('not serz', b'<?xml version="1.0"?>'), ('cut short', sample_bin[:-3]),
+                             ('more after the end', sample_bin + b'\xff'),
+                             ('unknown record', sample_bin[:8] + b'\xffX')]:
+            with self.subTest(problem=name):
+                with self.assertRaises(SerzError):
+                    read_serz(self.temp_file('bad.bin', data))
+
+
+if __name__ == '__main__':
+    unittest.main()
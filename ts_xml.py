@@ -0,0 +1,231 @@
+#!/usr/bin/python3
+#
+#     RSSwapTool - A script to swap in up to date or enhanced rolling stock
+#     for older versions of stock in Train Simulator scenarios.
+#     Copyright (C) 2025 James McKenzie jrmknz@yahoo.co.uk
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# Reading and writing TS .xml files, shared by the swap tools. Scenarios are written in the form serz.exe needs to turn
+# them back into .bin files. This is what ElementTree writes, except that TS sometimes requires short xml empty tags and
+# sometimes long ones, so the elements are written out here in one go with the right kind of tag, rather than fixing
+# up ElementTree's output.
+#
+# lxml is used to read the files when it is installed, as it is a good deal quicker, otherwise Python's own
+# ElementTree. The tools take ET from here rather than importing it themselves, so they get whichever it is. Both are
+# used the ElementTree way, and lxml is set up to behave the same - e.g. it drops comments, as ElementTree does.
+try:
+    from lxml import etree as ET
+    xml_backend = 'lxml'
+except ImportError:
+    import xml.etree.ElementTree as ET
+    xml_backend = 'ElementTree'
+import xml.etree.ElementTree
+from operator import methodcaller
+
+# The d: namespace used throughout TS's .xml files, which the root element declares
+delta_namespace = 'http://www.kuju.com/TnT/2003/Delta'
+# Empty elements get long tags (<X></X>), except these important exceptions which get short ones (<X/>). Names are
+# compared regardless of case. cEngineSimContainer is written short even if it has attributes, the others only if
+# they have none.
+short_empty_tags = {'railvehiclenumber', 'other', 'deltatarget', 'd:nil', 'driverinstruction', 'initiallevel',
+                    'staticchildrenmatrix', 'railvehicles'}
+short_empty_tags_with_attributes = {'cenginesimcontainer'}
+
+
+def use_xml_backend(backend):
+    # Switch to reading with 'lxml' or 'ElementTree', e.g. to compare them. Only code which uses ET from this module
+    # after the switch is affected - the tools' own ET is the one found when they started.
+    global ET, xml_backend
+    if backend == 'lxml':
+        from lxml import etree as ET
+    else:
+        import xml.etree.ElementTree as ET
+    xml_backend = backend
+
+
+def xml_parser(target=None):
+    # Return a parser for an .xml file, passing what it reads to target (as ET.XMLParser does) if one is given
+    if xml_backend == 'lxml':
+        return ET.XMLParser(target=target, huge_tree=True, remove_comments=True, remove_pis=True)
+    return ET.XMLParser(target=target)
+
+
+def parse_file(xml_file):
+    # Read a whole .xml file. FileNotFoundError is raised if it's missing (lxml would raise a plain OSError given the
+    # name) and ET.ParseError if it can't be parsed.
+    with open(xml_file, 'rb') as xml_in:
+        return ET.parse(xml_in, xml_parser())
+
+
+def iterparse_file(xml_in, events):
+    # Read an .xml file opened for binary reading an element at a time, as ET.iterparse does
+    if xml_backend == 'lxml':
+        return ET.iterparse(xml_in, events=events, huge_tree=True, remove_comments=True, remove_pis=True)
+    return ET.iterparse(xml_in, events=events)
+
+
+def compile_path(path):
+    # Return a function which finds the first element matching path below the element it is given, or None, as
+    # elem.find(path) does. With lxml the path is compiled into an XPath expression once here, which is much quicker
+    # than lxml working out what it means every time elem.find(path) is called.
+    if xml_backend != 'lxml':
+        return methodcaller('find', path)
+    xpath = ET.XPath(path)
+
+    def find_first(elem):
+        found = xpath(elem)
+        if len(found) == 0:
+            return None
+        return found[0]
+    return find_first
+
+
+def escape_text(text):
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+def escape_attribute(value):
+    value = escape_text(value)
+    if '"' in value:
+        value = value.replace('"', '&quot;')
+    if '\r' in value:
+        value = value.replace('\r', '&#13;')
+    if '\n' in value:
+        value = value.replace('\n', '&#10;')
+    if '\t' in value:
+        value = value.replace('\t', '&#09;')
+    return value
+
+
+def root_prefixes():
+    # Return the namespace prefixes declared by the root element, by namespace
+    return {delta_namespace: 'd'}
+
+
+def ts_name(name, prefixes, declarations):
+    # Return an element or attribute name given in ElementTree's {namespace}name form with its prefix instead. A
+    # namespace other than those declared so far is declared on the element being written, by adding to declarations.
+    if name[:1] != '{':
+        return name
+    (namespace, name) = name[1:].split('}', 1)
+    if namespace not in prefixes:
+        prefixes[namespace] = 'ns' + str(len(prefixes) - 1)
+        declarations.append(' xmlns:' + prefixes[namespace] + '="' + escape_attribute(namespace) + '"')
+    return prefixes[namespace] + ':' + name
+
+
+def write_ts_start_tag(write, elem, prefixes, is_root=False):
+    # Write the start tag of an element, without its closing '>'. Return its name as written, whether it has any
+    # attributes and the namespace prefixes in force for its children.
+    return write_ts_tag(write, elem.tag, elem.items(), prefixes, is_root)
+
+
+def write_ts_tag(write, tag, items, prefixes, is_root=False):
+    # Write the start tag of an element given its name and (name, value) attributes, as write_ts_start_tag does
+    declarations = []
+    if is_root:
+        prefixes = root_prefixes()
+        declarations.append(' xmlns:d="' + delta_namespace + '"')
+    else:
+        prefixes = dict(prefixes)
+    tag = ts_name(tag, prefixes, declarations)
+    attributes = []
+    for (name, value) in items:
+        attributes.append(' ' + ts_name(name, prefixes, declarations) + '="' + escape_attribute(value) + '"')
+    write('<' + tag + ''.join(declarations) + ''.join(attributes))
+    return tag, len(attributes) > 0, prefixes
+
+
+def is_short_empty_tag(tag, has_attributes):
+    # Is an empty element with this name, as written, given a short tag?
+    return tag.lower() in short_empty_tags_with_attributes or (not has_attributes and tag.lower() in short_empty_tags)
+
+
+def write_ts_element(write, elem, prefixes, is_root=False):
+    # Write an element, its children and its tail with write(), e.g. the write method of a file opened for text
+    # The tree may have been made by either library, whichever is reading files
+    if elem.tag is ET.Comment or elem.tag is xml.etree.ElementTree.Comment:
+        write('<!--' + elem.text + '-->')
+    elif elem.tag is ET.ProcessingInstruction or elem.tag is xml.etree.ElementTree.ProcessingInstruction:
+        write('<?' + elem.text + '?>')
+    else:
+        (tag, has_attributes, prefixes) = write_ts_start_tag(write, elem, prefixes, is_root)
+        if elem.text or len(elem):
+            write('>')
+            if elem.text:
+                write(escape_text(elem.text))
+            for child in elem:
+                write_ts_element(write, child, prefixes)
+            write('</' + tag + '>')
+        elif is_short_empty_tag(tag, has_attributes):
+            write('/>')
+        else:
+            write('></' + tag + '>')
+    if elem.tail:
+        write(escape_text(elem.tail))
+
+
+def write_ts_xml(root, xml_file):
+    # Write a whole scenario, or other TS .xml file, from its root element to xml_file
+    with open(xml_file, 'w', encoding='utf-8') as xml_out:
+        xml_out.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        write_ts_element(xml_out.write, root, root_prefixes(), True)
+
+
+class TSXMLWriter:
+    # A parser target (as ET.XMLParser and ET.TreeBuilder take) which writes the elements it is given with write(),
+    # just as write_ts_element writes them, without keeping them in a tree. Each open element is listed as its name as
+    # written, whether it has attributes, the namespace prefixes in force for its children and whether anything has
+    # been written inside it yet.
+    def __init__(self, write):
+        self.write = write
+        self.open_elements = []
+
+    def start_content(self):
+        # Close the start tag of the innermost open element, if nothing has been written inside it yet
+        if len(self.open_elements) > 0 and not self.open_elements[-1][3]:
+            self.write('>')
+            self.open_elements[-1][3] = True
+
+    def start(self, tag, attrib):
+        self.start_content()
+        if len(self.open_elements) == 0:
+            (tag, has_attributes, prefixes) = write_ts_tag(self.write, tag, attrib.items(), None, True)
+        else:
+            (tag, has_attributes, prefixes) = write_ts_tag(self.write, tag, attrib.items(), self.open_elements[-1][2])
+        self.open_elements.append([tag, has_attributes, prefixes, False])
+
+    def data(self, text):
+        if text:
+            self.start_content()
+            self.write(escape_text(text))
+
+    def end(self, tag):
+        (tag, has_attributes, prefixes, has_content) = self.open_elements.pop()
+        if has_content:
+            self.write('</' + tag + '>')
+        elif is_short_empty_tag(tag, has_attributes):
+            self.write('/>')
+        else:
+            self.write('></' + tag + '>')
+
+    def close(self):
+        return None